@@ -0,0 +1,58 @@
+"""Synthetic change log files for benchmarks
+
+Writes ``<period>.json`` files in the format of
+``src/mcp_server/resources/change_log`` with the requested number of events.
+
+    python -m benchmarks.changelog_gen /tmp/change_log --events 100000
+"""
+import argparse
+import json
+import os
+import random
+from datetime import date, timedelta
+
+ACTIONS = ['Launch', 'Campaign', 'Sale', 'Redesign', 'Partnership', 'Promotion', 'Update', 'Rollout']
+SUBJECTS = ['Spring Collection', 'Loyalty Program', 'Mobile App', 'Checkout Flow', 'Search',
+            'Recommendations', 'Holiday Gifts', 'Cosmetics Line', 'Free Shipping', 'Referral Bonus']
+OUTCOMES = ['increase in conversions', 'growth in new customers', 'boost in average order value',
+            'reduction in churn', 'uplift in mobile revenue', 'rise in repeat purchases']
+
+
+def generate_events(count: int, start: date, days: int, seed: int = 0):
+    rng = random.Random(seed)
+    events = []
+    for _ in range(count):
+        subject = rng.choice(SUBJECTS)
+        events.append({
+            "date": (start + timedelta(days = rng.randrange(days))).isoformat(),
+            "event": f"{subject} {rng.choice(ACTIONS)}",
+            "impact": (f"{rng.choice(['Launched', 'Ran', 'Shipped', 'Tested'])} {subject.lower()} "
+                       f"changes, resulting in {rng.randint(1, 60)}% {rng.choice(OUTCOMES)}"),
+        })
+    events.sort(key = lambda event: event['date'])
+    return events
+
+
+def write_period(directory: str, period: str, count: int, seed: int = 0) -> str:
+    """Write one period file with ``count`` events spread over a quarter; returns its path."""
+    os.makedirs(directory, exist_ok = True)
+    path = os.path.join(directory, f"{period}.json")
+    with open(path, 'w') as f:
+        json.dump(generate_events(count, date(2025, 1, 1), 90, seed), f)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument('directory')
+    parser.add_argument('--events', type = int, nargs = '+', default = [1000],
+                        help = 'events per generated period (one file per value)')
+    parser.add_argument('--seed', type = int, default = 0)
+    args = parser.parse_args()
+    for count in args.events:
+        path = write_period(args.directory, f"bench_{count}", count, args.seed)
+        print(f"{path}: {count} events, {os.path.getsize(path)} bytes")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""Local stand-in for the ClickHouse HTTP interface
+
+Replays canned responses with a configurable latency:
+
+- ``/ping`` answers ``Ok.``
+- ``EXPLAIN ESTIMATE`` returns a small estimate
+- queries over ``system.*`` (the schema catalog) return an ``ecommerce`` schema
+- column sample queries (``topK``) return canned low-cardinality values
+- ``FORMAT ArrowStream`` returns an Arrow table (when pyarrow is installed)
+- everything else returns ``rows`` lines of TabSeparated data
+
+Run it standalone with ``python -m benchmarks.fake_clickhouse --port 18123``.
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+CHUNK_ROWS = 1000
+
+SAMPLE_COLUMN_RE = re.compile(r'uniq\(`([^`]+)`\) as d(\d+)')
+# values of low-cardinality columns; other sampled columns look high-cardinality
+SAMPLE_VALUES = {
+    'os': ['Windows', 'Android', 'iOS', 'MacOS'],
+    'browser': ['Chrome', 'Safari', 'Firefox', 'Edge'],
+    'is_fraud': ['0', '1'],
+    'is_active': ['1', '0'],
+    'country': ['United Kingdom', 'Netherlands', 'Germany', 'France'],
+}
+
+CATALOG_ROWS = [
+    {"database": "ecommerce", "table": "sessions", "engine": "MergeTree", "modified": "1",
+     "total_rows": "10000000", "sorting_key": "action_date, user_id",
+     "partition_key": "toYYYYMM(action_date)", "primary_key": "action_date, user_id",
+     "sampling_key": "", "comment": "",
+     "columns": [[1, "user_id", "UInt64", "", "", ""], [2, "session_id", "UInt64", "", "", ""],
+                 [3, "action_date", "Date", "", "", ""], [4, "os", "String", "", "", ""],
+                 [5, "browser", "String", "", "", ""], [6, "is_fraud", "UInt8", "", "", ""],
+                 [7, "revenue", "Float64", "", "", ""]]},
+    {"database": "ecommerce", "table": "users", "engine": "MergeTree", "modified": "1",
+     "total_rows": "100000", "sorting_key": "user_id", "partition_key": "",
+     "primary_key": "user_id", "sampling_key": "", "comment": "",
+     "columns": [[1, "user_id", "UInt64", "", "", ""], [2, "country", "String", "", "", ""],
+                 [3, "is_active", "UInt8", "", "", ""], [4, "age", "UInt64", "", "", ""]]},
+]
+
+
+class FakeClickHouse:
+    def __init__(self, port: int = 18123, latency: float = 0.0, rows: int = 100):
+        self.port = port
+        self.latency = latency
+        self.rows = rows
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._tsv = [
+            ''.join(f"{i}\tuser_{i}\t{i % 97}.5\n" for i in range(start, min(start + CHUNK_ROWS, rows))).encode()
+            for start in range(0, rows, CHUNK_ROWS)
+        ]
+        self._arrow = None
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def arrow_body(self) -> bytes:
+        if self._arrow is None:
+            import pyarrow as pa
+
+            table = pa.table({
+                'id': pa.array(range(self.rows), pa.int64()),
+                'name': pa.array([f"user_{i}" for i in range(self.rows)]),
+                'amount': pa.array([(i % 97) + 0.5 for i in range(self.rows)]),
+            })
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            self._arrow = sink.getvalue().to_pybytes()
+        return self._arrow
+
+    def start(self) -> 'FakeClickHouse':
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def reply(self, body: bytes, status: int = 200, headers=None):
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if urlparse(self.path).path == '/ping':
+                    return self.reply(b'Ok.\n')
+                self.do_POST()
+
+            def do_POST(self):
+                params = parse_qs(urlparse(self.path).query)
+                length = int(self.headers.get('Content-Length') or 0)
+                query = (params.get('query', [''])[0] + self.rfile.read(length).decode()).strip()
+                with fake._lock:
+                    fake.requests += 1
+                if fake.latency:
+                    time.sleep(fake.latency)
+
+                if query.startswith('EXPLAIN ESTIMATE'):
+                    row = {"database": "ecommerce", "table": "sessions", "parts": "12",
+                           "rows": "1000000", "marks": "123"}
+                    return self.reply((json.dumps(row) + '\n').encode())
+                if 'system.' in query:
+                    if 'groupArrayIf' in query:
+                        rows = [{"database": "ecommerce", "tables": ["sessions", "users"]}]
+                    else:
+                        rows = CATALOG_ROWS
+                    return self.reply(''.join(json.dumps(row) + '\n' for row in rows).encode())
+                if 'topK(' in query:
+                    row = {}
+                    for name, index in SAMPLE_COLUMN_RE.findall(query):
+                        values = SAMPLE_VALUES.get(name)
+                        row[f"d{index}"] = len(values) if values else 50000
+                        row[f"v{index}"] = values or [f"{name}_{i}" for i in range(10)]
+                    return self.reply((json.dumps(row) + '\n').encode())
+                if query.endswith('FORMAT ArrowStream'):
+                    return self.reply(fake.arrow_body())
+
+                summary = json.dumps({"read_rows": str(fake.rows), "read_bytes": str(fake.rows * 24)})
+                self.send_response(200)
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.send_header('X-ClickHouse-Summary', summary)
+                self.end_headers()
+                try:
+                    for chunk in fake._tsv:
+                        self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+                    self.wfile.write(b'0\r\n\r\n')
+                except (BrokenPipeError, ConnectionResetError):
+                    # the client stopped reading at its row budget
+                    pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', self.port), Handler)
+        self._server.daemon_threads = True
+        # port 0 binds a free port
+        self.port = self._server.server_address[1]
+        threading.Thread(target = self._server.serve_forever, daemon = True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument('--port', type = int, default = 18123)
+    parser.add_argument('--latency', type = float, default = 0.0, help = 'seconds per request')
+    parser.add_argument('--rows', type = int, default = 100, help = 'rows per TSV result')
+    args = parser.parse_args()
+    fake = FakeClickHouse(args.port, args.latency, args.rows).start()
+    print(f"Fake ClickHouse listening on {fake.url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == '__main__':
+    main()
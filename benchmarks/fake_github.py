@@ -0,0 +1,206 @@
+"""Local stand-in for the GitHub REST API
+
+Serves ``prs`` synthetic pull requests of one repository with:
+
+- pagination through ``per_page``/``page`` and ``Link`` headers
+- ``ETag`` validators: a matching ``If-None-Match`` gets an empty 304
+- a core rate limit of ``rate_limit`` requests per ``window`` seconds,
+  reported in ``X-RateLimit-*`` headers; 304s are free, as on GitHub
+- a configurable latency per request
+
+Run it standalone with ``python -m benchmarks.fake_github --port 18124``.
+"""
+import argparse
+import hashlib
+import json
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+PR_PATH_RE = re.compile(r'^/repos/([^/]+)/([^/]+)/pulls(?:/(\d+)(?:/(commits|files))?)?$')
+COMMITS_PER_PR = 12
+FILES_PER_PR = 40
+
+
+def make_pr(owner: str, repo: str, number: int, now: datetime) -> dict:
+    updated = now - timedelta(hours = number)
+    merged = updated.isoformat().replace('+00:00', 'Z') if number % 3 == 0 else None
+    return {
+        "number": number,
+        "title": f"Change number {number}",
+        "body": "Synthetic pull request",
+        "html_url": f"https://github.com/{owner}/{repo}/pull/{number}",
+        "url": f"https://api.github.com/repos/{owner}/{repo}/pulls/{number}",
+        "state": "closed" if merged else "open",
+        "created_at": (updated - timedelta(days = 1)).isoformat().replace('+00:00', 'Z'),
+        "updated_at": updated.isoformat().replace('+00:00', 'Z'),
+        "closed_at": merged,
+        "merged_at": merged,
+        "user": {"login": f"dev{number % 5}", "html_url": f"https://github.com/dev{number % 5}"},
+        "assignees": [],
+        "requested_reviewers": [{"login": "reviewer"}],
+        "labels": [{"name": "bug" if number % 2 else "feature"}],
+        "milestone": None,
+        "base": {"ref": "main"},
+        "head": {"ref": f"branch-{number}"},
+        "additions": number % 50,
+        "deletions": number % 7,
+        "changed_files": FILES_PER_PR,
+        "mergeable": True,
+        "merged": bool(merged),
+    }
+
+
+class FakeGitHub:
+    def __init__(self, port: int = 18124, latency: float = 0.0, prs: int = 500,
+                 rate_limit: int = 5000, window: float = 3600.0):
+        self.port = port
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.window = window
+        self.requests = 0
+        self.not_modified = 0
+        self.rate_limited = 0
+        self._lock = threading.Lock()
+        self._remaining = rate_limit
+        self._reset_at = time.time() + window
+        self._now = datetime.now(timezone.utc)
+        self._prs = prs
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def _take_token(self):
+        """(allowed, rate limit headers) for a request that counts against the limit."""
+        with self._lock:
+            now = time.time()
+            if now >= self._reset_at:
+                self._remaining = self.rate_limit
+                self._reset_at = now + self.window
+            allowed = self._remaining > 0
+            if allowed:
+                self._remaining -= 1
+            else:
+                self.rate_limited += 1
+            headers = {
+                'X-RateLimit-Limit': str(self.rate_limit),
+                'X-RateLimit-Remaining': str(self._remaining),
+                'X-RateLimit-Reset': str(int(self._reset_at)),
+                'X-RateLimit-Resource': 'core',
+            }
+        return allowed, headers
+
+    def _items(self, owner, repo, number, kind):
+        if number is None:
+            return [make_pr(owner, repo, n, self._now) for n in range(1, self._prs + 1)]
+        if kind == 'commits':
+            return [{"sha": f"{number:08d}{i:032d}",
+                     "commit": {"message": f"Commit {i}\n\nDetails",
+                                "author": {"name": "dev", "date": "2025-01-01T00:00:00Z"}}}
+                    for i in range(COMMITS_PER_PR)]
+        if kind == 'files':
+            return [{"filename": f"src/module{i % 6}/file{i}.py", "status": "modified",
+                     "additions": i, "deletions": 1, "changes": i + 1}
+                    for i in range(FILES_PER_PR)]
+        return None
+
+    def start(self) -> 'FakeGitHub':
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def reply(self, status: int, body: bytes, headers: dict):
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                with fake._lock:
+                    fake.requests += 1
+                if fake.latency:
+                    time.sleep(fake.latency)
+                url = urlparse(self.path)
+                params = {name: values[0] for name, values in parse_qs(url.query).items()}
+                match = PR_PATH_RE.match(url.path)
+                if not match:
+                    return self.reply(404, b'{"message": "Not Found"}',
+                                      {'Content-Type': 'application/json'})
+                owner, repo, number, kind = match.groups()
+                number = int(number) if number else None
+
+                if number is not None and kind is None:
+                    if number > fake._prs:
+                        return self.reply(404, b'{"message": "Not Found"}',
+                                          {'Content-Type': 'application/json'})
+                    items, headers = make_pr(owner, repo, number, fake._now), {}
+                else:
+                    all_items = fake._items(owner, repo, number, kind)
+                    per_page = int(params.get('per_page', 30))
+                    page = int(params.get('page', 1))
+                    last = max(1, -(-len(all_items) // per_page))
+                    items = all_items[(page - 1) * per_page:page * per_page]
+                    links = []
+                    if page < last:
+                        base = f"{fake.url}{url.path}?per_page={per_page}"
+                        links.append(f'<{base}&page={page + 1}>; rel="next"')
+                        links.append(f'<{base}&page={last}>; rel="last"')
+                    headers = {'Link': ', '.join(links)} if links else {}
+
+                body = json.dumps(items).encode()
+                etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+                headers.update({'Content-Type': 'application/json', 'ETag': etag})
+                if self.headers.get('If-None-Match') == etag:
+                    # conditional requests that hit do not count against the limit
+                    with fake._lock:
+                        fake.not_modified += 1
+                    return self.reply(304, b'', headers)
+
+                allowed, limit_headers = fake._take_token()
+                headers.update(limit_headers)
+                if not allowed:
+                    return self.reply(403, b'{"message": "API rate limit exceeded"}', limit_headers)
+                self.reply(200, body, headers)
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', self.port), Handler)
+        self._server.daemon_threads = True
+        # port 0 binds a free port
+        self.port = self._server.server_address[1]
+        threading.Thread(target = self._server.serve_forever, daemon = True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument('--port', type = int, default = 18124)
+    parser.add_argument('--latency', type = float, default = 0.0, help = 'seconds per request')
+    parser.add_argument('--prs', type = int, default = 500)
+    parser.add_argument('--rate-limit', type = int, default = 5000)
+    parser.add_argument('--window', type = float, default = 3600.0, help = 'rate limit window in seconds')
+    args = parser.parse_args()
+    fake = FakeGitHub(args.port, args.latency, args.prs, args.rate_limit, args.window).start()
+    print(f"Fake GitHub API listening on {fake.url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Cold start benchmark for the stdio server
+
+MCP clients spawn the server for every session, so its import time is paid
+on every agent launch. This imports ``mcp_server.server`` in fresh
+interpreters and reports:
+
+- the time spent in this package, measured after the MCP SDK is imported
+  (the SDK's own import time is out of our hands)
+- the total cold start, SDK included, for reference
+
+It fails when the package's share exceeds the budget, or when a backend
+that should be imported on first use is loaded at startup.
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --runs 10 --budget-ms 80
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Median milliseconds mcp_server.server may add on top of the MCP SDK
+IMPORT_BUDGET_MS = 75
+DEFAULT_RUNS = 7
+
+# Imported by the handlers on first use, never at startup
+DEFERRED_MODULES = (
+    'ijson',
+    'pandas',
+    'pyarrow',
+    'mcp_server.tools.clickhouse',
+    'mcp_server.tools.github',
+    'mcp_server.tools.github_graphql',
+    'mcp_server.tools.schema_catalog',
+    'mcp_server.tools.schema_prompt',
+    'mcp_server.tools.result_summary',
+)
+
+PROBE = f"""
+import json, sys, time
+started = time.perf_counter()
+import mcp.server.fastmcp
+sdk_loaded = time.perf_counter()
+import mcp_server.server
+finished = time.perf_counter()
+print(json.dumps({{
+    'sdk_ms': (sdk_loaded - started) * 1000,
+    'package_ms': (finished - sdk_loaded) * 1000,
+    'loaded': [name for name in {DEFERRED_MODULES!r} if name in sys.modules],
+}}))
+"""
+
+
+def measure(runs: int):
+    env = dict(os.environ, PYTHONPATH = os.pathsep.join([os.path.join(ROOT, 'src'), ROOT]))
+    samples = []
+    for _ in range(runs):
+        completed = subprocess.run([sys.executable, '-c', PROBE], env = env,
+                                   capture_output = True, text = True, check = True)
+        samples.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument('--runs', type = int, default = DEFAULT_RUNS)
+    parser.add_argument('--budget-ms', type = float, default = IMPORT_BUDGET_MS,
+                        help = 'allowed median import time of the package itself')
+    args = parser.parse_args()
+
+    samples = measure(args.runs)
+    package_ms = statistics.median(sample['package_ms'] for sample in samples)
+    total_ms = statistics.median(sample['sdk_ms'] + sample['package_ms'] for sample in samples)
+    loaded = sorted({name for sample in samples for name in sample['loaded']})
+
+    print(f"mcp_server.server import: {package_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    print(f"cold start incl. MCP SDK: {total_ms:.1f} ms")
+
+    failures = []
+    if package_ms > args.budget_ms:
+        failures.append(f"import takes {package_ms:.1f} ms, over the {args.budget_ms:.0f} ms budget")
+    if loaded:
+        failures.append(f"imported at startup instead of on first use: {', '.join(loaded)}")
+    if failures:
+        print("\nRegressions:\n" + '\n'.join(f"- {line}" for line in failures))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
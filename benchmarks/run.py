@@ -0,0 +1,282 @@
+"""Offline benchmarks for the MCP server
+
+Runs MCP clients against the server in memory while ClickHouse and GitHub
+are replaced by local fakes (see fake_clickhouse.py and fake_github.py) and
+change logs by generated files. Each scenario runs in its own process so
+its peak RSS is not mixed with the others.
+
+    python benchmarks/run.py                     # run and compare with baselines.json
+    python benchmarks/run.py --save-baseline     # record new baselines
+    python benchmarks/run.py --scenarios github_prs --clients 16 --requests 400
+
+Exits with status 1 when a scenario regressed past --tolerance.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, 'src')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from benchmarks.changelog_gen import write_period
+from benchmarks.fake_clickhouse import FakeClickHouse
+from benchmarks.fake_github import FakeGitHub
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+
+DEFAULT_CLIENTS = 8
+DEFAULT_REQUESTS = 200
+DEFAULT_CHANGELOG_SIZES = (1000, 10000, 100000)
+# Relative slack before a change counts as a regression: throughput may
+# drop and p99 latency and peak RSS may grow by this fraction
+DEFAULT_TOLERANCE = 0.5
+
+BENCH_REPO = 'bench/repo'
+
+
+def changelog_scenarios(size: int):
+    period = f"bench_{size}"
+    scenarios = {
+        f"changelog_page_{size}": ('resource', lambda i: f"changelog://{period}?offset={(i * 100) % size}&limit=100"),
+        f"changelog_summary_{size}": ('resource', lambda i: f"changelog://{period}/summary"),
+        f"changelog_search_{size}": ('resource', lambda i: "changelog://search/loyalty"),
+    }
+    if size <= 10000:
+        # full bodies of larger periods are paged in practice
+        scenarios[f"changelog_full_{size}"] = ('resource', lambda i: f"changelog://{period}")
+    return scenarios
+
+
+def build_scenarios(changelog_sizes):
+    """Scenario name -> (kind, request factory). Factories get the request number."""
+    scenarios = {
+        # every query differs, so each one misses the result cache
+        'clickhouse_query': ('tool', lambda i: ('execute_sql_query', {
+            'query': f"select id, name, amount from ecommerce.sessions where id != {i}"})),
+        'clickhouse_cached': ('tool', lambda i: ('execute_sql_query', {
+            'query': "select id, name, amount from ecommerce.sessions"})),
+        'clickhouse_queries': ('tool', lambda i: ('execute_sql_queries', {
+            'queries': [f"select id from ecommerce.sessions where id != {i * 4 + n}" for n in range(4)]})),
+        'clickhouse_schema': ('tool', lambda i: ('describe_table', {'table_name': 'ecommerce.sessions'})),
+        'sql_prompt': ('prompt', lambda i: ('sql_query_prompt', {'question': f"Sessions on day {i}?"})),
+        'github_prs': ('tool', lambda i: ('get_github_prs', {'repo_url': BENCH_REPO, 'days': 30})),
+        'github_pr_details': ('tool', lambda i: ('get_github_pr_details', {
+            'repo_url': BENCH_REPO, 'pr_identifier': str(i % 50 + 1)})),
+    }
+    for size in changelog_sizes:
+        scenarios.update(changelog_scenarios(size))
+    return scenarios
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+async def run_scenario(name: str, clients: int, requests: int, changelog_sizes) -> dict:
+    """Run one scenario in this process. The environment is already set up."""
+    from mcp.shared.memory import create_connected_server_and_client_session
+    from mcp_server.server import mcp
+
+    kind, factory = build_scenarios(changelog_sizes)[name]
+    latencies = []
+    errors = 0
+
+    async def call(session, i):
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            if kind == 'tool':
+                tool, arguments = factory(i)
+                result = await session.call_tool(tool, arguments)
+                failed = result.isError
+            elif kind == 'prompt':
+                prompt, arguments = factory(i)
+                await session.get_prompt(prompt, arguments)
+                failed = False
+            else:
+                await session.read_resource(factory(i))
+                failed = False
+        except Exception:
+            failed = True
+        if failed:
+            errors += 1
+        return time.perf_counter() - started
+
+    async def client(number: int, count: int):
+        async with create_connected_server_and_client_session(mcp._mcp_server) as session:
+            for n in range(count):
+                latencies.append(await call(session, number * count + n))
+
+    # one untimed request loads caches, catalogs and lazy imports
+    async with create_connected_server_and_client_session(mcp._mcp_server) as session:
+        await call(session, requests + 1)
+    errors = 0
+
+    per_client = max(1, requests // clients)
+    started = time.perf_counter()
+    await asyncio.gather(*(client(number, per_client) for number in range(clients)))
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+
+def worker(args) -> None:
+    """Entry point of the per-scenario process."""
+    from mcp_server.resources import change_log
+    from mcp_server.resources.change_log_store import ChangeLogStore
+    from mcp_server.tools import github
+
+    github.BASE_URL = args.github_url
+    change_log.change_log_store = ChangeLogStore(args.changelog_dir)
+    result = asyncio.run(run_scenario(args.worker, args.clients, args.requests, args.changelog_sizes))
+    print(json.dumps(result))
+
+
+def run_in_process(name: str, args, fakes: dict, workdir: str) -> dict:
+    cache_dir = tempfile.mkdtemp(prefix = f"{name}-", dir = workdir)
+    env = dict(os.environ,
+               CH_HOSTS = fakes['clickhouse'].url,
+               MCP_ANALYST_CACHE_DIR = cache_dir,
+               PYTHONPATH = os.pathsep.join([ROOT, os.path.join(ROOT, 'src')]))
+    env.pop('OTEL_EXPORTER_OTLP_ENDPOINT', None)
+    command = [sys.executable, os.path.abspath(__file__), '--worker', name,
+               '--clients', str(args.clients), '--requests', str(args.requests),
+               '--github-url', fakes['github'].url, '--changelog-dir', args.changelog_dir,
+               '--changelog-sizes', *map(str, args.changelog_sizes)]
+    completed = subprocess.run(command, env = env, capture_output = True, text = True)
+    if completed.returncode != 0:
+        return {'failed': completed.stderr.strip().splitlines()[-1:] or ['no output']}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def compare(results: dict, baselines: dict, tolerance: float):
+    """Regression messages for scenarios measured against their baselines."""
+    regressions = []
+    for name, result in results.items():
+        baseline = baselines.get(name)
+        if baseline is None:
+            continue
+        if 'failed' in result:
+            regressions.append(f"{name}: failed ({result['failed'][0]})")
+            continue
+        if result['errors'] > baseline['errors']:
+            regressions.append(f"{name}: {result['errors']} errors (baseline {baseline['errors']})")
+        if result['throughput_rps'] < baseline['throughput_rps'] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {result['throughput_rps']} req/s "
+                               f"(baseline {baseline['throughput_rps']})")
+        if result['p99_ms'] > baseline['p99_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p99 {result['p99_ms']} ms (baseline {baseline['p99_ms']})")
+        if result['peak_rss_mb'] > baseline['peak_rss_mb'] * (1 + tolerance):
+            regressions.append(f"{name}: peak RSS {result['peak_rss_mb']} MB "
+                               f"(baseline {baseline['peak_rss_mb']})")
+    return regressions
+
+
+def render(results: dict) -> str:
+    lines = [f"{'scenario':<28} {'req':>6} {'err':>4} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'RSS MB':>8}"]
+    for name, result in results.items():
+        if 'failed' in result:
+            lines.append(f"{name:<28} failed: {result['failed'][0]}")
+            continue
+        lines.append(f"{name:<28} {result['requests']:>6} {result['errors']:>4} "
+                     f"{result['throughput_rps']:>9} {result['p50_ms']:>9} {result['p99_ms']:>9} "
+                     f"{result['peak_rss_mb']:>8}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument('--scenarios', nargs = '+', help = 'scenario names (default: all)')
+    parser.add_argument('--clients', type = int, default = DEFAULT_CLIENTS, help = 'concurrent MCP sessions')
+    parser.add_argument('--requests', type = int, default = DEFAULT_REQUESTS, help = 'requests per scenario')
+    parser.add_argument('--changelog-sizes', type = int, nargs = '+', default = list(DEFAULT_CHANGELOG_SIZES),
+                        help = 'events per generated change log period, e.g. 1000 1000000')
+    parser.add_argument('--ch-latency', type = float, default = 0.005, help = 'fake ClickHouse latency, seconds')
+    parser.add_argument('--ch-rows', type = int, default = 1000, help = 'rows per fake ClickHouse result')
+    parser.add_argument('--github-latency', type = float, default = 0.02, help = 'fake GitHub latency, seconds')
+    parser.add_argument('--save-baseline', action = 'store_true', help = f"write results to {BASELINE_PATH}")
+    parser.add_argument('--tolerance', type = float, default = DEFAULT_TOLERANCE)
+    parser.add_argument('--json', action = 'store_true', help = 'print results as JSON')
+    # internal: run one scenario in this process
+    parser.add_argument('--worker', help = argparse.SUPPRESS)
+    parser.add_argument('--github-url', help = argparse.SUPPRESS)
+    parser.add_argument('--changelog-dir', help = argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        return worker(args)
+
+    names = args.scenarios or list(build_scenarios(args.changelog_sizes))
+    unknown = set(names) - set(build_scenarios(args.changelog_sizes))
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    fakes = {
+        'clickhouse': FakeClickHouse(0, args.ch_latency, args.ch_rows).start(),
+        'github': FakeGitHub(0, args.github_latency).start(),
+    }
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory(prefix = 'mcp-bench-') as workdir:
+            args.changelog_dir = os.path.join(workdir, 'change_log')
+            for size in args.changelog_sizes:
+                write_period(args.changelog_dir, f"bench_{size}", size)
+            for name in names:
+                results[name] = run_in_process(name, args, fakes, workdir)
+                if not args.json:
+                    print(render({name: results[name]}).splitlines()[-1], flush = True)
+    finally:
+        for fake in fakes.values():
+            fake.stop()
+
+    if args.json:
+        print(json.dumps(results, indent = 2))
+
+    if args.save_baseline:
+        baselines = {}
+        if os.path.exists(BASELINE_PATH):
+            with open(BASELINE_PATH) as f:
+                baselines = json.load(f)
+        baselines.update({name: result for name, result in results.items() if 'failed' not in result})
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump(baselines, f, indent = 2, sort_keys = True)
+            f.write('\n')
+        print(f"Saved baselines for {len(results)} scenarios to {BASELINE_PATH}")
+        return
+
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions:\n" + '\n'.join(f"- {line}" for line in regressions))
+            sys.exit(1)
+        print("\nNo regressions against baselines")
+
+
+if __name__ == '__main__':
+    main()
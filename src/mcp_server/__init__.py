@@ -10,15 +10,29 @@ __version__ = "0.1.0"
 __author__ = "MCP Analyst Toolkit Team"
 __description__ = "MCP server for analyst toolkit with ClickHouse, GitHub, and change log integration"
 
-# Import main server instance
-from .server import mcp
+import importlib
 
-# Import tool functions
-from .tools.clickhouse import execute_query, get_databases, get_table_schema
-from .tools.github import get_recent_prs, get_pr_details
-
-# Import resource functions
-from .resources.change_log import get_available_periods, get_period_changelog
+# Re-exported names and the modules that define them. They are imported on
+# first access: "import mcp_server.server" (what MCP clients spawn) does not
+# pay for the tool backends, and running server.py as a script does not
+# build the server twice.
+_EXPORTS = {
+    # Server instance
+    "mcp": ".server",
+    # ClickHouse tools
+    "execute_query": ".tools.clickhouse",
+    "execute_queries": ".tools.clickhouse",
+    "get_databases": ".tools.clickhouse",
+    "get_table_schema": ".tools.clickhouse",
+    "get_tables_schema": ".tools.clickhouse",
+    # GitHub tools
+    "get_recent_prs": ".tools.github",
+    "get_pr_details": ".tools.github",
+    "get_prs_details": ".tools.github",
+    # Change log resources
+    "get_available_periods": ".resources.change_log",
+    "get_period_changelog": ".resources.change_log",
+}
 
 # Define what gets exported when using "from mcp_server import *"
 __all__ = [
@@ -27,12 +41,15 @@ __all__ = [
     
     # ClickHouse tools
     "execute_query",
+    "execute_queries",
     "get_databases", 
     "get_table_schema",
+    "get_tables_schema",
     
     # GitHub tools
     "get_recent_prs",
     "get_pr_details",
+    "get_prs_details",
     
     # Change log resources
     "get_available_periods",
@@ -44,6 +61,17 @@ __all__ = [
     "__description__"
 ]
 
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
 def run_server():
     """Entry point for running the MCP server"""
+    from .server import mcp
     return mcp
@@ -0,0 +1,288 @@
+"""Latency, payload and upstream metrics for the MCP handlers"""
+import functools
+import inspect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+# Prometheus-style cumulative buckets, in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Spans are exported only when a collector is configured and the
+# opentelemetry packages are installed
+OTEL_ENDPOINT = os.getenv('OTEL_EXPORTER_OTLP_ENDPOINT')
+OTEL_SERVICE_NAME = os.getenv('OTEL_SERVICE_NAME', 'mcp-analyst-toolkit')
+
+METRICS = {
+    'mcp_handler_duration_seconds': ('histogram', 'Time spent in MCP tool, resource and prompt handlers'),
+    'mcp_handler_calls_total': ('counter', 'Handler invocations'),
+    'mcp_handler_errors_total': ('counter', 'Handler invocations that raised'),
+    'mcp_handler_payload_bytes_total': ('counter', 'Bytes returned by handlers'),
+    'mcp_upstream_duration_seconds': ('histogram', 'Time spent in ClickHouse and GitHub requests'),
+    'mcp_upstream_requests_total': ('counter', 'Requests sent to ClickHouse and GitHub'),
+    'mcp_upstream_errors_total': ('counter', 'Upstream requests that failed or returned an error'),
+    'mcp_serialization_duration_seconds': ('histogram', 'Time spent serializing handler results'),
+    'mcp_cache_hits_total': ('counter', 'Requests answered from a cache'),
+    'mcp_cache_misses_total': ('counter', 'Requests that missed a cache'),
+    'mcp_cache_waits_total': ('counter', 'Cache misses that waited for another process to compute the entry'),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+class Histogram:
+    def __init__(self, buckets = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile by interpolating inside its bucket."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, self.counts):
+            if count and seen + count >= target:
+                estimate = lower + (bound - lower) * (target - seen) / count
+                return min(estimate, self.max)
+            seen += count
+            lower = bound
+        return self.max
+
+class MetricsRegistry:
+    """In-process counters and histograms, rendered as markdown or Prometheus text."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+
+    def inc(self, metric: str, value: float = 1, /, **labels) -> None:
+        key = (metric, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, metric: str, value: float, /, **labels) -> None:
+        key = (metric, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, metric: str, /, **labels):
+        """Observe the duration of the block in ``metric`` (and trace it as a span)."""
+        started = time.perf_counter()
+        with span(metric, labels):
+            try:
+                yield
+            finally:
+                self.observe(metric, time.perf_counter() - started, **labels)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def render_prometheus(self) -> str:
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items(), key = lambda item: item[0])
+        lines = []
+        described = set()
+
+        def describe(name):
+            if name not in described:
+                kind, help_text = METRICS.get(name, ('untyped', ''))
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                described.add(name)
+
+        for (name, labels), value in counters:
+            describe(name)
+            lines.append(f"{name}{_labels(labels)} {_number(value)}")
+        for (name, labels), histogram in histograms:
+            describe(name)
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(labels + (('le', _number(bound)),))} {cumulative}")
+            lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(histogram.sum)}")
+            lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+    def render_markdown(self) -> str:
+        with self._lock:
+            counters = dict(self.counters)
+            histograms = dict(self.histograms)
+        content = "# MCP Server Metrics\n"
+
+        handlers = sorted(labels for name, labels in histograms if name == 'mcp_handler_duration_seconds')
+        if handlers:
+            content += "\n## Handlers\n\n"
+            content += "| kind | name | calls | errors | p50 (s) | p99 (s) | avg (s) | bytes |\n"
+            content += "|---|---|---|---|---|---|---|---|\n"
+            for labels in handlers:
+                histogram = histograms[('mcp_handler_duration_seconds', labels)]
+                values = dict(labels)
+                content += (f"| {values['kind']} | {values['name']} | {histogram.count} "
+                            f"| {_number(counters.get(('mcp_handler_errors_total', labels), 0))} "
+                            f"| {histogram.quantile(0.5):.4f} | {histogram.quantile(0.99):.4f} "
+                            f"| {histogram.sum / histogram.count:.4f} "
+                            f"| {_number(counters.get(('mcp_handler_payload_bytes_total', labels), 0))} |\n")
+
+        for title, name in (("Upstream", 'mcp_upstream_duration_seconds'),
+                            ("Serialization", 'mcp_serialization_duration_seconds')):
+            rows = sorted(labels for metric, labels in histograms if metric == name)
+            if not rows:
+                continue
+            content += f"\n## {title}\n\n"
+            for labels in rows:
+                histogram = histograms[(name, labels)]
+                content += (f"- **{', '.join(value for _, value in labels)}**: {histogram.count} calls, "
+                            f"p50 {histogram.quantile(0.5):.4f}s, p99 {histogram.quantile(0.99):.4f}s, "
+                            f"total {histogram.sum:.3f}s")
+                errors = counters.get(('mcp_upstream_errors_total', labels))
+                if errors:
+                    content += f", errors: {_number(errors)}"
+                content += "\n"
+
+        caches = sorted({labels for name, labels in counters
+                         if name in ('mcp_cache_hits_total', 'mcp_cache_misses_total',
+                                     'mcp_cache_waits_total')})
+        if caches:
+            content += "\n## Caches\n\n"
+            for labels in caches:
+                hits = counters.get(('mcp_cache_hits_total', labels), 0)
+                misses = counters.get(('mcp_cache_misses_total', labels), 0)
+                ratio = hits / (hits + misses) if hits + misses else 0.0
+                content += (f"- **{dict(labels)['cache']}**: {_number(hits)} hits, "
+                            f"{_number(misses)} misses, hit ratio {ratio:.2f}")
+                waits = counters.get(('mcp_cache_waits_total', labels))
+                if waits:
+                    content += f", waited for another process: {_number(waits)}"
+                content += "\n"
+        return content
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+metrics = MetricsRegistry()
+
+_tracer = None
+_tracer_ready = False
+
+def get_tracer():
+    """The OpenTelemetry tracer, or None if tracing is not configured or not installed."""
+    global _tracer, _tracer_ready
+    if _tracer_ready:
+        return _tracer
+    _tracer_ready = True
+    if not OTEL_ENDPOINT:
+        return None
+    try:
+        from opentelemetry import trace
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError:
+        return None
+    provider = TracerProvider(resource = Resource.create({'service.name': OTEL_SERVICE_NAME}))
+    # the exporter reads OTEL_EXPORTER_OTLP_ENDPOINT itself
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer('mcp_server')
+    return _tracer
+
+@contextmanager
+def span(name: str, attributes: Optional[Dict] = None):
+    tracer = get_tracer()
+    if tracer is None:
+        yield
+        return
+    with tracer.start_as_current_span(name, attributes = attributes or {}):
+        yield
+
+def _record(kind: str, name: str, started: float, result, failed: bool) -> None:
+    metrics.observe('mcp_handler_duration_seconds', time.perf_counter() - started,
+                    kind = kind, name = name)
+    metrics.inc('mcp_handler_calls_total', kind = kind, name = name)
+    if failed:
+        metrics.inc('mcp_handler_errors_total', kind = kind, name = name)
+    elif result is not None:
+        payload = result if isinstance(result, (str, bytes)) else str(result)
+        size = len(payload.encode('utf-8')) if isinstance(payload, str) else len(payload)
+        metrics.inc('mcp_handler_payload_bytes_total', size, kind = kind, name = name)
+
+def instrument(kind: str, name: Optional[str] = None):
+    """
+    Record latency, payload size and errors of an MCP handler.
+
+    Apply it below the FastMCP decorator. The wrapper keeps the signature
+    (so FastMCP builds the same schema) and stays a coroutine function for
+    async handlers.
+    """
+    def decorator(fn):
+        handler = name or fn.__name__
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                result = None
+                failed = True
+                with span(f"{kind} {handler}"):
+                    try:
+                        result = await fn(*args, **kwargs)
+                        failed = False
+                        return result
+                    finally:
+                        _record(kind, handler, started, result, failed)
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                result = None
+                failed = True
+                with span(f"{kind} {handler}"):
+                    try:
+                        result = fn(*args, **kwargs)
+                        failed = False
+                        return result
+                    finally:
+                        _record(kind, handler, started, result, failed)
+        return wrapper
+    return decorator
+
+def get_metrics() -> str:
+    return metrics.render_markdown()
+
+def get_prometheus_metrics() -> str:
+    return metrics.render_prometheus()
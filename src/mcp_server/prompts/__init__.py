@@ -1,7 +1,8 @@
 """Prompt templates for the MCP server"""
 
-from .clickhouse_query import CLICKHOUSE_PROMPT_TEMPLATE
+from .clickhouse_query import CLICKHOUSE_PROMPT_TEMPLATE, CLICKHOUSE_SCHEMA_PROMPT_TEMPLATE
 
 __all__ = [
     "CLICKHOUSE_PROMPT_TEMPLATE",
+    "CLICKHOUSE_SCHEMA_PROMPT_TEMPLATE",
 ]
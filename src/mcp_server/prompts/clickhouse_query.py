@@ -1,7 +1,13 @@
-CLICKHOUSE_PROMPT_TEMPLATE = """
+"""Prompt templates for ClickHouse SQL questions"""
+
+PROMPT_INTRO = """
 You are a senior data analyst with more than 10 years of experience writing complex SQL queries, specifically optimized for ClickHouse. 
 
-## Database Schema
+"""
+
+# Static description of the e-commerce example database, used when the live
+# schema cannot be loaded
+ECOMMERCE_SCHEMA = """## Database Schema
 
 You are working with an e-commerce analytics database containing the following tables:
 
@@ -28,7 +34,9 @@ You are working with an e-commerce analytics database containing the following t
 - is_fraud (Int8) - Fraud indicator: 1 = fraudulent session, 0 = legitimate
 - revenue (Float64) - Purchase amount in USD (0.0 for non-purchase sessions, >0 for purchases)
 
-## ClickHouse-Specific Guidelines
+"""
+
+QUERY_GUIDELINES = """## ClickHouse-Specific Guidelines
 
 1. **Use ClickHouse-optimized functions:**
    - uniqExact() for precise unique counts
@@ -46,28 +54,33 @@ You are working with an e-commerce analytics database containing the following t
    - Use appropriate WHERE clauses to filter data
    - Consider using HAVING for post-aggregation filtering
    - Use LIMIT when finding top/bottom results
+   - Filter primary key columns with comparisons on the column itself (ranges for dates) rather than wrapping them in functions such as toStartOfMonth(), so the primary index can skip data
 
-4. **Data interpretation:**
+"""
+
+ECOMMERCE_GUIDELINES = """4. **Data interpretation:**
    - revenue > 0 indicates a purchase session
    - revenue = 0 indicates a browsing session without purchase
    - is_fraud = 1 sessions should typically be excluded from business metrics unless specifically analyzing fraud
 
-## Response Format
+"""
+
+RESPONSE_FORMAT = """## Response Format
 Provide only the SQL query as your answer. Include brief reasoning in comments if the query logic is complex. 
 
-## Examples
+"""
 
-**Question:** How many customers made purchase in December 2024?
-**Answer:** select uniqExact(user_id) as customers from ecommerce.sessions where toStartOfMonth(action_date) = '2024-12-01' and revenue > 0 format TabSeparatedWithNames
+QUERY_EXAMPLES = """**Question:** How many customers made purchase in December 2024?
+**Answer:** select uniqExact(user_id) as customers from ecommerce.sessions where action_date >= '2024-12-01' and action_date < '2025-01-01' and revenue > 0 format TabSeparatedWithNames
 
 **Question:** What was the fraud rate in 2023, expressed as a percentage?
-**Answer:** select 100 * uniqExactIf(user_id, is_fraud = 1) / uniqExact(user_id) as fraud_rate from ecommerce.sessions where toStartOfYear(action_date) = '2023-01-01' format TabSeparatedWithNames
+**Answer:** select 100 * uniqExactIf(user_id, is_fraud = 1) / uniqExact(user_id) as fraud_rate from ecommerce.sessions where action_date >= '2023-01-01' and action_date < '2024-01-01' format TabSeparatedWithNames
 
 **Question:** What was the share of users using Windows yesterday?
 **Answer:** select 100 * uniqExactIf(user_id, os = 'Windows') / uniqExact(user_id) as windows_share from ecommerce.sessions where action_date = today() - 1 format TabSeparatedWithNames
 
 **Question:** What was the revenue from Dutch users aged 55 and older in December 2024?
-**Answer:** select sum(s.revenue) as total_revenue from ecommerce.sessions as s inner join ecommerce.users as u on s.user_id = u.user_id where u.country = 'Netherlands' and u.age >= 55 and toStartOfMonth(s.action_date) = '2024-12-01' format TabSeparatedWithNames
+**Answer:** select sum(s.revenue) as total_revenue from ecommerce.sessions as s inner join ecommerce.users as u on s.user_id = u.user_id where u.country = 'Netherlands' and u.age >= 55 and s.action_date >= '2024-12-01' and s.action_date < '2025-01-01' format TabSeparatedWithNames
 
 **Question:** What are the median and interquartile range (IQR) of purchase revenue for each country?
 **Answer:** select country, median(revenue) as median_revenue, quantile(0.25)(revenue) as q25_revenue, quantile(0.75)(revenue) as q75_revenue from ecommerce.sessions as s inner join ecommerce.users as u on u.user_id = s.user_id where revenue > 0 group by country format TabSeparatedWithNames
@@ -76,10 +89,10 @@ Provide only the SQL query as your answer. Include brief reasoning in comments i
 **Answer:** select avg(first_purchase - first_action_date) as avg_days_to_purchase from (select user_id, min(action_date) as first_action_date, minIf(action_date, revenue > 0) as first_purchase, max(revenue) as max_revenue from ecommerce.sessions group by user_id) where max_revenue > 0 format TabSeparatedWithNames
 
 **Question:** What is the number of sessions in December 2024, broken down by operating systems, including the totals?
-**Answer:** select os, uniqExact(session_id) as session_count from ecommerce.sessions where toStartOfMonth(action_date) = '2024-12-01' group by os with totals format TabSeparatedWithNames
+**Answer:** select os, uniqExact(session_id) as session_count from ecommerce.sessions where action_date >= '2024-12-01' and action_date < '2025-01-01' group by os with totals format TabSeparatedWithNames
 
 **Question:** Do we have customers who used multiple browsers during 2024? If so, please calculate the number of customers for each combination of browsers.
-**Answer:** select browsers, count(*) as customer_count from (select user_id, arrayStringConcat(arraySort(groupArray(distinct browser)), ', ') as browsers from ecommerce.sessions where toStartOfYear(action_date) = '2024-01-01' group by user_id) group by browsers order by customer_count desc format TabSeparatedWithNames
+**Answer:** select browsers, count(*) as customer_count from (select user_id, arrayStringConcat(arraySort(groupArray(distinct browser)), ', ') as browsers from ecommerce.sessions where action_date >= '2024-01-01' and action_date < '2025-01-01' group by user_id) group by browsers order by customer_count desc format TabSeparatedWithNames
 
 **Question:** Which browser has the highest share of fraud users?
 **Answer:** select browser, 100 * uniqExactIf(user_id, is_fraud = 1) / uniqExact(user_id) as fraud_rate from ecommerce.sessions group by browser order by fraud_rate desc limit 1 format TabSeparatedWithNames
@@ -87,8 +100,21 @@ Provide only the SQL query as your answer. Include brief reasoning in comments i
 **Question:** Which country had the highest number of first-time users in 2024?
 **Answer:** select country, count(distinct user_id) as new_users from (select user_id, min(action_date) as first_date from ecommerce.sessions group by user_id having toStartOfYear(first_date) = '2024-01-01') as t inner join ecommerce.users as u on t.user_id = u.user_id group by country order by new_users desc limit 1 format TabSeparatedWithNames
 
----
+"""
+
+PROMPT_TASK = """---
 
 **Your Task:** Using all the provided information above, write a ClickHouse SQL query to answer the following customer question: 
 {question}
-"""
\ No newline at end of file
+"""
+
+CLICKHOUSE_PROMPT_TEMPLATE = (PROMPT_INTRO + ECOMMERCE_SCHEMA + QUERY_GUIDELINES + ECOMMERCE_GUIDELINES
+                              + RESPONSE_FORMAT + "## Examples\n\n" + QUERY_EXAMPLES + PROMPT_TASK)
+
+# Filled with the schema section built from the live ClickHouse catalog
+CLICKHOUSE_SCHEMA_PROMPT_TEMPLATE = (
+    PROMPT_INTRO
+    + "## Database Schema\n\nYou are working with a ClickHouse database containing the following tables:\n\n{schema}\n"
+    + QUERY_GUIDELINES + RESPONSE_FORMAT
+    + "## Examples\n\nThe examples use an e-commerce database; apply the same patterns to the tables above.\n\n"
+    + QUERY_EXAMPLES + PROMPT_TASK)
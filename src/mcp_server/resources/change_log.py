@@ -1,70 +1,158 @@
+"""Resources provided by the MCP server"""
+import asyncio
 import os
 import json
+import re
+from urllib.parse import parse_qs, unquote
+
+from .change_log_store import ChangeLogStore, render_events
 
 # Get absolute path to change_log directory relative to this file
 CHANGE_LOG_DIR = os.path.join(os.path.dirname(__file__), 'change_log')
 
+DATE_RE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+CHANGELOG_DEFAULT_PAGE_SIZE = 100
+CHANGELOG_MAX_PAGE_SIZE = 1000
+
+# Parsed change logs, kept in memory until their files change
+change_log_store = ChangeLogStore(CHANGE_LOG_DIR)
+
+async def run_changelog(function, *args, indexed: bool = False) -> str:
+    """
+    Call a change log function, in a worker thread if it has files to parse.
+
+    Parsing may wait for another server process parsing the same file, so it
+    must not run on the event loop. Everything else is served from memory
+    and stays on the loop, where concurrent requests don't contend for the GIL.
+    """
+    if change_log_store.is_loaded(indexed):
+        return function(*args)
+    return await asyncio.to_thread(function, *args)
+
 def get_available_periods() -> str:
     """
     List all available time periods in the change log directory.
-    
+
     This resource provides a simple list of all available time periods.
     """
-    periods = []
-    
-    # Get all JSON files in the change log directory
-    if os.path.exists(CHANGE_LOG_DIR):
-        for filename in os.listdir(CHANGE_LOG_DIR):
-            if filename.endswith('.json'):
-                # Remove .json extension to get period name
-                period_name = filename[:-5]
-                periods.append(period_name)
-    
+    periods = change_log_store.periods()
+
     # Create a simple markdown list
     content = "# Available Change Log Periods\n\n"
     if periods:
-        for period in sorted(periods):
-            content += f"- {period}\n"
+        content += ''.join(f"- {period}\n" for period in periods)
         content += f"\nUse changelog://<period> to access change logs for that time period.\n"
     else:
         content += "No change log periods found.\n"
-    
+
     return content
 
+def parse_page(query: str):
+    """Parse "offset=&limit=" into (offset, limit); limit is None when no page was asked for."""
+    params = parse_qs(query)
+    if not params:
+        return 0, None
+    offset = int(params.get('offset', ['0'])[0])
+    limit = int(params.get('limit', [str(CHANGELOG_DEFAULT_PAGE_SIZE)])[0])
+    if offset < 0 or limit < 1:
+        raise ValueError("offset must be >= 0 and limit >= 1")
+    return offset, min(limit, CHANGELOG_MAX_PAGE_SIZE)
+
 def get_period_changelog(period: str) -> str:
     """
     Get detailed information about changes in a specific time period.
-    
+
     Args:
-        period: The time period to retrieve change logs for (e.g., "2025_q1" or "2025 Q2")
+        period: The time period to retrieve change logs for (e.g., "2025_q1" or "2025 Q2"),
+            optionally followed by "?offset=N&limit=M" to get one page of events
     """
+    period, _, query = period.partition('?')
+    try:
+        offset, limit = parse_page(query)
+    except ValueError:
+        return f"# Invalid page for period: {period}\n\nUse changelog://{period}?offset=<N>&limit=<M> with offset >= 0 and limit >= 1."
+
     # Construct filename directly
     period_filename = period.lower().replace(" ", "_")
-    changelog_file = os.path.join(CHANGE_LOG_DIR, f"{period_filename}.json")
-    
-    if not os.path.exists(changelog_file):
-        return f"# No change log found for period: {period}\n\nThe specified time period does not exist or has no recorded changes."
-    
+
     try:
-        with open(changelog_file, 'r') as f:
-            changelog_data = json.load(f)
-        
-        # Simple array format: [{"date": "...", "event": "...", "impact": "..."}, ...]
-        changes = changelog_data
-        content = f"# Change Log for {period.replace('_', ' ').title()}\n\n"
-        content += f"Total events: {len(changes)}\n\n"
-        
-        # Sort changes by date
-        sorted_changes = sorted(changes, key=lambda x: x.get('date', ''))
-        
-        for change in sorted_changes:
-            content += f"## {change.get('event', 'Untitled Event')}\n"
-            content += f"- **Date**: {change.get('date', 'Unknown')}\n"
-            content += f"- **Impact**: {change.get('impact', 'No impact description available.')}\n\n"
-            content += "---\n\n"
-        
+        log = change_log_store.get(period_filename)
+        if log is None:
+            return f"# No change log found for period: {period}\n\nThe specified time period does not exist or has no recorded changes."
+
+        title = f"# Change Log for {period.replace('_', ' ').title()}\n\n"
+        if limit is None:
+            # The body is rendered once per file version; only the title varies
+            return title + change_log_store.body(log)
+
+        end = min(offset + limit, len(log))
+        content = title + f"Total events: {len(log)}\n"
+        if offset >= len(log):
+            return content + f"\nNo events at offset {offset}.\n"
+        content += f"Showing events {offset + 1}-{end}\n\n"
+        content += change_log_store.page(log, offset, limit)
+        if end < len(log):
+            content += f"Next page: changelog://{period}?offset={end}&limit={limit}\n"
         return content
     except json.JSONDecodeError:
         return f"# Error reading change log data for {period}\n\nThe change log data file is corrupted."
     except Exception as e:
-        return f"# Error accessing change log for {period}\n\nError: {str(e)}"
\ No newline at end of file
+        return f"# Error accessing change log for {period}\n\nError: {str(e)}"
+
+def get_period_summary(period: str) -> str:
+    """
+    Get a compact overview of a period: event counts by month and the most common impact terms.
+
+    Args:
+        period: The time period to summarize (e.g., "2025_q1")
+    """
+    period_filename = period.lower().replace(" ", "_")
+
+    try:
+        log = change_log_store.get(period_filename)
+        if log is None:
+            return f"# No change log found for period: {period}\n\nThe specified time period does not exist or has no recorded changes."
+
+        return (f"# Change Log Summary for {period.replace('_', ' ').title()}\n\n"
+                + change_log_store.summary(log)
+                + f"\nUse changelog://{period}?offset=0&limit={CHANGELOG_DEFAULT_PAGE_SIZE} to page through the events.\n")
+    except json.JSONDecodeError:
+        return f"# Error reading change log data for {period}\n\nThe change log data file is corrupted."
+    except Exception as e:
+        return f"# Error accessing change log for {period}\n\nError: {str(e)}"
+
+def render_matches(matches) -> str:
+    return render_events((date, f"{event} ({period})", impact)
+                         for date, event, impact, period in matches)
+
+def get_changelog_range(date_range: str) -> str:
+    """
+    Get change log events across all periods between two dates.
+
+    Args:
+        date_range: Inclusive range in the form "YYYY-MM-DD..YYYY-MM-DD"
+    """
+    start, _, end = date_range.partition('..')
+    if not (DATE_RE.match(start) and DATE_RE.match(end)):
+        return f"# Invalid date range: {date_range}\n\nUse changelog://range/YYYY-MM-DD..YYYY-MM-DD, e.g. changelog://range/2024-11-01..2025-02-15."
+
+    matches = change_log_store.date_range(start, end)
+    content = f"# Change Log from {start} to {end}\n\n"
+    content += f"Total events: {len(matches)}\n\n"
+    return content + render_matches(matches)
+
+def search_changelog(query: str) -> str:
+    """
+    Find change log events whose title or impact contains every word of the query.
+
+    Args:
+        query: Search words (URL-encoded in the resource URI)
+    """
+    query = unquote(query).replace('+', ' ')
+    matches = change_log_store.search(query)
+    content = f"# Change Log Search: {query}\n\n"
+    content += f"Total events: {len(matches)}\n\n"
+    if not matches:
+        return content + "No events match the search.\n"
+    return content + render_matches(matches)
@@ -0,0 +1,281 @@
+"""In-process store of parsed change log files"""
+import bisect
+import json
+import os
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from ..shared_cache import get_shared_cache, make_key
+
+TOKEN_RE = re.compile(r"\w+")
+
+# Words too common in impact descriptions to say anything in a summary
+STOPWORDS = frozenset("""
+a an and are as at by for from in into of on or our the to up with
+increase increased resulting achieving improved improving
+""".split())
+SUMMARY_TOP_TERMS = 10
+
+# Parsed columns are kept in the cache shared by all server processes,
+# keyed by the file's path, size and modification time
+SHARED_NAMESPACE = 'change_logs'
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+@dataclass
+class PeriodLog:
+    """
+    Events of one period in columnar form, sorted by date.
+
+    Each column is a plain list, so event ``i`` is
+    ``(dates[i], events[i], impacts[i])``.
+    """
+    period: str
+    mtime: float
+    dates: List[str] = field(default_factory=list)
+    events: List[str] = field(default_factory=list)
+    impacts: List[str] = field(default_factory=list)
+    # rendered markdown body (everything below the title) and summary, built on first use
+    body: Optional[str] = None
+    summary: Optional[str] = None
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def row(self, i: int) -> Tuple[str, str, str]:
+        return self.dates[i], self.events[i], self.impacts[i]
+
+
+def render_events(rows) -> str:
+    """Render (date, event, impact) rows as markdown sections."""
+    parts = []
+    for date, event, impact in rows:
+        parts.append(f"## {event}\n"
+                     f"- **Date**: {date or 'Unknown'}\n"
+                     f"- **Impact**: {impact}\n\n"
+                     "---\n\n")
+    return ''.join(parts)
+
+
+def _iter_changes(f):
+    """Yield the events of a change log file, streaming it with ijson."""
+    # imported on the first parse, so it doesn't add to the server's start-up time
+    import ijson
+    try:
+        yield from ijson.items(f, 'item')
+    except ijson.JSONError as e:
+        raise json.JSONDecodeError(str(e), '', 0) from e
+
+
+def parse_period_file(path: str, period: str, mtime: float) -> PeriodLog:
+    """Parse a change log file into a PeriodLog. Raises json.JSONDecodeError on bad data."""
+    log = PeriodLog(period, mtime)
+    # Simple array format: [{"date": "...", "event": "...", "impact": "..."}, ...]
+    # Events go straight into the columns, so no list of dicts is ever held;
+    # undated events sort first and are rendered as "Unknown"
+    with open(path, 'rb') as f:
+        for change in _iter_changes(f):
+            log.dates.append(change.get('date', ''))
+            log.events.append(change.get('event', 'Untitled Event'))
+            log.impacts.append(change.get('impact', 'No impact description available.'))
+    dates = log.dates
+    if any(dates[i] > dates[i + 1] for i in range(len(dates) - 1)):
+        order = sorted(range(len(dates)), key=dates.__getitem__)
+        log.dates = [dates[i] for i in order]
+        log.events = [log.events[i] for i in order]
+        log.impacts = [log.impacts[i] for i in order]
+    return log
+
+
+def load_period_file(path: str, period: str, stat: os.stat_result) -> PeriodLog:
+    """
+    parse_period_file through the shared cache: only one server process
+    parses a file version, the others load its columns from the cache.
+    """
+    shared_cache = get_shared_cache()
+    if shared_cache is None:
+        return parse_period_file(path, period, stat.st_mtime)
+    parsed = []
+    def compute() -> bytes:
+        log = parse_period_file(path, period, stat.st_mtime)
+        parsed.append(log)
+        return json.dumps([log.dates, log.events, log.impacts]).encode()
+    value = shared_cache.get_or_compute(
+        SHARED_NAMESPACE, make_key(os.path.abspath(path), stat.st_size, stat.st_mtime_ns), compute)
+    if parsed:
+        return parsed[0]
+    dates, events, impacts = json.loads(value)
+    return PeriodLog(period, stat.st_mtime, dates, events, impacts)
+
+
+class ChangeLogStore:
+    """
+    Parses each change log file once and keeps it until the file changes.
+
+    Freshness is checked with a stat() of the file (and of the directory for
+    the list of periods) on every access, which is far cheaper than parsing.
+    Across all loaded periods the store keeps a date-sorted index and an
+    inverted token index, rebuilt only when some period was reloaded.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.RLock()
+        self._periods: Optional[List[str]] = None
+        self._periods_mtime: Optional[float] = None
+        self._logs: Dict[str, PeriodLog] = {}
+        self._index_key: Optional[Tuple] = None
+        # the logs the indexes point into; a period reloaded since keeps its old
+        # PeriodLog here until the indexes are rebuilt
+        self._index_logs: Dict[str, PeriodLog] = {}
+        self._date_index: List[Tuple[str, str, int]] = []
+        self._token_index: Dict[str, List[Tuple[str, int]]] = {}
+
+    def periods(self) -> List[str]:
+        """Sorted names of the available periods (JSON files in the directory)."""
+        try:
+            mtime = os.stat(self.directory).st_mtime
+        except FileNotFoundError:
+            return []
+        with self._lock:
+            if self._periods is None or self._periods_mtime != mtime:
+                self._periods = sorted(
+                    filename[:-5] for filename in os.listdir(self.directory)
+                    if filename.endswith('.json'))
+                self._periods_mtime = mtime
+            return self._periods
+
+    def path(self, period: str) -> str:
+        return os.path.join(self.directory, f"{period}.json")
+
+    def get(self, period: str) -> Optional[PeriodLog]:
+        """The parsed period, or None if it has no file. Raises json.JSONDecodeError on bad data."""
+        path = self.path(period)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._logs.pop(period, None)
+            return None
+        with self._lock:
+            log = self._logs.get(period)
+            if log is None or log.mtime != stat.st_mtime:
+                log = load_period_file(path, period, stat)
+                self._logs[period] = log
+            return log
+
+    def is_loaded(self, indexed: bool = False) -> bool:
+        """
+        Whether every period file is parsed in its current version and, with
+        indexed=True, the indexes are built over them. Only parsing can wait
+        for another server process (through the shared cache).
+        """
+        # never waits: a thread holding the lock may be waiting for another process
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            key = []
+            for period in self.periods():
+                try:
+                    mtime = os.stat(self.path(period)).st_mtime
+                except FileNotFoundError:
+                    continue
+                log = self._logs.get(period)
+                if log is None or log.mtime != mtime:
+                    return False
+                key.append((period, mtime))
+            return not indexed or tuple(key) == self._index_key
+        finally:
+            self._lock.release()
+
+    def body(self, log: PeriodLog) -> str:
+        """Markdown body of a period, rendered once per file version."""
+        if log.body is None:
+            log.body = (f"Total events: {len(log)}\n\n"
+                        + render_events(zip(log.dates, log.events, log.impacts)))
+        return log.body
+
+    def page(self, log: PeriodLog, offset: int, limit: int) -> str:
+        """Markdown for events ``offset`` to ``offset + limit`` of a period."""
+        end = offset + limit
+        return render_events(zip(log.dates[offset:end], log.events[offset:end],
+                                 log.impacts[offset:end]))
+
+    def summary(self, log: PeriodLog) -> str:
+        """Event counts by month and the most frequent impact terms, computed once per file version."""
+        if log.summary is None:
+            months = Counter(date[:7] for date in log.dates)
+            terms = Counter(token for impact in log.impacts for token in set(tokenize(impact))
+                            if token not in STOPWORDS and not token.isdigit())
+            parts = [f"Total events: {len(log)}\n\n", "## Events by Month\n\n"]
+            parts.extend(f"- {month or 'undated'}: {count}\n" for month, count in sorted(months.items()))
+            parts.append("\n## Top Impact Terms\n\n")
+            parts.extend(f"- {term}: {count}\n"
+                         for term, count in terms.most_common(SUMMARY_TOP_TERMS))
+            log.summary = ''.join(parts)
+        return log.summary
+
+    def _load_all(self) -> List[PeriodLog]:
+        logs = []
+        for period in self.periods():
+            try:
+                log = self.get(period)
+            except (json.JSONDecodeError, OSError):
+                # a broken file shouldn't hide the other periods
+                continue
+            if log is not None:
+                logs.append(log)
+        return logs
+
+    def _ensure_index(self) -> None:
+        logs = self._load_all()
+        key = tuple((log.period, log.mtime) for log in logs)
+        with self._lock:
+            if key == self._index_key:
+                return
+            date_index = []
+            token_index: Dict[str, List[Tuple[str, int]]] = {}
+            for log in logs:
+                for i, date in enumerate(log.dates):
+                    date_index.append((date, log.period, i))
+                    for token in set(tokenize(log.events[i]) + tokenize(log.impacts[i])):
+                        token_index.setdefault(token, []).append((log.period, i))
+            date_index.sort()
+            self._date_index = date_index
+            self._token_index = token_index
+            self._index_logs = {log.period: log for log in logs}
+            self._index_key = key
+
+    def _rows(self, matches) -> List[Tuple[str, str, str, str]]:
+        # called with the lock held, so the positions point into the logs
+        # the indexes were built from; rows of strings are not tracked by
+        # the garbage collector, unlike tuples holding a PeriodLog
+        logs = self._index_logs
+        return [logs[period].row(i) + (period,) for period, i in matches]
+
+    def date_range(self, start: str, end: str) -> List[Tuple[str, str, str, str]]:
+        """(date, event, impact, period) of events dated from start to end inclusive, in date order."""
+        self._ensure_index()
+        with self._lock:
+            lo = bisect.bisect_left(self._date_index, (start,))
+            # '\uffff' sorts after any period name, so end itself is included
+            hi = bisect.bisect_right(self._date_index, (end, '\uffff'))
+            return self._rows((period, i) for _, period, i in self._date_index[lo:hi])
+
+    def search(self, query: str) -> List[Tuple[str, str, str, str]]:
+        """(date, event, impact, period) of events containing every word of the query, in date order."""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        self._ensure_index()
+        with self._lock:
+            postings = [set(self._token_index.get(token, ())) for token in tokens]
+            logs = self._index_logs
+            return self._rows(sorted(set.intersection(*postings),
+                                     key=lambda match: (logs[match[0]].dates[match[1]], match)))
@@ -1,44 +1,215 @@
 from mcp.server.fastmcp import FastMCP
-from mcp_server.prompts import CLICKHOUSE_PROMPT_TEMPLATE
-from mcp_server.tools import execute_query, get_databases, get_table_schema, get_recent_prs, get_pr_details
-from mcp_server.resources.change_log import get_available_periods, get_period_changelog
+from mcp_server.metrics import get_metrics, get_prometheus_metrics, instrument, metrics
+from mcp_server.prompts import CLICKHOUSE_PROMPT_TEMPLATE, CLICKHOUSE_SCHEMA_PROMPT_TEMPLATE
+from mcp_server.tools.clickhouse_limits import CH_MAX_RESULT_ROWS
+from mcp_server.tools.result_store import RESULT_PAGE_SIZE, aggregate_result, list_results, page_result
+from mcp_server.resources.change_log import get_available_periods, get_period_changelog, get_period_summary, get_changelog_range, run_changelog, search_changelog
+import asyncio
 import os
 
 # Create an MCP server
 mcp = FastMCP("Analyst Toolkit")
 
+# The ClickHouse and GitHub backends are imported by the handlers on first
+# use, so an agent that spawns the server does not wait for them at startup
+
 # Database interaction tools
 
 @mcp.prompt()
-def sql_query_prompt(question: str) -> str:
-    """Create a SQL query prompt"""
-    return CLICKHOUSE_PROMPT_TEMPLATE.format(question=question)
+@instrument('prompt')
+async def sql_query_prompt(question: str) -> str:
+    """Create a SQL query prompt with the schema of the connected ClickHouse server"""
+    from mcp_server.tools.clickhouse import get_schema_prompt
+    schema = await get_schema_prompt()
+    if schema is None:
+        # ClickHouse is unreachable or has no tables: use the static example schema
+        return CLICKHOUSE_PROMPT_TEMPLATE.format(question=question)
+    return CLICKHOUSE_SCHEMA_PROMPT_TEMPLATE.format(schema=schema, question=question)
 
 @mcp.tool()
-def execute_sql_query(query: str) -> str:
+@instrument('tool')
+async def execute_sql_query(query: str, max_rows: int = CH_MAX_RESULT_ROWS,
+                            use_cache: bool = True, summarize: bool = False,
+                            spill: bool = False) -> str:
     """
     Execute a SQL query on the ClickHouse database.
     
     Args:
         query: SQL query string to execute against ClickHouse
+        max_rows: Maximum number of result rows to return (default: 1000)
+        use_cache: Serve repeated SELECT queries from the result cache (default: True).
+            Queries using now(), today() and similar functions always run.
+        summarize: Return a per-column digest (count, nulls, mean, std,
+            quantiles for numbers; distinct count and top values otherwise)
+            of up to a million rows instead of the rows themselves
+            (default: False). Useful to explore long or wide results.
+        spill: Store the full result locally and return a handle with a
+            preview (default: False). Use the handle with
+            get_query_result_page and aggregate_query_result instead of
+            re-running the query with different LIMITs.
+        
+    Returns:
+        Query results as tab-separated text (or the digest) followed by a
+        summary line (rows, bytes read, elapsed time, whether the result was
+        truncated) and the pre-flight estimate, or error message if query
+        fails. Queries estimated to read too much are not run; the estimate
+        and index usage are returned instead so the query can be narrowed.
+    """
+    from mcp_server.tools.clickhouse import execute_query
+    return await execute_query(query, max_rows = max_rows, use_cache = use_cache,
+                               summarize = summarize, spill = spill)
+
+@mcp.tool()
+@instrument('tool')
+async def execute_sql_queries(queries: list[str], max_rows: int = CH_MAX_RESULT_ROWS,
+                              use_cache: bool = True) -> str:
+    """
+    Execute several independent SQL queries on the ClickHouse database concurrently.
+    
+    Prefer this over several execute_sql_query calls when a question needs
+    multiple breakdowns or aggregates: the queries run in parallel, so the
+    total time is close to that of the slowest one.
+    
+    Args:
+        queries: SQL query strings to execute
+        max_rows: Maximum number of result rows to return per query (default: 1000)
+        use_cache: Serve repeated SELECT queries from the result cache (default: True)
         
     Returns:
-        Query results as tab-separated text if successful, or error message if query fails
+        One section per query, in the given order, with its time and result
+        (or error message), followed by the total wall time
     """
-    return execute_query(query)
+    from mcp_server.tools.clickhouse import execute_queries
+    return await execute_queries(queries, max_rows = max_rows, use_cache = use_cache)
 
 @mcp.tool()
-def list_databases() -> str:
+@instrument('tool')
+async def submit_sql_query(query: str, max_rows: int = CH_MAX_RESULT_ROWS,
+                           use_cache: bool = True, summarize: bool = False,
+                           spill: bool = False) -> str:
+    """
+    Start a SQL query on the ClickHouse database in the background.
+    
+    Use this instead of execute_sql_query for queries that may run for
+    minutes: it returns a query id at once, and the query keeps running
+    while you do other work.
+    
+    Args:
+        query: SQL query string to execute against ClickHouse
+        max_rows: Maximum number of result rows to keep (default: 1000)
+        use_cache: Serve repeated SELECT queries from the result cache (default: True)
+        summarize: Keep a per-column digest instead of the rows (default: False)
+        spill: Store the full result locally and keep a handle (default: False)
+        
+    Returns:
+        The query id to pass to get_sql_query_status and cancel_sql_query,
+        or error message
+    """
+    from mcp_server.tools.clickhouse import submit_query
+    return await submit_query(query, max_rows = max_rows, use_cache = use_cache,
+                              summarize = summarize, spill = spill)
+
+@mcp.tool()
+@instrument('tool')
+async def get_sql_query_status(query_id: str, wait_seconds: int = 0) -> str:
+    """
+    Check on a query started with submit_sql_query.
+    
+    Args:
+        query_id: Query id returned by submit_sql_query
+        wait_seconds: Wait up to this many seconds (at most 60) for the query
+            to finish before reporting (default: 0)
+        
+    Returns:
+        The result in the same form as execute_sql_query once the query has
+        finished; otherwise rows and bytes read so far, the estimated total
+        rows, memory use and elapsed time
+    """
+    from mcp_server.tools.clickhouse import get_query_status
+    return await get_query_status(query_id, wait_seconds)
+
+@mcp.tool()
+@instrument('tool')
+async def cancel_sql_query(query_id: str) -> str:
+    """
+    Cancel a query started with submit_sql_query and stop it on the server.
+    
+    Args:
+        query_id: Query id returned by submit_sql_query
+        
+    Returns:
+        Confirmation or error message
+    """
+    from mcp_server.tools.clickhouse import cancel_query
+    return await cancel_query(query_id)
+
+@mcp.tool()
+@instrument('tool')
+async def get_query_result_page(handle: str, offset: int = 0, limit: int = RESULT_PAGE_SIZE,
+                                sort_by: str | None = None, descending: bool = False,
+                                filters: list[str] | None = None) -> str:
+    """
+    Read rows of a stored query result without re-running the query.
+    
+    Args:
+        handle: Result handle returned by execute_sql_query with spill=True
+        offset: Number of rows to skip (default: 0)
+        limit: Number of rows to return (default: 100, at most 1000)
+        sort_by: Optional column to sort by before paging
+        descending: Sort in descending order (default: False)
+        filters: Optional conditions that all must hold, each as
+            "<column> <op> <value>" with op one of =, !=, >, >=, <, <=, contains
+            (e.g. ["country = US", "amount >= 100"])
+        
+    Returns:
+        Tab-separated rows with a header line, followed by the row range and
+        the offset of the next page, or error message
+    """
+    return await asyncio.to_thread(page_result, handle, offset, limit, sort_by,
+                                   descending, filters)
+
+@mcp.tool()
+@instrument('tool')
+async def aggregate_query_result(handle: str, aggregations: list[str],
+                                 group_by: list[str] | None = None,
+                                 filters: list[str] | None = None,
+                                 sort_by: str | None = None, descending: bool = True,
+                                 limit: int = RESULT_PAGE_SIZE) -> str:
+    """
+    Aggregate a stored query result locally without re-running the query.
+    
+    Args:
+        handle: Result handle returned by execute_sql_query with spill=True
+        aggregations: Aggregates to compute, e.g. ["count()", "sum(amount)",
+            "avg(amount)", "min(ts)", "max(ts)", "uniq(user_id)"]
+        group_by: Optional columns to group by
+        filters: Optional conditions applied before aggregating, in the same
+            form as for get_query_result_page
+        sort_by: Optional output column to sort by, e.g. "count()"
+        descending: Sort in descending order (default: True)
+        limit: Maximum number of groups to return (default: 100)
+        
+    Returns:
+        Tab-separated aggregated rows with a header line, or error message
+    """
+    return await asyncio.to_thread(aggregate_result, handle, aggregations, group_by,
+                                   filters, sort_by, descending, limit)
+
+@mcp.tool()
+@instrument('tool')
+async def list_databases() -> str:
     """
     List all databases in the ClickHouse server.
     
     Returns:
         Tab-separated text containing the list of databases
     """
-    return get_databases()
+    from mcp_server.tools.clickhouse import get_databases
+    return await get_databases()
 
 @mcp.tool()
-def describe_table(table_name: str) -> str:
+@instrument('tool')
+async def describe_table(table_name: str) -> str:
     """
     Get the schema of a specific table in the ClickHouse database.
     
@@ -48,30 +219,54 @@ def describe_table(table_name: str) -> str:
     Returns:
         Tab-separated text containing the table schema information
     """
-    return get_table_schema(table_name)
+    from mcp_server.tools.clickhouse import get_table_schema
+    return await get_table_schema(table_name)
+
+@mcp.tool()
+@instrument('tool')
+async def describe_tables(table_names: list[str]) -> str:
+    """
+    Get the schemas of several tables in the ClickHouse database in one call.
+    
+    Args:
+        table_names: Names of the tables to describe (e.g. ["ecommerce.users", "ecommerce.sessions"])
+        
+    Returns:
+        A section per table with its tab-separated schema information
+    """
+    from mcp_server.tools.clickhouse import get_tables_schema
+    return await get_tables_schema(table_names)
 
 
 # GitHub interaction tools
 
 @mcp.tool()
-def get_github_prs(repo_url: str, days: int = 7) -> str:
+@instrument('tool')
+async def get_github_prs(repo_url: str, days: int = 7, author: str | None = None,
+                         state: str | None = None, label: str | None = None) -> str:
     """
     Get list of PRs from the last N days.
     
     Args:
         repo_url: GitHub repository URL or owner/repo format
         days: Number of days to look back (default: 7)
+        author: Only PRs opened by this GitHub login (optional)
+        state: Only PRs in this state: "open", "closed" or "merged" (optional)
+        label: Only PRs with this label (optional)
         
     Returns:
         JSON string containing list of PR information, or error message
     """
     import json
+    from mcp_server.tools.github import get_recent_prs
     token = os.getenv('GITHUB_TOKEN')
-    result = get_recent_prs(repo_url, days, token)
-    return json.dumps(result, indent=2)
+    result = await get_recent_prs(repo_url, days, token, author=author, state=state, label=label)
+    with metrics.timer('mcp_serialization_duration_seconds', format='json'):
+        return json.dumps(result, indent=2)
 
 @mcp.tool()
-def get_github_pr_details(repo_url: str, pr_identifier: str) -> str:
+@instrument('tool')
+async def get_github_pr_details(repo_url: str, pr_identifier: str) -> str:
     """
     Get detailed information about a specific PR.
     
@@ -83,34 +278,208 @@ def get_github_pr_details(repo_url: str, pr_identifier: str) -> str:
         JSON string containing detailed PR information, or error message
     """
     import json
+    from mcp_server.tools.github import get_pr_details
     token = os.getenv('GITHUB_TOKEN')
-    result = get_pr_details(repo_url, pr_identifier, token)
-    return json.dumps(result, indent=2)
+    result = await get_pr_details(repo_url, pr_identifier, token)
+    with metrics.timer('mcp_serialization_duration_seconds', format='json'):
+        return json.dumps(result, indent=2)
+
+@mcp.tool()
+@instrument('tool')
+async def get_github_prs_details(repo_url: str, pr_identifiers: list[str]) -> str:
+    """
+    Get detailed information about several PRs in one call.
+    
+    Args:
+        repo_url: GitHub repository URL or owner/repo format
+        pr_identifiers: List of PR numbers or PR URLs
+        
+    Returns:
+        JSON string containing a list with detailed information for each PR
+    """
+    import json
+    from mcp_server.tools.github import get_prs_details
+    token = os.getenv('GITHUB_TOKEN')
+    result = await get_prs_details(repo_url, pr_identifiers, token)
+    with metrics.timer('mcp_serialization_duration_seconds', format='json'):
+        return json.dumps(result, indent=2)
+
+# GitHub resources
+
+@mcp.resource("github://scheduler/metrics")
+@instrument('resource')
+async def github_scheduler_metrics() -> str:
+    """
+    Queue depth, wait times and rate limit state of the GitHub request scheduler.
+    
+    Returns:
+        Markdown formatted scheduler metrics
+    """
+    from mcp_server.tools.github import get_scheduler_metrics
+    return get_scheduler_metrics()
+
+# ClickHouse resources
+
+@mcp.resource("clickhouse://cache/stats")
+@instrument('resource')
+def clickhouse_cache_stats() -> str:
+    """
+    Hit/miss counters and size of the ClickHouse query result cache.
+    
+    Returns:
+        Markdown formatted cache statistics
+    """
+    from mcp_server.tools.clickhouse import get_cache_stats
+    return get_cache_stats()
+
+@mcp.resource("clickhouse://cluster/health")
+@instrument('resource')
+async def clickhouse_cluster_health() -> str:
+    """
+    Ping all configured ClickHouse replicas and show their state.
+    
+    Returns:
+        Markdown formatted list of replicas per cluster with their state,
+        queries in flight and error counts
+    """
+    from mcp_server.tools.clickhouse import get_cluster_health
+    return await get_cluster_health()
+
+@mcp.resource("clickhouse://jobs")
+@instrument('resource')
+def clickhouse_query_jobs() -> str:
+    """
+    List queries started with submit_sql_query.
+    
+    Returns:
+        Markdown formatted list of query ids with their state and query
+    """
+    from mcp_server.tools.clickhouse import get_query_jobs
+    return get_query_jobs()
+
+@mcp.resource("clickhouse://results")
+@instrument('resource')
+def clickhouse_stored_results() -> str:
+    """
+    List query results stored with spill=True.
+    
+    Returns:
+        Markdown formatted list of result handles with their size and query
+    """
+    return list_results()
+
+# Metrics resources
+
+@mcp.resource("metrics://summary")
+@instrument('resource')
+def metrics_summary() -> str:
+    """
+    Get latency, payload size and error counts of all tools and resources.
+    
+    Returns:
+        Markdown formatted tables of handler, upstream, serialization and
+        cache metrics
+    """
+    return get_metrics()
+
+@mcp.resource("metrics://prometheus", mime_type="text/plain")
+@instrument('resource')
+def metrics_prometheus() -> str:
+    """
+    Get all metrics in the Prometheus text exposition format.
+    
+    Returns:
+        Prometheus text format metrics
+    """
+    return get_prometheus_metrics()
+
+# Cache resources
+
+@mcp.resource("cache://shared/stats")
+@instrument('resource')
+def shared_cache_stats() -> str:
+    """
+    Entries and size of the cache shared by all server processes.
+    
+    Returns:
+        Markdown formatted entry counts and bytes per namespace
+    """
+    from mcp_server.shared_cache import get_shared_cache_stats
+    return get_shared_cache_stats()
 
 # Change log resources
 
+# Loading a period can wait on another process parsing the same file through
+# the shared cache, so run_changelog moves the handlers that have to parse a
+# file to a worker thread, off the event loop
+
 @mcp.resource("changelog://periods")
-def changelog_periods() -> str:
+@instrument('resource')
+async def changelog_periods() -> str:
     """
     List all available change log periods.
     
     Returns:
         Markdown formatted list of available time periods
     """
-    return get_available_periods()
+    return await run_changelog(get_available_periods)
+
+@mcp.resource("changelog://range/{date_range}")
+@instrument('resource')
+async def changelog_for_range(date_range: str) -> str:
+    """
+    Get change log events across all periods between two dates.
+    
+    Args:
+        date_range: Inclusive date range, e.g. "2024-11-01..2025-02-15"
+        
+    Returns:
+        Markdown formatted change log for the date range
+    """
+    return await run_changelog(get_changelog_range, date_range, indexed = True)
+
+@mcp.resource("changelog://search/{query}")
+@instrument('resource')
+async def changelog_search(query: str) -> str:
+    """
+    Search change log events by keywords.
+    
+    Args:
+        query: Words that must all appear in the event title or impact
+        
+    Returns:
+        Markdown formatted list of matching events
+    """
+    return await run_changelog(search_changelog, query, indexed = True)
+
+@mcp.resource("changelog://{period}/summary")
+@instrument('resource')
+async def changelog_summary_for_period(period: str) -> str:
+    """
+    Get event counts by month and top impact terms for a time period.
+    
+    Args:
+        period: The time period identifier (e.g., "2025_q1")
+        
+    Returns:
+        Markdown formatted summary of the period
+    """
+    return await run_changelog(get_period_summary, period)
 
 @mcp.resource("changelog://{period}")
-def changelog_for_period(period: str) -> str:
+@instrument('resource')
+async def changelog_for_period(period: str) -> str:
     """
     Get change log for a specific time period.
     
     Args:
-        period: The time period identifier (e.g., "2025_q1" or "2025 Q2")
+        period: The time period identifier (e.g., "2025_q1" or "2025 Q2"),
+            optionally with "?offset=N&limit=M" for one page of events
         
     Returns:
         Markdown formatted change log for the specified period
     """
-    return get_period_changelog(period)
+    return await run_changelog(get_period_changelog, period)
 
 # Run the server
 if __name__ == "__main__":
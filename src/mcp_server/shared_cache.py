@@ -0,0 +1,299 @@
+"""Cache shared by all server processes on this machine"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from .metrics import metrics
+
+CACHE_DIR = os.getenv(
+    'MCP_ANALYST_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'mcp-analyst-toolkit'))
+
+# Every agent session runs its own server process; they all share one
+# SQLite database, so a result computed by one process serves the others
+SHARED_CACHE_ENABLED = os.getenv('MCP_SHARED_CACHE', '1') != '0'
+SHARED_CACHE_PATH = os.path.join(CACHE_DIR, 'shared_cache.sqlite3')
+SHARED_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# How long a process may hold the right to compute an entry; others wait
+# for it to finish (or to die) instead of computing the entry themselves
+SHARED_CACHE_LEASE_TTL = 60
+SHARED_CACHE_POLL_MIN = 0.02
+SHARED_CACHE_POLL_MAX = 0.5
+
+SCHEMA = """
+create table if not exists entries (
+    namespace text not null,
+    key text not null,
+    value blob not null,
+    size integer not null,
+    expires_at real,
+    accessed_at real not null,
+    primary key (namespace, key)
+);
+create index if not exists entries_accessed_at on entries (accessed_at);
+create table if not exists leases (
+    namespace text not null,
+    key text not null,
+    owner text not null,
+    expires_at real not null,
+    primary key (namespace, key)
+);
+"""
+
+
+def make_key(*parts) -> str:
+    """Fixed-length key for any JSON-serializable parts."""
+    return hashlib.sha256(json.dumps(parts, default=str).encode()).hexdigest()
+
+
+def _owner_alive(owner: str) -> bool:
+    """Whether the process holding a lease (``<pid>:<token>``) still runs."""
+    try:
+        os.kill(int(owner.split(':', 1)[0]), 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, ValueError):
+        pass
+    return True
+
+
+class SharedCache:
+    """
+    SQLite-backed key/value cache shared by all server processes.
+
+    Entries live in namespaces (one per kind of data) and expire after their
+    own TTL, or never if it is None. Values are stored compressed; when they
+    take more than ``max_bytes``, expired entries go first and then the least
+    recently used ones. The database runs in WAL mode with a busy timeout,
+    so processes read concurrently and take turns writing.
+
+    ``get_or_compute`` protects against stampedes: on a miss the first process
+    takes a lease on the key and computes the value, while the others poll
+    until it is stored. A lease expires after ``lease_ttl`` seconds, and a
+    lease whose process has died is taken over right away.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False,
+                                   isolation_level=None)
+            conn.execute('pragma journal_mode=wal')
+            conn.execute('pragma synchronous=normal')
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _read(self, conn: sqlite3.Connection, namespace: str, key: str) -> Optional[bytes]:
+        now = time.time()
+        row = conn.execute(
+            'select value, expires_at from entries where namespace = ? and key = ?',
+            (namespace, key)).fetchone()
+        if row is None or (row[1] is not None and row[1] <= now):
+            return None
+        conn.execute('update entries set accessed_at = ? where namespace = ? and key = ?',
+                     (now, namespace, key))
+        return row[0]
+
+    def get(self, namespace: str, key: str) -> Optional[bytes]:
+        with self._lock:
+            value = self._read(self._connect(), namespace, key)
+        return None if value is None else zlib.decompress(value)
+
+    def put(self, namespace: str, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        compressed = zlib.compress(value)
+        if len(compressed) > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute('begin immediate')
+            try:
+                conn.execute(
+                    'insert or replace into entries '
+                    '(namespace, key, value, size, expires_at, accessed_at) '
+                    'values (?, ?, ?, ?, ?, ?)',
+                    (namespace, key, compressed, len(compressed),
+                     None if ttl is None else now + ttl, now))
+                self._evict(conn, now)
+                conn.execute('commit')
+            except BaseException:
+                conn.execute('rollback')
+                raise
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        total = conn.execute('select coalesce(sum(size), 0) from entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        conn.execute('delete from entries where expires_at <= ?', (now,))
+        total = conn.execute('select coalesce(sum(size), 0) from entries').fetchone()[0]
+        # free a bit more than needed so we don't evict on every insert
+        target = int(self.max_bytes * 0.9)
+        for namespace, key, size in conn.execute(
+                'select namespace, key, size from entries order by accessed_at').fetchall():
+            if total <= target:
+                break
+            conn.execute('delete from entries where namespace = ? and key = ?', (namespace, key))
+            total -= size
+
+    def delete(self, namespace: str, key: str) -> None:
+        with self._lock:
+            self._connect().execute('delete from entries where namespace = ? and key = ?',
+                                    (namespace, key))
+
+    def clear(self, namespace: Optional[str] = None) -> None:
+        with self._lock:
+            conn = self._connect()
+            if namespace is None:
+                conn.execute('delete from entries')
+            else:
+                conn.execute('delete from entries where namespace = ?', (namespace,))
+
+    def _claim(self, namespace: str, key: str,
+               lease_ttl: float) -> Tuple[Optional[bytes], Optional[str]]:
+        """
+        The cached value, or else a lease to compute it: (value, None) on a
+        hit, (None, owner) if the lease was taken, (None, None) if another
+        live process holds it.
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute('begin immediate')
+            try:
+                value = self._read(conn, namespace, key)
+                owner = None
+                if value is None:
+                    lease = conn.execute(
+                        'select owner, expires_at from leases where namespace = ? and key = ?',
+                        (namespace, key)).fetchone()
+                    if lease is None or lease[1] <= now or not _owner_alive(lease[0]):
+                        owner = f"{os.getpid()}:{uuid.uuid4().hex}"
+                        conn.execute(
+                            'insert or replace into leases (namespace, key, owner, expires_at) '
+                            'values (?, ?, ?, ?)', (namespace, key, owner, now + lease_ttl))
+                conn.execute('commit')
+            except BaseException:
+                conn.execute('rollback')
+                raise
+        return (None if value is None else zlib.decompress(value)), owner
+
+    def _release(self, namespace: str, key: str, owner: str) -> None:
+        with self._lock:
+            self._connect().execute(
+                'delete from leases where namespace = ? and key = ? and owner = ?',
+                (namespace, key, owner))
+
+    def _claim_or_wait(self, namespace: str, key: str, lease_ttl: float, waited: bool):
+        value, owner = self._claim(namespace, key, lease_ttl)
+        if value is not None:
+            metrics.inc('mcp_cache_hits_total', cache=f"shared:{namespace}")
+        elif owner is not None:
+            metrics.inc('mcp_cache_misses_total', cache=f"shared:{namespace}")
+        elif not waited:
+            metrics.inc('mcp_cache_waits_total', cache=f"shared:{namespace}")
+        return value, owner
+
+    def get_or_compute(self, namespace: str, key: str, compute: Callable[[], Optional[bytes]],
+                       ttl: Optional[float] = None,
+                       lease_ttl: float = SHARED_CACHE_LEASE_TTL) -> Optional[bytes]:
+        """
+        The cached value, computed by this process if no other process is
+        computing it already. A None from ``compute`` is returned but not stored.
+        """
+        delay = SHARED_CACHE_POLL_MIN
+        waited = False
+        while True:
+            value, owner = self._claim_or_wait(namespace, key, lease_ttl, waited)
+            if value is not None:
+                return value
+            if owner is not None:
+                break
+            time.sleep(delay)
+            delay = min(delay * 2, SHARED_CACHE_POLL_MAX)
+            waited = True
+        try:
+            value = compute()
+            if value is not None:
+                self.put(namespace, key, value, ttl)
+            return value
+        finally:
+            self._release(namespace, key, owner)
+
+    async def aget_or_compute(self, namespace: str, key: str,
+                              compute: Callable[[], Awaitable[Optional[bytes]]],
+                              ttl: Optional[float] = None,
+                              lease_ttl: float = SHARED_CACHE_LEASE_TTL) -> Optional[bytes]:
+        """
+        get_or_compute for a coroutine function. Neither waiting nor the
+        SQLite transactions (which may wait for the busy timeout) block the
+        event loop: they run in worker threads.
+        """
+        delay = SHARED_CACHE_POLL_MIN
+        waited = False
+        while True:
+            value, owner = await asyncio.to_thread(
+                self._claim_or_wait, namespace, key, lease_ttl, waited)
+            if value is not None:
+                return value
+            if owner is not None:
+                break
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, SHARED_CACHE_POLL_MAX)
+            waited = True
+        try:
+            value = await compute()
+            if value is not None:
+                await asyncio.to_thread(self.put, namespace, key, value, ttl)
+            return value
+        finally:
+            await asyncio.to_thread(self._release, namespace, key, owner)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Entries and stored bytes by namespace."""
+        with self._lock:
+            rows = self._connect().execute(
+                'select namespace, count(*), sum(size), sum(expires_at <= ?) from entries '
+                'group by namespace order by namespace', (time.time(),)).fetchall()
+        return {namespace: {'entries': entries, 'bytes': size, 'expired': expired or 0}
+                for namespace, entries, size, expired in rows}
+
+
+_shared_cache: Optional[SharedCache] = None
+
+
+def get_shared_cache() -> Optional[SharedCache]:
+    """The process-wide SharedCache, or None when MCP_SHARED_CACHE=0."""
+    global _shared_cache
+    if SHARED_CACHE_ENABLED and _shared_cache is None:
+        _shared_cache = SharedCache(SHARED_CACHE_PATH, SHARED_CACHE_MAX_BYTES)
+    return _shared_cache
+
+
+def get_shared_cache_stats() -> str:
+    cache = get_shared_cache()
+    content = "# Shared Cache\n\n"
+    if cache is None:
+        return content + "Disabled (MCP_SHARED_CACHE=0).\n"
+    content += f"- **path**: {cache.path}\n- **max_bytes**: {cache.max_bytes}\n"
+    namespaces = cache.stats()
+    if not namespaces:
+        return content + "\nNo entries.\n"
+    content += "\n| Namespace | Entries | Bytes | Expired |\n|---|---|---|---|\n"
+    for namespace, stats in namespaces.items():
+        content += f"| {namespace} | {stats['entries']} | {stats['bytes']} | {stats['expired']} |\n"
+    return content
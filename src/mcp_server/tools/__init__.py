@@ -1,19 +1,28 @@
 """Tools provided by the MCP server"""
+import importlib
 
-from .clickhouse import (
-    execute_query,
-    get_databases,
-    get_table_schema
-)
-from .github import (
-    get_recent_prs,
-    get_pr_details
-)
+# Re-exported names and the modules that define them. The modules are
+# imported on first access, so importing one tool module does not load
+# every backend.
+_EXPORTS = {
+    "execute_query": ".clickhouse",
+    "execute_queries": ".clickhouse",
+    "get_databases": ".clickhouse",
+    "get_table_schema": ".clickhouse",
+    "get_tables_schema": ".clickhouse",
+    "get_recent_prs": ".github",
+    "get_pr_details": ".github",
+    "get_prs_details": ".github",
+}
 
-__all__ = [
-    "execute_query",
-    "get_databases",
-    "get_table_schema",
-    "get_recent_prs",
-    "get_pr_details"
-]
+__all__ = list(_EXPORTS)
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
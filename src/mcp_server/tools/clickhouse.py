@@ -1,20 +1,853 @@
-import requests
-import io
-import pandas as pd
-CH_HOST = 'http://localhost:8123' # default address 
-
-def execute_query(query, host = CH_HOST, connection_timeout = 1500):
-  r = requests.post(host, params = {'query': query}, 
-    timeout = connection_timeout)
-  if r.status_code == 200:
-      return r.text
-  else: 
-      return 'Database returned the following error:\n' + r.text
-      # giving feedback to LLM instead of raising exception
-
-def get_databases(host = CH_HOST, connection_timeout = 1500):
-    return execute_query('show databases', host, connection_timeout)
-
-def get_table_schema(table_name, host = CH_HOST, connection_timeout = 1500):
+import asyncio
+import json
+import re
+import time
+import uuid
+from dataclasses import asdict, dataclass, replace
+from typing import BinaryIO, Optional, Union
+
+import httpx
+
+from ..metrics import metrics
+from ..shared_cache import get_shared_cache, make_key
+from .clickhouse_cluster import (
+    CH_DEFAULT_CLUSTER,
+    CH_HOSTS,
+    Cluster,
+    is_read_query,
+    parse_hosts
+)
+from .clickhouse_limits import CH_MAX_RESULT_BYTES, CH_MAX_RESULT_ROWS
+from .query_cache import QueryCache, is_cacheable, is_deterministic, normalize_query
+from .query_guard import (
+    CH_GUARD_MAX_ROWS,
+    CH_GUARD_MODE,
+    CH_GUARD_SMALL_LIMIT,
+    Estimate,
+    estimate_query,
+    format_estimate,
+    format_rejection,
+    indexes_query,
+    is_guarded,
+    parse_estimate,
+    parse_index_usage,
+    top_level_limit
+)
+from .query_jobs import (
+    CANCELLED,
+    CH_JOB_MAX_WAIT,
+    CH_JOBS_MAX,
+    FAILED,
+    FINISHED,
+    Job,
+    JobTable,
+    parse_progress,
+    progress_query,
+    render_job,
+    render_jobs,
+    render_progress
+)
+from .result_store import (
+    RESULT_PREVIEW_ROWS,
+    ResultStoreError,
+    describe_result,
+    render_table,
+    result_store
+)
+from .result_summary import have_pyarrow, summarize_arrow, summarize_table
+from .schema_catalog import CATALOG_REFRESH_INTERVAL, SchemaCatalog, render_describe
+from .schema_prompt import PROMPT_SAMPLE_TIMEOUT, PROMPT_SAMPLES_TTL, SchemaPrompt
+
+CH_HOST = 'http://localhost:8123' # default address, used when CH_HOSTS is not set
+CH_PING_TIMEOUT = 2
+# How long sql_query_prompt waits for live schema metadata before falling back
+CH_PROMPT_TIMEOUT = 10
+
+# Connection pool shared by all tool calls, so concurrent agents reuse
+# keep-alive connections instead of paying TCP setup on every query
+CH_MAX_CONNECTIONS = 20
+CH_MAX_KEEPALIVE_CONNECTIONS = 10
+CH_KEEPALIVE_EXPIRY = 30
+CH_CONNECT_TIMEOUT = 10
+CH_KILL_TIMEOUT = 10
+
+# Queries this server runs at once against one ClickHouse host; the rest wait
+CH_MAX_CONCURRENT_QUERIES = 8
+# Passed to ClickHouse for execute_queries batches, so the server itself
+# refuses to run more than this many queries of our user at once
+CH_MAX_CONCURRENT_QUERIES_FOR_USER = 20
+
+# Result cache for repeated queries
+CH_CACHE_MAX_BYTES = 64 * 1024 * 1024
+CH_CACHE_TTL = 300
+CH_CACHE_NONDETERMINISTIC = False # cache queries using now(), today(), ...
+# Results and schema metadata are also kept in the cache shared by all
+# server processes, under these namespaces
+CH_SHARED_RESULTS = 'clickhouse_results'
+CH_SHARED_SCHEMA = 'clickhouse_schema'
+
+# Summarize mode reads the whole result as Arrow and returns only a digest,
+# so it can afford a much larger budget than rows shown to the LLM
+CH_SUMMARIZE_MAX_ROWS = 1_000_000
+CH_SUMMARIZE_MAX_BYTES = 256 * 1024 * 1024
+# Spilled results go to a local file instead of the LLM
+CH_SPILL_MAX_ROWS = 0
+CH_SPILL_MAX_BYTES = 1024 * 1024 * 1024
+# and written to it from a worker thread, in batches of about this size
+CH_SPILL_WRITE_BYTES = 4 * 1024 * 1024
+ARROW_SETTINGS = {
+    'output_format_arrow_string_as_string': 1,
+    'output_format_arrow_low_cardinality_as_dictionary': 0,
+}
+
+_FORMAT_RE = re.compile(r'\bformat\s+(\w+)\s*;?\s*$', re.IGNORECASE)
+
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+_background_tasks = set()
+_query_slots = {}
+_clusters = {}
+
+query_cache = QueryCache(CH_CACHE_MAX_BYTES, CH_CACHE_TTL)
+_catalogs = {}
+_schema_prompts = {}
+query_jobs = JobTable()
+
+@dataclass
+class QueryResult:
+    text: str
+    query_id: str
+    ok: bool = True
+    rows: int = 0
+    result_bytes: int = 0
+    read_rows: int = 0
+    read_bytes: int = 0
+    # read_rows/read_bytes are the progress when the result started streaming
+    read_partial: bool = False
+    elapsed: float = 0.0
+    truncated: bool = False
+    cached: bool = False
+    # raw response body, only kept for binary formats
+    data: bytes = b''
+    # pre-flight estimate line(s) shown with the summary
+    estimate: str = ''
+    # the host could not be reached, so the query never ran
+    unreachable: bool = False
+
+class QueryError(str):
+    """Text returned instead of a result when a query fails or is not run."""
+
+def get_client() -> httpx.AsyncClient:
+    """Return the pooled HTTP client bound to the running event loop."""
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client = httpx.AsyncClient(
+            limits = httpx.Limits(
+                max_connections = CH_MAX_CONNECTIONS,
+                max_keepalive_connections = CH_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry = CH_KEEPALIVE_EXPIRY))
+        _client_loop = loop
+    return _client
+
+async def kill_query(query_id: str, host: str = CH_HOST) -> None:
+    # a separate short request: the connection running the query is busy
+    await get_client().post(host,
+        params = {'query': f"KILL QUERY WHERE query_id = '{query_id}' ASYNC"},
+        timeout = CH_KILL_TIMEOUT)
+
+def _kill_in_background(query_id: str, host: str) -> None:
+    # the cancelled task cannot await anymore, so the kill runs as its own task
+    task = asyncio.get_running_loop().create_task(kill_query(query_id, host))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+def _header_lines(query: str) -> int:
+    # number of leading lines that are column names/types, not rows
+    match = _FORMAT_RE.search(query)
+    fmt = match.group(1).lower() if match else ''
+    if fmt.endswith('withnamesandtypes'):
+        return 2
+    if fmt.endswith('withnames'):
+        return 1
+    return 0
+
+async def ping(host: str) -> bool:
+    try:
+        r = await get_client().get(f"{host}/ping", timeout = CH_PING_TIMEOUT)
+    except httpx.HTTPError:
+        return False
+    return r.status_code == 200
+
+def get_cluster(name: str = CH_DEFAULT_CLUSTER) -> Optional[Cluster]:
+    """The configured cluster with this name, or None."""
+    if not _clusters:
+        for cluster_name, hosts in parse_hosts(CH_HOSTS, CH_HOST).items():
+            _clusters[cluster_name] = Cluster(cluster_name, hosts, ping)
+    return _clusters.get(name)
+
+def query_slots(host: str) -> asyncio.Semaphore:
+    """Semaphore capping the queries running at once on a host (per event loop)."""
+    loop = asyncio.get_running_loop()
+    slots = _query_slots.get(host)
+    if slots is None or slots[0] is not loop:
+        slots = _query_slots[host] = (loop, asyncio.Semaphore(CH_MAX_CONCURRENT_QUERIES))
+    return slots[1]
+
+async def run_query(query, host: Optional[str] = None, connection_timeout = 1500,
+                    query_id: Optional[str] = None,
+                    max_rows: int = CH_MAX_RESULT_ROWS,
+                    max_bytes: int = CH_MAX_RESULT_BYTES,
+                    binary: bool = False,
+                    settings: Optional[dict] = None,
+                    sink: Optional[BinaryIO] = None) -> QueryResult:
+    """
+    Stream a query result, keeping at most max_rows rows and max_bytes bytes.
+
+    The response is read chunk by chunk and reading stops once either budget
+    is spent, so memory use does not depend on the size of the full result.
+    Binary formats cannot be cut at a line boundary: with binary=True the
+    budget is left to ClickHouse alone and the body is returned in ``data``,
+    or written to ``sink`` chunk by chunk if one is given.
+
+    ``host`` is either a URL or the name of a cluster from CH_HOSTS (None
+    for the default cluster). Cluster queries go to the replica chosen by
+    the load balancer; reads that cannot reach a replica are sent to the
+    next one. At most CH_MAX_CONCURRENT_QUERIES queries run on a host at
+    once; the others wait here before the query is sent.
+    """
+    if host is not None and '://' in host:
+        async with query_slots(host):
+            return await _stream_query(query, host, connection_timeout, query_id,
+                                       max_rows, max_bytes, binary, settings, sink)
+
+    cluster = get_cluster(host or CH_DEFAULT_CLUSTER)
+    if cluster is None:
+        return QueryResult(text = f'Unknown ClickHouse cluster: {host}',
+                           query_id = query_id or '', ok = False)
+    # reads are safe to send again; writes are only sent once
+    retry = is_read_query(query)
+    tried = []
+    result = None
+    while True:
+        replica = await cluster.choose(exclude = tried)
+        if replica is None:
+            if result is not None:
+                return result
+            return QueryResult(text = f'No available ClickHouse replica in cluster {cluster.name}',
+                               query_id = query_id or '', ok = False)
+        tried.append(replica.host)
+        replica.in_flight += 1
+        replica.requests += 1
+        try:
+            async with query_slots(replica.host):
+                result = await _stream_query(query, replica.host, connection_timeout, query_id,
+                                             max_rows, max_bytes, binary, settings, sink)
+        finally:
+            replica.in_flight -= 1
+        if not result.unreachable:
+            replica.record_success()
+            return result
+        replica.record_failure(result.text)
+        if not retry:
+            return result
+
+async def _stream_query(query, host, connection_timeout, query_id, max_rows,
+                        max_bytes, binary, settings, sink) -> QueryResult:
+    # run_query() once a query slot is free
+    query_id = query_id or str(uuid.uuid4())
+    header_lines = _header_lines(query)
+    # a budget of 0 means no limit, same as for the ClickHouse settings
+    line_budget = max_rows + header_lines if max_rows > 0 else float('inf')
+    byte_budget = max_bytes if max_bytes > 0 else float('inf')
+    # X-ClickHouse-Summary is sent with the response headers, before the
+    # body; ClickHouse only knows the final read stats by then if it holds
+    # the result back until the query ends. Budgeted text results are small
+    # enough for that, binary and unbudgeted ones keep streaming.
+    final_stats = not binary and (max_rows > 0 or max_bytes > 0)
+    params = {
+        'query': query,
+        'query_id': query_id,
+        # let ClickHouse stop producing rows past the budget as well
+        'max_result_rows': max_rows,
+        'max_result_bytes': max_bytes,
+        'result_overflow_mode': 'break',
+        'cancel_http_readonly_queries_on_client_close': 1,
+        **({'wait_end_of_query': 1} if final_stats else {}),
+        **(settings or {}),
+    }
+    timeout = httpx.Timeout(connection_timeout, connect = CH_CONNECT_TIMEOUT)
+    result = QueryResult(text = '', query_id = query_id, read_partial = not final_stats)
+    started = time.monotonic()
+    chunks = []
+    lines = 0
+    kept = 0
+    responded = False
+    try:
+        async with get_client().stream('POST', host, params = params,
+                                       timeout = timeout) as r:
+            responded = True
+            _read_summary(result, r.headers.get('X-ClickHouse-Summary'))
+            if r.status_code != 200:
+                body = await r.aread()
+                result.ok = False
+                result.text = ('Database returned the following error:\n'
+                               + body.decode('utf-8', errors = 'replace'))
+                # giving feedback to LLM instead of raising exception
+                return result
+            if binary:
+                if sink is None:
+                    result.data = await r.aread()
+                    result.result_bytes = len(result.data)
+                    return result
+                pending = []
+                pending_bytes = 0
+                async for chunk in r.aiter_bytes():
+                    pending.append(chunk)
+                    pending_bytes += len(chunk)
+                    result.result_bytes += len(chunk)
+                    if pending_bytes >= CH_SPILL_WRITE_BYTES:
+                        # disk writes would block the event loop
+                        await asyncio.to_thread(sink.writelines, pending)
+                        pending, pending_bytes = [], 0
+                if pending:
+                    await asyncio.to_thread(sink.writelines, pending)
+                return result
+            async for chunk in r.aiter_bytes():
+                newlines = chunk.count(b'\n')
+                if (lines + newlines <= line_budget
+                        and kept + len(chunk) <= byte_budget):
+                    chunks.append(chunk)
+                    lines += newlines
+                    kept += len(chunk)
+                    continue
+                # keep the complete lines that still fit and stop reading
+                end = 0
+                while lines < line_budget:
+                    pos = chunk.find(b'\n', end)
+                    if pos == -1 or kept + pos + 1 > byte_budget:
+                        break
+                    end = pos + 1
+                    lines += 1
+                chunks.append(chunk[:end])
+                kept += end
+                result.truncated = True
+                break
+    except asyncio.CancelledError:
+        _kill_in_background(query_id, host)
+        raise
+    except httpx.ConnectTimeout as e:
+        result.ok = False
+        result.unreachable = True
+        result.text = f'Could not connect to the database: {e or "connection timed out"}'
+        return result
+    except httpx.TimeoutException:
+        _kill_in_background(query_id, host)
+        result.ok = False
+        result.text = f'Query {query_id} timed out after {connection_timeout} seconds'
+        return result
+    except httpx.HTTPError as e:
+        result.ok = False
+        # nothing was received, so the query can be sent to another replica
+        result.unreachable = not responded and isinstance(e, httpx.TransportError)
+        result.text = f'Could not connect to the database: {e}'
+        return result
+    finally:
+        result.elapsed = time.monotonic() - started
+        metrics.observe('mcp_upstream_duration_seconds', result.elapsed, service = 'clickhouse')
+        metrics.inc('mcp_upstream_requests_total', service = 'clickhouse')
+        if not result.ok:
+            metrics.inc('mcp_upstream_errors_total', service = 'clickhouse')
+
+    text = b''.join(chunks).decode('utf-8', errors = 'replace')
+    if text and not text.endswith('\n'):
+        lines += 1
+    result.text = text
+    result.rows = max(lines - header_lines, 0)
+    result.result_bytes = kept
+    # ClickHouse breaks at block boundaries, so hitting the row budget
+    # exactly most likely means rows were dropped on the server side
+    if 0 < max_rows <= result.rows:
+        result.truncated = True
+    return result
+
+def _read_summary(result: QueryResult, header: Optional[str]) -> None:
+    if not header:
+        return
+    try:
+        summary = json.loads(header)
+    except ValueError:
+        return
+    result.read_rows = int(summary.get('read_rows', 0))
+    result.read_bytes = int(summary.get('read_bytes', 0))
+
+def strip_format(query: str) -> str:
+    """The query without a trailing semicolon and FORMAT clause."""
+    query = query.strip().rstrip(';').rstrip()
+    match = _FORMAT_RE.search(query)
+    if match:
+        query = query[:match.start()].rstrip()
+    return query
+
+def as_arrow_query(query: str) -> str:
+    """Replace the query's FORMAT clause (if any) with FORMAT ArrowStream."""
+    return f"{strip_format(query)}\nFORMAT ArrowStream"
+
+async def preflight(query, host: Optional[str] = None, connection_timeout = 1500):
+    """
+    Estimate what a query will read before running it.
+
+    Returns (estimate, rejection): the estimate is None when the query is
+    not guarded or could not be estimated (the query itself then reports
+    any problem); rejection is the text to return instead of running it.
+    """
+    if CH_GUARD_MODE == 'off' or not is_guarded(query):
+        return None, None
+    query = strip_format(query)
+    result = await run_query(estimate_query(query), host, connection_timeout,
+                             max_rows = 0, max_bytes = 0)
+    if not result.ok:
+        return None, None
+    try:
+        estimate = parse_estimate(result.text)
+    except (ValueError, KeyError):
+        return None, None
+    if CH_GUARD_MODE != 'reject' or not estimate.over_budget():
+        return estimate, None
+    limit = top_level_limit(query)
+    if limit is not None and limit <= CH_GUARD_SMALL_LIMIT:
+        # the estimate ignores LIMIT: a plain "select * ... limit 10" reads a
+        # few blocks, and the row budget stops it if it has to read more
+        estimate.capped = True
+        return estimate, None
+    # show which indexes were (not) used, so the agent can fix the filters
+    plan = await run_query(indexes_query(query), host, connection_timeout,
+                           max_rows = 0, max_bytes = 0)
+    index_usage = parse_index_usage(plan.text) if plan.ok else None
+    return estimate, format_rejection(estimate, index_usage)
+
+def guard_settings(estimate: Optional[Estimate]) -> dict:
+    """In limit mode and for capped queries, stop reading over-budget queries at the row budget."""
+    if (estimate is not None and (CH_GUARD_MODE == 'limit' or estimate.capped)
+            and estimate.over_budget() and CH_GUARD_MAX_ROWS > 0):
+        return {'max_rows_to_read': CH_GUARD_MAX_ROWS, 'read_overflow_mode': 'break'}
+    return {}
+
+def apply_estimate(result: QueryResult, estimate: Optional[Estimate]) -> None:
+    if estimate is None:
+        return
+    result.estimate = format_estimate(estimate)
+    if estimate.capped:
+        result.estimate += (f"\n-- the estimate ignores LIMIT; the query ran under the "
+                            f"budget of {CH_GUARD_MAX_ROWS} rows read")
+    if not guard_settings(estimate):
+        return
+    # with final read stats, only a query that hit the budget is partial
+    if result.read_partial or result.read_rows >= CH_GUARD_MAX_ROWS:
+        result.truncated = True
+        result.estimate += (f"\n-- reading stopped at the budget of {CH_GUARD_MAX_ROWS} rows; "
+                            "the result covers only part of the data")
+
+async def run_summary_query(query, host: Optional[str] = None, connection_timeout = 1500,
+                            query_id: Optional[str] = None,
+                            max_rows: int = CH_SUMMARIZE_MAX_ROWS,
+                            max_bytes: int = CH_SUMMARIZE_MAX_BYTES,
+                            settings: Optional[dict] = None) -> QueryResult:
+    """Fetch a result as ArrowStream and replace it with a per-column digest."""
+    if not have_pyarrow():
+        return QueryResult(text = 'Summarize mode requires pyarrow: pip install pyarrow',
+                           query_id = query_id or '', ok = False)
+    result = await run_query(as_arrow_query(query), host, connection_timeout, query_id,
+                             max_rows, max_bytes, binary = True,
+                             settings = {**ARROW_SETTINGS, **(settings or {})})
+    if not result.ok:
+        return result
+    data, result.data = result.data, b''
+    try:
+        # decoding and describing a large result takes seconds of CPU
+        result.text, result.rows = await asyncio.to_thread(summarize_arrow, data)
+    except Exception as e:
+        result.ok = False
+        result.text = f'Could not decode the Arrow result: {e}'
+    if 0 < max_rows <= result.rows:
+        result.truncated = True
+    return result
+
+def _store_spilled(handle: str, path: str, query: str, summarize: bool):
+    """Commit a written result under its handle and render the preview or digest of it."""
+    meta = result_store.commit(handle, path, query)
+    table = result_store.load(handle)
+    if summarize:
+        body, _ = summarize_table(table)
+    else:
+        body = render_table(table.slice(0, RESULT_PREVIEW_ROWS))
+    return meta, body
+
+async def spill_query(query, host: Optional[str] = None, connection_timeout = 1500,
+                      query_id: Optional[str] = None,
+                      summarize: bool = False) -> str:
+    """
+    Run a query and write its full result to the local result store.
+
+    Returns the handle with the schema and either a preview of the first
+    rows or, with summarize=True, a digest of the whole result.
+    """
+    # checked first: otherwise the whole result would be written to disk
+    # before the store failed to read it
+    if not have_pyarrow():
+        return QueryError('Spilling results requires pyarrow: pip install pyarrow')
+    estimate, rejection = await preflight(query, host, connection_timeout)
+    if rejection:
+        return QueryError(rejection)
+    handle, path = result_store.new_handle()
+    try:
+        with open(path, 'wb') as sink:
+            result = await run_query(as_arrow_query(query), host, connection_timeout, query_id,
+                                     CH_SPILL_MAX_ROWS, CH_SPILL_MAX_BYTES, binary = True,
+                                     settings = {**ARROW_SETTINGS, **guard_settings(estimate)},
+                                     sink = sink)
+        if not result.ok:
+            return QueryError(result.text)
+        apply_estimate(result, estimate)
+        meta, body = await asyncio.to_thread(_store_spilled, handle, path, query, summarize)
+    except ResultStoreError as e:
+        return QueryError(e)
+    except Exception as e:
+        return QueryError(f'Could not store the result: {e}')
+    finally:
+        result_store.discard(path)
+
+    result.rows = meta['rows']
+    if CH_SPILL_MAX_BYTES > 0 and result.result_bytes >= CH_SPILL_MAX_BYTES:
+        result.truncated = True
+    shown = '' if summarize else f" (first {min(RESULT_PREVIEW_ROWS, result.rows)} rows shown)"
+    return (describe_result(meta) + body
+            + f"-- stored result{shown}; use the handle with get_query_result_page "
+              "and aggregate_query_result to read it\n"
+            + format_summary(result))
+
+def format_summary(result: QueryResult) -> str:
+    rows = f"{result.rows}+" if result.truncated else str(result.rows)
+    read = (f"rows read: {result.read_rows}+, bytes read: {result.read_bytes}+ "
+            "(when the result started streaming)" if result.read_partial
+            else f"rows read: {result.read_rows}, bytes read: {result.read_bytes}")
+    summary = (f"-- rows: {rows}, result bytes: {result.result_bytes}, {read}, "
+               f"elapsed: {result.elapsed:.3f}s, truncated: {str(result.truncated).lower()}")
+    if result.cached:
+        summary += ", cached: true"
+    if result.estimate:
+        summary += "\n" + result.estimate
+    if result.truncated:
+        summary += ("\n-- Only a preview of the result is shown. "
+                    "Aggregate the data or add a LIMIT to see specific rows.")
+    return summary
+
+async def execute_query(query, host: Optional[str] = None, connection_timeout = 1500,
+                        query_id: Optional[str] = None,
+                        max_rows: int = CH_MAX_RESULT_ROWS,
+                        max_bytes: int = CH_MAX_RESULT_BYTES,
+                        use_cache: bool = True,
+                        summarize: bool = False,
+                        spill: bool = False,
+                        settings: Optional[dict] = None):
+    if spill:
+        # the result lives on disk, so it bypasses the result cache
+        return await spill_query(query, host, connection_timeout, query_id, summarize)
+    if summarize:
+        # the digest covers the whole result, so the summarize budget applies
+        max_rows, max_bytes = CH_SUMMARIZE_MAX_ROWS, CH_SUMMARIZE_MAX_BYTES
+    # writes, DDL and system tables always go to the server
+    cacheable = (use_cache and is_cacheable(query)
+                 and (CH_CACHE_NONDETERMINISTIC or is_deterministic(query)))
+    key = (host, max_rows, max_bytes, summarize, normalize_query(query))
+    result = query_cache.get(key) if cacheable else None
+    if not cacheable:
+        query_cache.record_bypass()
+    else:
+        metrics.inc('mcp_cache_hits_total' if result is not None else 'mcp_cache_misses_total',
+                    cache = 'clickhouse_results')
+
+    if result is None:
+        async def compute():
+            estimate, rejection = await preflight(query, host, connection_timeout)
+            if rejection:
+                return QueryError(rejection)
+            run = run_summary_query if summarize else run_query
+            result = await run(query, host, connection_timeout, query_id, max_rows, max_bytes,
+                               settings = {**(settings or {}), **guard_settings(estimate)})
+            if not result.ok:
+                return QueryError(result.text)
+            apply_estimate(result, estimate)
+            return result
+
+        # only reads are shared: a write sent by one process must not be
+        # answered from another process's result
+        shared_cache = get_shared_cache() if cacheable else None
+        if shared_cache is None:
+            result = await compute()
+        else:
+            # another server process may have run (or be running) the same query
+            result = await _shared_result(shared_cache, make_key(_target(host), *key[1:]),
+                                          compute, connection_timeout)
+        if isinstance(result, str):
+            return result
+        if cacheable:
+            query_cache.put(key, replace(result, cached = True), len(result.text))
+
+    text = result.text
+    if text and not text.endswith('\n'):
+        text += '\n'
+    return text + format_summary(result)
+
+async def execute_queries(queries, host: Optional[str] = None, connection_timeout = 1500,
+                          max_rows: int = CH_MAX_RESULT_ROWS,
+                          max_bytes: int = CH_MAX_RESULT_BYTES,
+                          use_cache: bool = True):
+    """
+    Run independent queries concurrently and return their results in order.
+
+    The wall time is close to that of the slowest query instead of the sum;
+    query_slots() and max_concurrent_queries_for_user bound the parallelism.
+    """
+    settings = {}
+    if CH_MAX_CONCURRENT_QUERIES_FOR_USER > 0:
+        settings['max_concurrent_queries_for_user'] = CH_MAX_CONCURRENT_QUERIES_FOR_USER
+
+    async def timed(query):
+        started = time.monotonic()
+        try:
+            text = await execute_query(query, host, connection_timeout, max_rows = max_rows,
+                                       max_bytes = max_bytes, use_cache = use_cache,
+                                       settings = settings)
+        except Exception as e:
+            text = f'Query failed: {e}'
+        return text, time.monotonic() - started
+
+    started = time.monotonic()
+    results = await asyncio.gather(*[timed(query) for query in queries])
+    wall_time = time.monotonic() - started
+
+    content = ''
+    for i, (text, elapsed) in enumerate(results, 1):
+        if text and not text.endswith('\n'):
+            text += '\n'
+        content += f"## Query {i} ({elapsed:.3f}s)\n{text}\n"
+    content += (f"-- queries: {len(queries)}, wall time: {wall_time:.3f}s, "
+                f"sum of query times: {sum(elapsed for _, elapsed in results):.3f}s")
+    return content
+
+async def submit_query(query, host: Optional[str] = None, connection_timeout = 1500,
+                       max_rows: int = CH_MAX_RESULT_ROWS,
+                       max_bytes: int = CH_MAX_RESULT_BYTES,
+                       use_cache: bool = True,
+                       summarize: bool = False,
+                       spill: bool = False) -> str:
+    """
+    Start execute_query() in the background and return its query id at once.
+
+    The job's result is kept in query_jobs until it expires; progress is
+    read from system.processes while it runs.
+    """
+    job = Job(query_id = str(uuid.uuid4()), query = query, host = host)
+    if not query_jobs.add(job):
+        return (f'{CH_JOBS_MAX} submitted queries are still running; wait for one to finish '
+                'or cancel one before submitting another')
+
+    async def run():
+        try:
+            text = await execute_query(query, host, connection_timeout, query_id = job.query_id,
+                                       max_rows = max_rows, max_bytes = max_bytes,
+                                       use_cache = use_cache, summarize = summarize, spill = spill)
+        except asyncio.CancelledError:
+            job.finish(CANCELLED, '')
+            raise
+        except Exception as e:
+            job.finish(FAILED, f'Query failed: {e}')
+        else:
+            # errors reported by ClickHouse come back as text, not exceptions
+            job.finish(FAILED if isinstance(text, QueryError) else FINISHED, text)
+
+    job.task = asyncio.get_running_loop().create_task(run())
+    return (f"Submitted query {job.query_id}\n"
+            "-- poll it with get_sql_query_status and stop it with cancel_sql_query\n")
+
+def _job_hosts(host: Optional[str]):
+    # a cluster query may run on any of its replicas
+    if host is not None and '://' in host:
+        return [host]
+    cluster = get_cluster(host or CH_DEFAULT_CLUSTER)
+    return [replica.host for replica in cluster.replicas] if cluster is not None else []
+
+async def get_query_progress(job: Job, connection_timeout = 10):
+    # sent past the query slots, which may all be held by the jobs being polled
+    results = await asyncio.gather(*[
+        _stream_query(progress_query(job.query_id), replica, connection_timeout, None,
+                      max_rows = 0, max_bytes = 0, binary = False, settings = None, sink = None)
+        for replica in _job_hosts(job.host)])
+    for result in results:
+        progress = parse_progress(result.text if result.ok else None)
+        if progress is not None:
+            return progress
+    return None
+
+async def get_query_status(query_id: str, wait: float = 0) -> str:
+    """Result of a finished job, or the progress of a running one."""
+    job = query_jobs.get(query_id)
+    if job is None:
+        return f'Unknown query id: {query_id} (finished results expire after an hour)'
+    if not job.done and wait > 0:
+        await asyncio.wait({job.task}, timeout = min(wait, CH_JOB_MAX_WAIT))
+    if job.done:
+        return render_job(job)
+    return render_progress(job, await get_query_progress(job))
+
+async def cancel_query(query_id: str) -> str:
+    job = query_jobs.get(query_id)
+    if job is None:
+        return f'Unknown query id: {query_id}'
+    if job.done:
+        return f'Query {job.query_id} already {job.status}'
+    # the cancelled request kills the query on the replica running it
+    job.task.cancel()
+    await asyncio.wait({job.task})
+    job.finish(CANCELLED, '')
+    return f'Cancelled query {job.query_id}'
+
+def get_query_jobs() -> str:
+    return render_jobs(query_jobs.list())
+
+async def get_cluster_health() -> str:
+    """Ping every replica of every cluster and report its state."""
+    get_cluster()
+    clusters = list(_clusters.values())
+    await asyncio.gather(*[cluster.probe(replica) for cluster in clusters
+                           for replica in cluster.replicas])
+    content = "# ClickHouse Clusters\n"
+    for cluster in clusters:
+        content += f"\n## {cluster.name} ({cluster.balancing})\n\n"
+        for status in cluster.status():
+            content += (f"- **{status['host']}**: {status['state']}, in flight: {status['in_flight']}, "
+                        f"requests: {status['requests']}, errors: {status['errors']}")
+            if status['last_error']:
+                content += f", last error: {status['last_error'].splitlines()[0]}"
+            content += "\n"
+    return content
+
+def _target(host: Optional[str]) -> str:
+    """What a host argument points at, so processes with different CH_HOSTS don't share keys."""
+    if host is not None and '://' in host:
+        return host
+    return f"{host or CH_DEFAULT_CLUSTER}@{CH_HOSTS or CH_HOST}"
+
+async def _shared_result(shared_cache, shared_key: str, compute,
+                         lease_ttl: float) -> Union[QueryResult, str]:
+    """
+    The result from the shared cache, or computed here while other processes
+    asking for the same query wait for it. Errors and rejections (strings)
+    are returned but not shared.
+    """
+    computed = []
+    async def encoded():
+        result = await compute()
+        computed.append(result)
+        if isinstance(result, str):
+            return None
+        fields = asdict(result)
+        # binary data is only needed to build the digest, which is in the text
+        del fields['data']
+        return json.dumps(fields).encode()
+    value = await shared_cache.aget_or_compute(CH_SHARED_RESULTS, shared_key, encoded,
+                                               ttl = CH_CACHE_TTL, lease_ttl = lease_ttl)
+    if computed:
+        return computed[0]
+    return QueryResult(**{**json.loads(value), 'cached': True})
+
+def _shared_runner(run, host: Optional[str], ttl: float):
+    """Wrap a text runner so its results are shared between processes for ttl seconds."""
+    shared_cache = get_shared_cache()
+    if shared_cache is None:
+        return run
+    async def shared_run(query):
+        async def compute():
+            text = await run(query)
+            return None if text is None else text.encode()
+        value = await shared_cache.aget_or_compute(CH_SHARED_SCHEMA, make_key(_target(host), query),
+                                                   compute, ttl = ttl)
+        return None if value is None else value.decode()
+    return shared_run
+
+def get_cache_stats() -> str:
+    stats = query_cache.stats()
+    content = "# ClickHouse Query Cache\n\n"
+    for name, value in stats.items():
+        content += f"- **{name}**: {value}\n"
+    return content
+
+def _text_runner(host, connection_timeout, settings: Optional[dict] = None):
+    async def run(query):
+        result = await run_query(query, host, connection_timeout,
+                                 max_rows = 0, max_bytes = 0, settings = settings)
+        return result.text if result.ok else None
+    return run
+
+def get_catalog(host: Optional[str] = None, connection_timeout = 1500) -> SchemaCatalog:
+    catalog = _catalogs.get(host)
+    if catalog is None:
+        run = _text_runner(host, connection_timeout)
+        catalog = _catalogs[host] = SchemaCatalog(
+            run, _shared_runner(run, host, CATALOG_REFRESH_INTERVAL))
+    return catalog
+
+async def get_schema_prompt(host: Optional[str] = None, connection_timeout = 1500) -> Optional[str]:
+    """
+    Schema section for the SQL prompt from the live catalog, or None if
+    ClickHouse cannot be reached in time (the caller falls back to the
+    static schema).
+    """
+    schema_prompt = _schema_prompts.get(host)
+    if schema_prompt is None:
+        settings = {'max_execution_time': PROMPT_SAMPLE_TIMEOUT}
+        schema_prompt = _schema_prompts[host] = SchemaPrompt(
+            get_catalog(host, connection_timeout),
+            _shared_runner(_text_runner(host, connection_timeout, settings), host,
+                           PROMPT_SAMPLES_TTL))
+    try:
+        return await asyncio.wait_for(schema_prompt.render(), CH_PROMPT_TIMEOUT)
+    except asyncio.TimeoutError:
+        return None
+
+async def get_databases(host: Optional[str] = None, connection_timeout = 1500):
+    catalog = get_catalog(host, connection_timeout)
+    if await catalog.ensure_fresh():
+        return ''.join(f"{name}\n" for name in catalog.list_databases())
+    result = await run_query('show databases', host, connection_timeout)
+    return result.text
+
+async def _describe_table(table_name, host, connection_timeout):
     query = f"DESCRIBE TABLE {table_name}"
-    return execute_query(query, host, connection_timeout)
\ No newline at end of file
+    result = await run_query(query, host, connection_timeout)
+    return result.text
+
+async def get_table_schema(table_name, host: Optional[str] = None, connection_timeout = 1500):
+    catalog = get_catalog(host, connection_timeout)
+    if await catalog.ensure_fresh():
+        table = catalog.get_table(table_name)
+        if table is not None:
+            return render_describe(table)
+    # not in the catalog yet: ClickHouse either knows it or explains why not
+    return await _describe_table(table_name, host, connection_timeout)
+
+async def get_tables_schema(table_names, host: Optional[str] = None, connection_timeout = 1500):
+    catalog = get_catalog(host, connection_timeout)
+    loaded = await catalog.ensure_fresh()
+    tables = [catalog.get_table(name) if loaded else None for name in table_names]
+    missing = [name for name, table in zip(table_names, tables) if table is None]
+    described = dict(zip(missing, await asyncio.gather(
+        *[_describe_table(name, host, connection_timeout) for name in missing])))
+
+    content = ''
+    for name, table in zip(table_names, tables):
+        title = table.full_name if table is not None else name
+        schema = render_describe(table) if table is not None else described[name]
+        content += f"## {title}\n{schema}\n"
+    return content
@@ -0,0 +1,125 @@
+"""Routing of ClickHouse queries across the replicas of a cluster"""
+import itertools
+import os
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from .query_cache import normalize_query
+
+# "http://a:8123,http://b:8123" for the default cluster, or
+# "default=http://a:8123,http://b:8123;analytics=http://c:8123"
+CH_HOSTS = os.getenv('CH_HOSTS', '')
+CH_DEFAULT_CLUSTER = 'default'
+# least_in_flight or round_robin
+CH_BALANCING = os.getenv('CH_BALANCING', 'least_in_flight')
+
+# Consecutive connection failures that take a replica out of rotation,
+# and how long it stays out before a /ping decides whether it is back
+CH_BREAKER_FAILURES = 3
+CH_BREAKER_COOLDOWN = 30
+
+READ_PREFIXES = ('select', 'with', 'show', 'describe', 'desc', 'exists', 'explain', '(')
+
+def is_read_query(query: str) -> bool:
+    """Reads can safely be sent again to another replica."""
+    return normalize_query(query).lower().startswith(READ_PREFIXES)
+
+def parse_hosts(spec: str, default_host: str) -> Dict[str, List[str]]:
+    """Cluster name -> replica URLs from a CH_HOSTS value."""
+    clusters: Dict[str, List[str]] = {}
+    for part in filter(None, (part.strip() for part in spec.split(';'))):
+        name, sep, hosts = part.partition('=')
+        if not sep:
+            name, hosts = CH_DEFAULT_CLUSTER, part
+        clusters[name.strip()] = [host.strip().rstrip('/') for host in hosts.split(',')
+                                  if host.strip()]
+    clusters.setdefault(CH_DEFAULT_CLUSTER, [default_host])
+    return clusters
+
+@dataclass
+class Replica:
+    host: str
+    in_flight: int = 0
+    failures: int = 0
+    # circuit breaker: closed while opened_at is None
+    opened_at: Optional[float] = None
+    probing: bool = False
+    requests: int = 0
+    errors: int = 0
+    last_error: str = ''
+
+    @property
+    def available(self) -> bool:
+        return self.opened_at is None
+
+    def cooled_down(self) -> bool:
+        return (self.opened_at is not None and not self.probing
+                and time.monotonic() - self.opened_at >= CH_BREAKER_COOLDOWN)
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self, error: str) -> None:
+        self.errors += 1
+        self.failures += 1
+        self.last_error = error
+        if self.failures >= CH_BREAKER_FAILURES or self.opened_at is not None:
+            self.opened_at = time.monotonic()
+
+class Cluster:
+    """
+    Replicas of one cluster with load balancing and a circuit breaker each.
+
+    A replica whose connections keep failing is skipped for
+    CH_BREAKER_COOLDOWN seconds; after that it is pinged before it gets
+    queries again.
+    """
+
+    def __init__(self, name: str, hosts: List[str], ping: Callable[[str], Awaitable[bool]],
+                 balancing: str = CH_BALANCING):
+        self.name = name
+        self.replicas = [Replica(host) for host in hosts]
+        self.balancing = balancing
+        self._ping = ping
+        self._turn = itertools.count()
+
+    async def probe(self, replica: Replica) -> bool:
+        replica.probing = True
+        try:
+            ok = await self._ping(replica.host)
+        finally:
+            replica.probing = False
+        if ok:
+            replica.record_success()
+        else:
+            replica.record_failure('ping failed')
+        return ok
+
+    async def choose(self, exclude=()) -> Optional[Replica]:
+        """The replica for the next query, or None if none is usable."""
+        for replica in self.replicas:
+            if replica.host not in exclude and replica.cooled_down():
+                await self.probe(replica)
+        candidates = [replica for replica in self.replicas
+                      if replica.available and replica.host not in exclude]
+        if not candidates:
+            return None
+        turn = next(self._turn)
+        if self.balancing == 'round_robin':
+            return candidates[turn % len(candidates)]
+        # the rotating offset spreads ties over all idle replicas
+        offset = turn % len(candidates)
+        rotated = candidates[offset:] + candidates[:offset]
+        return min(rotated, key = lambda replica: replica.in_flight)
+
+    def status(self) -> List[Dict]:
+        return [{
+            'host': replica.host,
+            'state': 'up' if replica.available else 'down',
+            'in_flight': replica.in_flight,
+            'requests': replica.requests,
+            'errors': replica.errors,
+            'last_error': replica.last_error,
+        } for replica in self.replicas]
@@ -0,0 +1,9 @@
+"""Result size limits of the ClickHouse tools
+
+Kept apart from clickhouse.py so the server can declare tool defaults
+without importing the query backend at startup.
+"""
+
+# Budget for a single result: reading stops once either limit is reached
+CH_MAX_RESULT_ROWS = 1000
+CH_MAX_RESULT_BYTES = 256 * 1024
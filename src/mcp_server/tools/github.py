@@ -1,7 +1,19 @@
-import requests
+import asyncio
+import hashlib
+import httpx
+import os
+import posixpath
 import re
-from datetime import datetime, timedelta
-from typing import Optional, List, Dict
+from contextlib import aclosing
+import time
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Awaitable, Callable, Optional, List, Dict
+
+from ..metrics import metrics
+from ..shared_cache import CACHE_DIR, get_shared_cache
+from .github_scheduler import PRIORITY_BULK, PRIORITY_INTERACTIVE, RequestScheduler
+from .http_cache import HTTPCache, make_key
+from .pr_index import PRIndex
 
 # Global configuration
 DEFAULT_HEADERS = {
@@ -11,6 +23,192 @@ DEFAULT_HEADERS = {
 
 BASE_URL = "https://api.github.com"
 
+# "rest" or "graphql"; GraphQL fetches details of up to 50 PRs per request
+GITHUB_BACKEND = os.getenv('GITHUB_BACKEND', 'rest')
+
+# One pooled keep-alive client for all GitHub requests
+GITHUB_MAX_CONNECTIONS = 20
+GITHUB_TIMEOUT = 30
+# How many PRs get_prs_details fetches at the same time
+GITHUB_MAX_CONCURRENCY = 5
+
+# Pagination of list endpoints
+GITHUB_PER_PAGE = 100  # Max per page
+GITHUB_MAX_PAGES = 100
+GITHUB_PAGE_CONCURRENCY = 4
+
+# PR files are aggregated per directory (up to this depth) while they are
+# fetched; only the first GITHUB_MAX_LISTED_FILES are listed one by one
+GITHUB_DIRECTORY_DEPTH = 2
+GITHUB_MAX_LISTED_FILES = 100
+
+# Conditional requests: 304 responses don't count against the rate limit
+# (responses are kept in the shared cache, see shared_cache.py)
+GITHUB_CACHE_ENABLED = os.getenv('GITHUB_HTTP_CACHE', '1') != '0'
+
+# Local PR index: get_recent_prs only fetches PRs updated since the last sync
+GITHUB_PR_INDEX_ENABLED = os.getenv('GITHUB_PR_INDEX', '1') != '0'
+GITHUB_PR_INDEX_DIR = os.path.join(CACHE_DIR, 'pr_index')
+GITHUB_PR_INDEX_SYNC_INTERVAL = 60
+
+LINK_RE = re.compile(r'<([^>]+)>\s*;\s*rel="(\w+)"')
+
+class GitHubAPIError(Exception):
+    def __init__(self, response: httpx.Response, default_message: str = 'Unknown error'):
+        self.status_code = response.status_code
+        try:
+            self.message = response.json().get('message', default_message) if response.content else default_message
+        except ValueError:
+            self.message = default_message
+        super().__init__(f"API request failed: {self.status_code}")
+
+    def to_dict(self) -> Dict:
+        return {
+            "error": str(self),
+            "message": self.message
+        }
+
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+_http_cache: Optional[HTTPCache] = None
+_scheduler: Optional[RequestScheduler] = None
+_scheduler_loop: Optional[asyncio.AbstractEventLoop] = None
+_pr_indexes: Dict[str, PRIndex] = {}
+_pr_index_locks: Dict[str, asyncio.Lock] = {}
+
+def get_client() -> httpx.AsyncClient:
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client = httpx.AsyncClient(
+            timeout=GITHUB_TIMEOUT,
+            limits=httpx.Limits(max_connections=GITHUB_MAX_CONNECTIONS,
+                                max_keepalive_connections=GITHUB_MAX_CONNECTIONS))
+        _client_loop = loop
+    return _client
+
+def get_scheduler() -> RequestScheduler:
+    global _scheduler, _scheduler_loop
+    loop = asyncio.get_running_loop()
+    if _scheduler is None or _scheduler_loop is not loop:
+        _scheduler = RequestScheduler()
+        _scheduler_loop = loop
+    return _scheduler
+
+async def send(request: Callable[[], Awaitable[httpx.Response]],
+               priority: int = PRIORITY_BULK) -> httpx.Response:
+    """Send a request through the scheduler and record it in the metrics."""
+    with metrics.timer('mcp_upstream_duration_seconds', service='github'):
+        response = await get_scheduler().request(request, priority)
+    metrics.inc('mcp_upstream_requests_total', service='github')
+    if response.status_code >= 400:
+        metrics.inc('mcp_upstream_errors_total', service='github')
+    return response
+
+async def github_post(url: str, token: Optional[str] = None, json: Optional[Dict] = None,
+                      priority: int = PRIORITY_BULK) -> httpx.Response:
+    return await send(
+        lambda: get_client().post(url, headers=get_headers(token), json=json), priority)
+
+def get_scheduler_metrics() -> str:
+    content = "# GitHub Request Scheduler\n\n"
+    for name, value in get_scheduler().metrics().items():
+        content += f"- **{name}**: {value}\n"
+    return content
+
+def get_http_cache() -> Optional[HTTPCache]:
+    global _http_cache
+    if GITHUB_CACHE_ENABLED and _http_cache is None:
+        shared_cache = get_shared_cache()
+        if shared_cache is not None:
+            _http_cache = HTTPCache(shared_cache)
+    return _http_cache
+
+async def github_get(url: str, token: Optional[str] = None, params: Optional[Dict] = None,
+                     priority: int = PRIORITY_BULK) -> httpx.Response:
+    headers = get_headers(token)
+    cache = get_http_cache()
+    key = make_key(url, params, token)
+    # the SQLite lookup may wait for other processes' writes
+    cached = await asyncio.to_thread(cache.get, key) if cache else None
+    if cached:
+        headers.update(cached.validators())
+    
+    # every request goes through the scheduler, which waits out rate limits
+    response = await send(
+        lambda: get_client().get(url, headers=headers, params=params), priority)
+    if cache:
+        metrics.inc('mcp_cache_hits_total' if response.status_code == 304 and cached
+                    else 'mcp_cache_misses_total', cache='github_http')
+    
+    if response.status_code == 304 and cached:
+        # unchanged: replay the stored body with the fresh (rate limit) headers
+        fresh = {name: value for name, value in response.headers.items()
+                 if name not in ('content-length', 'content-encoding', 'transfer-encoding')}
+        return httpx.Response(
+            200,
+            headers={**cached.headers, **fresh},
+            content=cached.body,
+            request=response.request)
+    if response.status_code == 200 and cache:
+        await asyncio.to_thread(cache.put, key, response.headers, response.content)
+    return response
+
+def parse_link_header(value: Optional[str]) -> Dict[str, str]:
+    return {rel: url for url, rel in LINK_RE.findall(value or '')}
+
+async def paginate(url: str, token: Optional[str] = None, params: Optional[Dict] = None,
+                   concurrent: bool = True, max_pages: int = GITHUB_MAX_PAGES,
+                   priority: int = PRIORITY_BULK) -> AsyncIterator[Dict]:
+    """
+    Yield the items of a paginated GitHub list endpoint, page by page.
+
+    Pages are followed through the Link header. When the last page number is
+    known and ``concurrent`` is set, the remaining pages are fetched a few at a
+    time but still yielded in order, so memory stays bounded by that window.
+    Raises GitHubAPIError if a page cannot be fetched.
+    """
+    params = {**(params or {}), 'per_page': GITHUB_PER_PAGE}
+    response = await github_get(url, token, params, priority)
+    if response.status_code != 200:
+        raise GitHubAPIError(response)
+    for item in response.json():
+        yield item
+
+    links = parse_link_header(response.headers.get('Link'))
+    last_url = links.get('last')
+    if concurrent and last_url:
+        last = httpx.URL(last_url)
+        last_page = min(int(last.params.get('page', 1)), max_pages)
+        pending = []
+        next_page = 2
+        try:
+            while pending or next_page <= last_page:
+                while next_page <= last_page and len(pending) < GITHUB_PAGE_CONCURRENCY:
+                    page_url = str(last.copy_set_param('page', next_page))
+                    pending.append(asyncio.ensure_future(github_get(page_url, token, priority=priority)))
+                    next_page += 1
+                response = await pending.pop(0)
+                if response.status_code != 200:
+                    raise GitHubAPIError(response)
+                for item in response.json():
+                    yield item
+        finally:
+            # the consumer may stop early; don't leave requests running
+            for task in pending:
+                task.cancel()
+        return
+
+    page = 1
+    while 'next' in links and page < max_pages:
+        response = await github_get(links['next'], token, priority=priority)
+        if response.status_code != 200:
+            raise GitHubAPIError(response)
+        for item in response.json():
+            yield item
+        links = parse_link_header(response.headers.get('Link'))
+        page += 1
+
 def get_headers(token: Optional[str] = None) -> Dict[str, str]:
     headers = DEFAULT_HEADERS.copy()
     if token:
@@ -19,7 +217,7 @@ def get_headers(token: Optional[str] = None) -> Dict[str, str]:
 
 def parse_repo_url(repo_url: str) -> tuple:
     # Remove .git suffix if present
-    repo_url = repo_url.rstrip('.git')
+    repo_url = repo_url.removesuffix('.git')
     
     # Extract owner/repo from various URL formats
     if repo_url.startswith('https://github.com/'):
@@ -36,16 +234,32 @@ def parse_repo_url(repo_url: str) -> tuple:
     
     return parts[0], parts[1]
 
-def get_recent_prs(repo_url: str, days: int, token: Optional[str] = None) -> List[Dict]:
-    try:
-        owner, repo = parse_repo_url(repo_url)
-    except ValueError as e:
-        return {"error": str(e)}
-    
-    headers = get_headers(token)
-    
-    # Calculate date threshold
-    since_date = datetime.now() - timedelta(days=days)
+def get_pr_index(owner: str, repo: str, token: Optional[str] = None) -> PRIndex:
+    if not GITHUB_PR_INDEX_ENABLED:
+        # throwaway index: every call walks the API back to the requested date
+        return PRIndex(':memory:')
+    # private repositories may look different per token, so indexes are not shared
+    token_hash = hashlib.sha256(token.encode()).hexdigest()[:8] if token else 'public'
+    name = f"{owner}__{repo}__{token_hash}".lower()
+    if name not in _pr_indexes:
+        index = PRIndex(os.path.join(GITHUB_PR_INDEX_DIR, f"{name}.sqlite3"))
+        _pr_indexes[name] = index
+        _pr_index_locks[index.path] = asyncio.Lock()
+    return _pr_indexes[name]
+
+async def sync_pr_index(index: PRIndex, owner: str, repo: str, since: str,
+                        token: Optional[str] = None) -> None:
+    """
+    Bring the index up to date for PRs updated at or after ``since``.
+
+    If the index already covers ``since`` only PRs updated after its watermark
+    are fetched, otherwise the walk continues back to ``since``. Raises
+    GitHubAPIError if the API request fails.
+    """
+    covered = index.covers(since)
+    if covered and time.time() - index.synced_at < GITHUB_PR_INDEX_SYNC_INTERVAL:
+        return
+    stop_at = index.watermark if covered else since
     
     # GitHub API endpoint for pull requests
     url = f"{BASE_URL}/repos/{owner}/{repo}/pulls"
@@ -53,53 +267,61 @@ def get_recent_prs(repo_url: str, days: int, token: Optional[str] = None) -> Lis
     params = {
         'state': 'all',  # all, open, closed
         'sort': 'updated',
-        'direction': 'desc',
-        'per_page': 100  # Max per page
+        'direction': 'desc'
     }
     
-    all_prs = []
-    page = 1
-    
-    while True:
-        params['page'] = page
-        response = requests.get(url, headers=headers, params=params)
-        
-        if response.status_code != 200:
-            return {
-                "error": f"API request failed: {response.status_code}",
-                "message": response.json().get('message', 'Unknown error') if response.content else 'Unknown error'
-            }
-        
-        prs = response.json()
-        if not prs:  # No more pages
-            break
-        
-        # Filter PRs by date
-        for pr in prs:
-            pr_updated = datetime.strptime(pr['updated_at'], '%Y-%m-%dT%H:%M:%SZ')
-            if pr_updated >= since_date:
-                all_prs.append({
-                    'id': pr['number'],
-                    'title': pr['title'],
-                    'url': pr['html_url'],
-                    'api_url': pr['url'],
-                    'state': pr['state'],
-                    'created_at': pr['created_at'],
-                    'updated_at': pr['updated_at'],
-                    'author': pr['user']['login']
-                })
-            else:
+    batch = []
+    seen = 0
+    newest = oldest = None
+    reached_stop = False
+    # Pages are read one after another: newest first, so we can stop early
+    async with aclosing(paginate(url, token, params, concurrent=False)) as prs:
+        async for pr in prs:
+            if pr['updated_at'] < stop_at:
                 # PRs are sorted by updated date, so we can stop here
-                return all_prs
-        
-        page += 1
-        
-        # Safety check to avoid infinite loops
-        if page > 100:  # Adjust based on your needs
-            break
-            print('Warning: Execution stopped after 100 pages')
+                reached_stop = True
+                break
+            seen += 1
+            newest = newest or pr['updated_at']
+            oldest = pr['updated_at']
+            batch.append(pr)
+            if len(batch) >= GITHUB_PER_PAGE:
+                index.upsert(batch)
+                batch = []
+    index.upsert(batch)
     
-    return all_prs
+    # The walk also ends when the list runs out; it is incomplete only if it
+    # was cut off by the page limit
+    complete = reached_stop or seen < GITHUB_MAX_PAGES * GITHUB_PER_PAGE
+    if complete:
+        covered_since = index.covered_since if covered else since
+    else:
+        covered_since = oldest
+    index.mark_synced(max(filter(None, (newest, index.watermark)), default=None), covered_since)
+
+async def get_recent_prs(repo_url: str, days: int, token: Optional[str] = None,
+                         author: Optional[str] = None, state: Optional[str] = None,
+                         label: Optional[str] = None) -> List[Dict]:
+    try:
+        owner, repo = parse_repo_url(repo_url)
+    except ValueError as e:
+        return {"error": str(e)}
+    
+    # Calculate date threshold
+    since_date = datetime.now(timezone.utc) - timedelta(days=days)
+    since = since_date.strftime('%Y-%m-%dT%H:%M:%SZ')
+    
+    index = get_pr_index(owner, repo, token)
+    # concurrent calls for the same repository share one sync
+    lock = _pr_index_locks.get(index.path) or asyncio.Lock()
+    try:
+        async with lock:
+            await sync_pr_index(index, owner, repo, since, token)
+    except GitHubAPIError as e:
+        return e.to_dict()
+    
+    # Filtering happens in the local index, without API calls
+    return index.query(since, author=author, state=state, label=label)
 
 def extract_pr_number_from_url(pr_url: str) -> Optional[int]:
     match = re.search(r'/pull/(\d+)', pr_url)
@@ -107,67 +329,130 @@ def extract_pr_number_from_url(pr_url: str) -> Optional[int]:
         return int(match.group(1))
     return None
 
-def get_pr_commits(owner: str, repo: str, pr_number: int, token: Optional[str] = None) -> List[Dict]:
-    headers = get_headers(token)
+async def get_pr_commits(owner: str, repo: str, pr_number: int, token: Optional[str] = None,
+                         priority: int = PRIORITY_INTERACTIVE) -> List[Dict]:
     commits_url = f"{BASE_URL}/repos/{owner}/{repo}/pulls/{pr_number}/commits"
     
-    response = requests.get(commits_url, headers=headers)
-    if response.status_code != 200:
+    commits = []
+    try:
+        async for commit in paginate(commits_url, token, priority=priority):
+            commits.append({
+                'sha': commit['sha'][:7],
+                'message': commit['commit']['message'].split('\n')[0],
+                'author': commit['commit']['author']['name'],
+                'date': commit['commit']['author']['date']
+            })
+    except GitHubAPIError:
         return []
-    
-    commits = response.json()
-    return [
-        {
-            'sha': commit['sha'][:7],
-            'message': commit['commit']['message'].split('\n')[0],
-            'author': commit['commit']['author']['name'],
-            'date': commit['commit']['author']['date']
-        }
-        for commit in commits
-    ]
+    return commits
 
-def get_pr_files(owner: str, repo: str, pr_number: int, token: Optional[str] = None) -> List[Dict]:
-    headers = get_headers(token)
+async def iter_pr_files(owner: str, repo: str, pr_number: int, token: Optional[str] = None,
+                        priority: int = PRIORITY_INTERACTIVE) -> AsyncIterator[Dict]:
     files_url = f"{BASE_URL}/repos/{owner}/{repo}/pulls/{pr_number}/files"
     
-    response = requests.get(files_url, headers=headers)
-    if response.status_code != 200:
-        return []
-    
-    files = response.json()
-    return [
-        {
+    async for file in paginate(files_url, token, priority=priority):
+        yield {
             'filename': file['filename'],
             'status': file['status'],
             'additions': file['additions'],
             'deletions': file['deletions'],
             'changes': file['changes']
         }
-        for file in files
-    ]
 
-def get_pr_details(repo_url: str, pr_identifier, token: Optional[str] = None) -> Dict:
+async def get_pr_files(owner: str, repo: str, pr_number: int, token: Optional[str] = None,
+                       priority: int = PRIORITY_INTERACTIVE) -> List[Dict]:
     try:
-        owner, repo = parse_repo_url(repo_url)
-    except ValueError as e:
-        return {"error": str(e)}
-    
-    headers = get_headers(token)
-    
+        return [file async for file in iter_pr_files(owner, repo, pr_number, token, priority)]
+    except GitHubAPIError:
+        return []
+
+def get_directory(filename: str, depth: int = GITHUB_DIRECTORY_DEPTH) -> str:
+    parts = posixpath.dirname(filename).split('/')
+    return '/'.join(parts[:depth]) or '.'
+
+class FilesSummary:
+    """
+    Aggregate additions/deletions per directory while file pages stream in.
+
+    Only the first ``max_listed`` files are kept individually, so the summary
+    has the same size for a 30-file and a 3,000-file PR.
+    """
+
+    def __init__(self, max_listed: int = GITHUB_MAX_LISTED_FILES):
+        self.max_listed = max_listed
+        self.total = 0
+        self.files = []
+        self.directories = {}
+
+    def add(self, file: Dict) -> None:
+        self.total += 1
+        if len(self.files) < self.max_listed:
+            self.files.append(file)
+        name = get_directory(file['filename'])
+        directory = self.directories.setdefault(name, {
+            'directory': name,
+            'files': 0,
+            'additions': 0,
+            'deletions': 0
+        })
+        directory['files'] += 1
+        directory['additions'] += file['additions']
+        directory['deletions'] += file['deletions']
+
+    def to_dict(self) -> Dict:
+        return {
+            'total': self.total,
+            'files': self.files,
+            'truncated': self.total > len(self.files),
+            'directories': sorted(self.directories.values(),
+                                  key=lambda d: d['additions'] + d['deletions'], reverse=True)
+        }
+
+async def get_pr_files_summary(owner: str, repo: str, pr_number: int, token: Optional[str] = None,
+                               max_listed: int = GITHUB_MAX_LISTED_FILES,
+                               priority: int = PRIORITY_INTERACTIVE) -> Dict:
+    summary = FilesSummary(max_listed)
+    try:
+        async for file in iter_pr_files(owner, repo, pr_number, token, priority):
+            summary.add(file)
+    except GitHubAPIError:
+        pass
+    return summary.to_dict()
+
+def parse_pr_number(pr_identifier) -> int:
     # Handle different PR identifier formats
     if isinstance(pr_identifier, str) and 'github.com' in pr_identifier:
         pr_number = extract_pr_number_from_url(pr_identifier)
         if pr_number is None:
-            return {"error": "Cannot extract PR number from URL"}
-    else:
-        try:
-            pr_number = int(pr_identifier)
-        except (ValueError, TypeError):
-            return {"error": "PR identifier must be a number or valid GitHub PR URL"}
+            raise ValueError("Cannot extract PR number from URL")
+        return pr_number
+    try:
+        return int(pr_identifier)
+    except (ValueError, TypeError):
+        raise ValueError("PR identifier must be a number or valid GitHub PR URL")
+
+async def get_pr_details(repo_url: str, pr_identifier, token: Optional[str] = None,
+                         priority: int = PRIORITY_INTERACTIVE, backend: Optional[str] = None) -> Dict:
+    if (backend or GITHUB_BACKEND) == 'graphql':
+        from .github_graphql import get_prs_details_graphql
+        return (await get_prs_details_graphql(repo_url, [pr_identifier], token, priority))[0]
+    
+    try:
+        owner, repo = parse_repo_url(repo_url)
+    except ValueError as e:
+        return {"error": str(e)}
+    
+    try:
+        pr_number = parse_pr_number(pr_identifier)
+    except ValueError as e:
+        return {"error": str(e)}
     
-    # Get PR details
+    # Get PR details, commits and files concurrently
     url = f"{BASE_URL}/repos/{owner}/{repo}/pulls/{pr_number}"
-    response = requests.get(url, headers=headers)
+    response, commits, files = await asyncio.gather(
+        github_get(url, token, priority=priority),
+        get_pr_commits(owner, repo, pr_number, token, priority),
+        get_pr_files_summary(owner, repo, pr_number, token, priority=priority))
     
     if response.status_code != 200:
         return {
@@ -177,10 +462,6 @@ def get_pr_details(repo_url: str, pr_identifier, token: Optional[str] = None) ->
     
     pr = response.json()
     
-    # Get additional details
-    commits = get_pr_commits(owner, repo, pr_number, token)
-    files = get_pr_files(owner, repo, pr_number, token)
-    
     return {
         'id': pr['number'],
         'title': pr['title'],
@@ -203,11 +484,28 @@ def get_pr_details(repo_url: str, pr_identifier, token: Optional[str] = None) ->
         'head_branch': pr['head']['ref'],
         'commits_count': len(commits),
         'commits': commits,
-        'files_changed': len(files),
-        'files': files,
+        'files_changed': files['total'],
+        'files': files['files'],
+        'files_truncated': files['truncated'],
+        'directories': files['directories'],
         'additions': pr['additions'],
         'deletions': pr['deletions'],
         'changed_files': pr['changed_files'],
         'mergeable': pr['mergeable'],
         'merged': pr['merged']
-    }
\ No newline at end of file
+    }
+
+async def get_prs_details(repo_url: str, pr_identifiers: List, token: Optional[str] = None,
+                          max_concurrency: int = GITHUB_MAX_CONCURRENCY,
+                          backend: Optional[str] = None) -> List[Dict]:
+    if (backend or GITHUB_BACKEND) == 'graphql':
+        from .github_graphql import get_prs_details_graphql
+        return await get_prs_details_graphql(repo_url, pr_identifiers, token)
+    
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def fetch(pr_identifier) -> Dict:
+        async with semaphore:
+            return await get_pr_details(repo_url, pr_identifier, token, PRIORITY_BULK)
+
+    return list(await asyncio.gather(*[fetch(pr) for pr in pr_identifiers]))
@@ -0,0 +1,267 @@
+"""GitHub GraphQL (v4) backend for PR details"""
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+from . import github
+from .github import (
+    FilesSummary,
+    GitHubAPIError,
+    PRIORITY_BULK,
+    parse_pr_number,
+    parse_repo_url
+)
+
+# GitHub allows up to 100 nodes per connection; 50 PRs per query keeps the
+# node count (and the query cost) well under the API limits
+GRAPHQL_BATCH_SIZE = 50
+GRAPHQL_PAGE_SIZE = 100
+
+COMMIT_PAGE_FRAGMENT = """
+fragment CommitPage on PullRequestCommitConnection {
+  totalCount
+  pageInfo { hasNextPage endCursor }
+  nodes { commit { oid messageHeadline author { name date } } }
+}
+"""
+
+FILE_PAGE_FRAGMENT = """
+fragment FilePage on PullRequestChangedFileConnection {
+  totalCount
+  pageInfo { hasNextPage endCursor }
+  nodes { path changeType additions deletions }
+}
+"""
+
+PR_DETAILS_FRAGMENT = """
+fragment PullRequestDetails on PullRequest {
+  number
+  title
+  body
+  url
+  state
+  createdAt
+  updatedAt
+  closedAt
+  mergedAt
+  merged
+  mergeable
+  additions
+  deletions
+  changedFiles
+  baseRefName
+  headRefName
+  author { login url }
+  assignees(first: 100) { nodes { login } }
+  reviewRequests(first: 100) { nodes { requestedReviewer { ... on User { login } } } }
+  labels(first: 100) { nodes { name } }
+  milestone { title }
+  commits(first: %(page)d) { ...CommitPage }
+  files(first: %(page)d) { ...FilePage }
+}
+""" % {'page': GRAPHQL_PAGE_SIZE}
+
+BATCH_QUERY = """
+query($owner: String!, $repo: String!) {
+  repository(owner: $owner, name: $repo) {
+%(aliases)s
+  }
+}
+"""
+
+# Follow-up pages for a single PR whose commits or files did not fit
+COMMITS_PAGE_QUERY = """
+query($owner: String!, $repo: String!, $number: Int!, $after: String) {
+  repository(owner: $owner, name: $repo) {
+    pullRequest(number: $number) {
+      commits(first: %(page)d, after: $after) { ...CommitPage }
+    }
+  }
+}
+""" % {'page': GRAPHQL_PAGE_SIZE} + COMMIT_PAGE_FRAGMENT
+
+FILES_PAGE_QUERY = """
+query($owner: String!, $repo: String!, $number: Int!, $after: String) {
+  repository(owner: $owner, name: $repo) {
+    pullRequest(number: $number) {
+      files(first: %(page)d, after: $after) { ...FilePage }
+    }
+  }
+}
+""" % {'page': GRAPHQL_PAGE_SIZE} + FILE_PAGE_FRAGMENT
+
+# GraphQL enums mapped onto the values the REST API returns
+FILE_STATUS = {
+    'ADDED': 'added',
+    'DELETED': 'removed',
+    'MODIFIED': 'modified',
+    'RENAMED': 'renamed',
+    'COPIED': 'copied',
+    'CHANGED': 'changed',
+}
+MERGEABLE = {'MERGEABLE': True, 'CONFLICTING': False}
+
+
+class GraphQLError(Exception):
+    pass
+
+
+async def graphql(query: str, variables: Dict, token: Optional[str],
+                  priority: int = PRIORITY_BULK) -> Dict:
+    """Run a GraphQL query and return its ``data``; errors for missing PRs are kept in it as nulls."""
+    response = await github.github_post(f"{github.BASE_URL}/graphql", token,
+                                        {'query': query, 'variables': variables}, priority)
+    if response.status_code != 200:
+        raise GitHubAPIError(response)
+    payload = response.json()
+    errors = [error for error in payload.get('errors') or [] if error.get('type') != 'NOT_FOUND']
+    if errors or payload.get('data') is None:
+        raise GraphQLError('; '.join(error.get('message', 'Unknown error') for error in errors)
+                           or 'Empty response')
+    return payload['data']
+
+
+def map_commit(node: Dict) -> Dict:
+    commit = node['commit']
+    author = commit.get('author') or {}
+    return {
+        'sha': commit['oid'][:7],
+        'message': commit['messageHeadline'],
+        'author': author.get('name'),
+        'date': author.get('date')
+    }
+
+
+def map_file(node: Dict) -> Dict:
+    return {
+        'filename': node['path'],
+        'status': FILE_STATUS.get(node['changeType'], node['changeType'].lower()),
+        'additions': node['additions'],
+        'deletions': node['deletions'],
+        'changes': node['additions'] + node['deletions']
+    }
+
+
+def map_pr(pr: Dict, commits: List[Dict], files: Dict) -> Dict:
+    """Build the same dict get_pr_details returns for the REST backend."""
+    author = pr.get('author') or {}
+    return {
+        'id': pr['number'],
+        'title': pr['title'],
+        'body': pr['body'],
+        'url': pr['url'],
+        'state': 'open' if pr['state'] == 'OPEN' else 'closed',
+        'created_at': pr['createdAt'],
+        'updated_at': pr['updatedAt'],
+        'closed_at': pr['closedAt'],
+        'merged_at': pr['mergedAt'],
+        'author': {
+            'login': author.get('login'),
+            'url': author.get('url')
+        },
+        'assignees': [user['login'] for user in pr['assignees']['nodes']],
+        'reviewers': [request['requestedReviewer']['login']
+                      for request in pr['reviewRequests']['nodes']
+                      if (request.get('requestedReviewer') or {}).get('login')],
+        'labels': [label['name'] for label in pr['labels']['nodes']],
+        'milestone': pr['milestone']['title'] if pr['milestone'] else None,
+        'base_branch': pr['baseRefName'],
+        'head_branch': pr['headRefName'],
+        'commits_count': len(commits),
+        'commits': commits,
+        'files_changed': files['total'],
+        'files': files['files'],
+        'files_truncated': files['truncated'],
+        'directories': files['directories'],
+        'additions': pr['additions'],
+        'deletions': pr['deletions'],
+        'changed_files': pr['changedFiles'],
+        'mergeable': MERGEABLE.get(pr['mergeable']),
+        'merged': pr['merged']
+    }
+
+
+async def _remaining_pages(query: str, field: str, owner: str, repo: str, number: int,
+                           page: Dict, token: Optional[str], priority: int):
+    """Yield nodes from the pages after ``page`` of a PR's commits or files."""
+    while page['pageInfo']['hasNextPage']:
+        data = await graphql(query, {'owner': owner, 'repo': repo, 'number': number,
+                                     'after': page['pageInfo']['endCursor']}, token, priority)
+        page = data['repository']['pullRequest'][field]
+        for node in page['nodes']:
+            yield node
+
+
+async def _complete_pr(owner: str, repo: str, pr: Dict, token: Optional[str],
+                       priority: int) -> Dict:
+    commits = [map_commit(node) for node in pr['commits']['nodes']]
+    async for node in _remaining_pages(COMMITS_PAGE_QUERY, 'commits', owner, repo,
+                                       pr['number'], pr['commits'], token, priority):
+        commits.append(map_commit(node))
+
+    files = FilesSummary()
+    for node in pr['files']['nodes']:
+        files.add(map_file(node))
+    async for node in _remaining_pages(FILES_PAGE_QUERY, 'files', owner, repo,
+                                       pr['number'], pr['files'], token, priority):
+        files.add(map_file(node))
+    return map_pr(pr, commits, files.to_dict())
+
+
+async def _fetch_batch(owner: str, repo: str, numbers: List[int],
+                       token: Optional[str], priority: int) -> Dict[int, Dict]:
+    aliases = '\n'.join(f"    pr{number}: pullRequest(number: {number}) {{ ...PullRequestDetails }}"
+                        for number in numbers)
+    query = (BATCH_QUERY % {'aliases': aliases}
+             + PR_DETAILS_FRAGMENT + COMMIT_PAGE_FRAGMENT + FILE_PAGE_FRAGMENT)
+    data = await graphql(query, {'owner': owner, 'repo': repo}, token, priority)
+    repository = data.get('repository')
+    if repository is None:
+        return {number: {"error": f"Repository {owner}/{repo} not found"} for number in numbers}
+
+    results = {}
+    found = []
+    for number in numbers:
+        pr = repository.get(f"pr{number}")
+        if pr is None:
+            results[number] = {"error": "PR not found", "message": f"Could not resolve PR #{number}"}
+        else:
+            found.append(pr)
+    # only PRs with more than one page of commits or files need further requests
+    details = await asyncio.gather(*[_complete_pr(owner, repo, pr, token, priority) for pr in found])
+    for pr, detail in zip(found, details):
+        results[pr['number']] = detail
+    return results
+
+
+async def get_prs_details_graphql(repo_url: str, pr_identifiers: List,
+                                  token: Optional[str] = None,
+                                  priority: int = PRIORITY_BULK) -> List[Dict]:
+    """Details for many PRs, fetched GRAPHQL_BATCH_SIZE PRs per GraphQL query."""
+    try:
+        owner, repo = parse_repo_url(repo_url)
+    except ValueError as e:
+        return [{"error": str(e)} for _ in pr_identifiers]
+    if not token:
+        return [{"error": "The GraphQL API requires a GitHub token"} for _ in pr_identifiers]
+
+    parsed: List[Tuple[Optional[int], Optional[str]]] = []
+    for pr_identifier in pr_identifiers:
+        try:
+            parsed.append((parse_pr_number(pr_identifier), None))
+        except ValueError as e:
+            parsed.append((None, str(e)))
+
+    numbers = list(dict.fromkeys(number for number, _ in parsed if number is not None))
+    batches = [numbers[i:i + GRAPHQL_BATCH_SIZE] for i in range(0, len(numbers), GRAPHQL_BATCH_SIZE)]
+    results: Dict[int, Dict] = {}
+    for batch in batches:
+        try:
+            results.update(await _fetch_batch(owner, repo, batch, token, priority))
+        except GitHubAPIError as e:
+            results.update({number: e.to_dict() for number in batch})
+        except GraphQLError as e:
+            results.update({number: {"error": "GraphQL request failed", "message": str(e)}
+                            for number in batch})
+
+    return [results[number] if number is not None else {"error": error}
+            for number, error in parsed]
@@ -0,0 +1,225 @@
+"""Rate-limit-aware scheduling of GitHub API requests"""
+import asyncio
+import heapq
+import random
+import time
+from typing import Awaitable, Callable, Optional
+
+import httpx
+
+# Lower value goes first: interactive lookups overtake bulk listings
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 10
+
+GITHUB_MAX_IN_FLIGHT = 10
+GITHUB_MAX_RETRIES = 4
+GITHUB_BACKOFF_BASE = 1.0
+GITHUB_BACKOFF_MAX = 60.0
+# Longer waits are not worth holding a tool call for; the error is returned
+GITHUB_MAX_RATE_LIMIT_WAIT = 120.0
+
+RETRY_STATUSES = (429, 502, 503, 504)
+
+
+class RateLimitExceeded(Exception):
+    """The queue is paused for longer than GITHUB_MAX_RATE_LIMIT_WAIT."""
+
+    def __init__(self, resume_at: float):
+        self.resume_at = resume_at
+        super().__init__(f"rate limited until {resume_at}")
+
+    def to_response(self) -> httpx.Response:
+        """The 403 GitHub itself answers with once the rate limit is used up."""
+        resets = time.strftime('%Y-%m-%d %H:%M:%S UTC', time.gmtime(self.resume_at))
+        wait = max(int(self.resume_at - time.time()), 0)
+        return httpx.Response(
+            403,
+            headers={'x-ratelimit-remaining': '0',
+                     'x-ratelimit-reset': str(int(self.resume_at))},
+            json={'message': f"API rate limit exceeded; it resets at {resets} (in {wait} s)"})
+
+
+class RequestScheduler:
+    """
+    Central gate for GitHub requests.
+
+    Requests wait in a priority queue and are released while fewer than
+    ``max_in_flight`` are running and the rate limit allows it. The limit is
+    tracked as a token bucket: X-RateLimit-Remaining sets the tokens left,
+    every dispatched request takes one, and the bucket refills at
+    X-RateLimit-Reset. Rate-limited responses (Retry-After, secondary limit
+    403s, 429s) pause the whole queue and the request is retried with
+    jittered exponential backoff. When the queue would be held for longer
+    than GITHUB_MAX_RATE_LIMIT_WAIT, queued requests fail at once with a
+    rate limit 403 instead of parking their tool calls until the reset.
+    """
+
+    def __init__(self, max_in_flight: int = GITHUB_MAX_IN_FLIGHT,
+                 max_retries: int = GITHUB_MAX_RETRIES):
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self._queue = []
+        self._seq = 0
+        self._in_flight = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # token bucket state, unknown until the first response arrives
+        self.limit: Optional[int] = None
+        self.tokens: Optional[int] = None
+        self.reset_at = 0.0
+        self.paused_until = 0.0
+        # metrics
+        self.requests = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.rejected = 0
+        self.max_queue_depth = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for *_, future in self._queue if not future.done())
+
+    def _delay(self) -> float:
+        now = time.time()
+        delay = self.paused_until - now
+        if self.tokens is not None and self.tokens <= 0:
+            if self.reset_at > now:
+                delay = max(delay, self.reset_at - now)
+            else:
+                # the window has been reset; wait for fresh headers
+                self.tokens = None
+        return max(delay, 0.0)
+
+    def _dispatch(self) -> None:
+        while self._queue and self._in_flight < self.max_in_flight:
+            delay = self._delay()
+            if delay > GITHUB_MAX_RATE_LIMIT_WAIT:
+                self._reject_queued(time.time() + delay)
+                return
+            if delay > 0:
+                if self._timer is None:
+                    self._timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
+                return
+            _, _, queued_at, future = heapq.heappop(self._queue)
+            if future.done():
+                # the waiter was cancelled
+                continue
+            self._in_flight += 1
+            if self.tokens is not None:
+                self.tokens -= 1
+            wait = time.monotonic() - queued_at
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            future.set_result(None)
+
+    def _reject_queued(self, resume_at: float) -> None:
+        while self._queue:
+            *_, future = heapq.heappop(self._queue)
+            if not future.done():
+                self.rejected += 1
+                future.set_exception(RateLimitExceeded(resume_at))
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        self._dispatch()
+
+    async def acquire(self, priority: int = PRIORITY_BULK) -> None:
+        future = asyncio.get_running_loop().create_future()
+        self._seq += 1
+        heapq.heappush(self._queue, (priority, self._seq, time.monotonic(), future))
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # the slot was granted just before the cancellation
+                self.release()
+            raise
+
+    def release(self) -> None:
+        self._in_flight -= 1
+        self._dispatch()
+
+    def update(self, headers: httpx.Headers) -> None:
+        remaining = headers.get('x-ratelimit-remaining')
+        if remaining is None or headers.get('x-ratelimit-resource', 'core') != 'core':
+            # GraphQL and search have their own budgets; only REST is tracked
+            return
+        # the other requests still in flight will each take a token too
+        self.tokens = int(remaining) - (self._in_flight - 1)
+        self.limit = int(headers.get('x-ratelimit-limit', self.limit or 0)) or None
+        reset = headers.get('x-ratelimit-reset')
+        if reset:
+            self.reset_at = float(reset)
+
+    def retry_delay(self, response: httpx.Response, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying, or None if the response is final."""
+        status = response.status_code
+        if status == 403:
+            limited = (response.headers.get('retry-after') is not None
+                       or response.headers.get('x-ratelimit-remaining') == '0'
+                       or 'rate limit' in response.text.lower())
+            if not limited:
+                return None
+        elif status not in RETRY_STATUSES:
+            return None
+        if attempt >= self.max_retries:
+            return None
+
+        if status in (403, 429):
+            self.rate_limited += 1
+        retry_after = response.headers.get('retry-after')
+        if retry_after is not None:
+            delay = float(retry_after)
+        elif response.headers.get('x-ratelimit-remaining') == '0':
+            delay = float(response.headers.get('x-ratelimit-reset', 0)) - time.time() + 1
+        else:
+            # full jitter keeps many waiting clients from retrying in lockstep
+            delay = random.uniform(0, min(GITHUB_BACKOFF_MAX, GITHUB_BACKOFF_BASE * 2 ** attempt))
+        if delay > GITHUB_MAX_RATE_LIMIT_WAIT:
+            return None
+        return max(delay, 0.0)
+
+    def pause(self, delay: float) -> None:
+        self.paused_until = max(self.paused_until, time.time() + delay)
+
+    async def request(self, send: Callable[[], Awaitable[httpx.Response]],
+                      priority: int = PRIORITY_BULK) -> httpx.Response:
+        attempt = 0
+        while True:
+            try:
+                await self.acquire(priority)
+            except RateLimitExceeded as e:
+                return e.to_response()
+            try:
+                self.requests += 1
+                response = await send()
+                self.update(response.headers)
+            finally:
+                self.release()
+            delay = self.retry_delay(response, attempt)
+            if delay is None:
+                return response
+            self.retries += 1
+            attempt += 1
+            self.pause(delay)
+
+    def metrics(self) -> dict:
+        dispatched = self.requests
+        return {
+            'queue_depth': self.queue_depth,
+            'max_queue_depth': self.max_queue_depth,
+            'in_flight': self._in_flight,
+            'requests': self.requests,
+            'retries': self.retries,
+            'rate_limited': self.rate_limited,
+            'rejected': self.rejected,
+            'avg_wait_seconds': round(self.total_wait / dispatched, 4) if dispatched else 0.0,
+            'max_wait_seconds': round(self.max_wait, 4),
+            'rate_limit': self.limit,
+            'rate_limit_remaining': self.tokens,
+            'rate_limit_reset': self.reset_at or None,
+            'paused_for_seconds': round(max(self.paused_until - time.time(), 0.0), 2),
+        }
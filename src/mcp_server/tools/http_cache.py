@@ -0,0 +1,70 @@
+"""On-disk cache of HTTP responses validated with ETag/Last-Modified"""
+import hashlib
+import json
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from ..shared_cache import SharedCache
+
+# Response headers worth replaying with a cached body
+STORED_HEADERS = ('content-type', 'etag', 'last-modified', 'link')
+
+
+@dataclass
+class CachedResponse:
+    etag: Optional[str]
+    last_modified: Optional[str]
+    headers: Dict[str, str]
+    body: bytes
+
+    def validators(self) -> Dict[str, str]:
+        """Conditional request headers that revalidate this response."""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+def make_key(url: str, params: Optional[Dict] = None, token: Optional[str] = None) -> str:
+    """Cache key for a GET request; responses differ per token, so it is part of the key."""
+    query = json.dumps(sorted((params or {}).items()), default=str)
+    token_hash = hashlib.sha256(token.encode()).hexdigest()[:16] if token else ''
+    return f"{token_hash}|{url}|{query}"
+
+
+class HTTPCache:
+    """
+    Response cache stored in the SharedCache, so all server processes use it.
+
+    Entries never expire on their own: every hit is revalidated with the
+    server, and the shared cache evicts the least recently used entries
+    when it grows too large. A stored value is the JSON line of validators
+    and headers followed by the raw body.
+    """
+
+    def __init__(self, cache: SharedCache, namespace: str = 'github_http'):
+        self.cache = cache
+        self.namespace = namespace
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        value = self.cache.get(self.namespace, key)
+        if value is None:
+            return None
+        meta, _, body = value.partition(b'\n')
+        meta = json.loads(meta)
+        return CachedResponse(meta['etag'], meta['last_modified'], meta['headers'], body)
+
+    def put(self, key: str, headers: Dict[str, str], body: bytes) -> None:
+        stored = {name: value for name, value in headers.items() if name.lower() in STORED_HEADERS}
+        etag = headers.get('etag')
+        last_modified = headers.get('last-modified')
+        if not etag and not last_modified:
+            # nothing to revalidate with
+            return
+        meta = json.dumps({'etag': etag, 'last_modified': last_modified, 'headers': stored})
+        self.cache.put(self.namespace, key, meta.encode() + b'\n' + body)
+
+    def clear(self) -> None:
+        self.cache.clear(self.namespace)
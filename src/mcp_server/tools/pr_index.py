@@ -0,0 +1,154 @@
+"""Local SQLite index of a repository's pull requests"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+SCHEMA = """
+create table if not exists prs (
+    number integer primary key,
+    title text not null,
+    url text not null,
+    api_url text not null,
+    state text not null,
+    created_at text not null,
+    updated_at text not null,
+    closed_at text,
+    merged_at text,
+    author text not null,
+    labels text not null
+);
+create index if not exists prs_updated_at on prs (updated_at);
+create index if not exists prs_author on prs (author, updated_at);
+create table if not exists pr_labels (
+    number integer not null,
+    label text not null,
+    primary key (label, number)
+);
+create table if not exists sync_state (
+    key text primary key,
+    value text not null
+);
+"""
+
+
+class PRIndex:
+    """
+    Pull requests of one repository stored in a local SQLite database.
+
+    The index remembers two things about its sync state: the newest
+    ``updated_at`` it has seen (the watermark for incremental syncs) and the
+    oldest ``updated_at`` down to which it is complete (``covered_since``).
+    A range query is only answered locally when that range is covered.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute('pragma journal_mode=wal')
+        self._conn.executescript(SCHEMA)
+
+    def _get_state(self, key: str) -> Optional[str]:
+        row = self._conn.execute('select value from sync_state where key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    @property
+    def watermark(self) -> Optional[str]:
+        with self._lock:
+            return self._get_state('watermark')
+
+    @property
+    def covered_since(self) -> Optional[str]:
+        with self._lock:
+            return self._get_state('covered_since')
+
+    @property
+    def synced_at(self) -> float:
+        with self._lock:
+            return float(self._get_state('synced_at') or 0)
+
+    def covers(self, since: str) -> bool:
+        covered_since = self.covered_since
+        return covered_since is not None and covered_since <= since
+
+    def upsert(self, prs: Iterable[Dict]) -> None:
+        """Store raw PR objects as returned by the GitHub pulls API."""
+        rows = []
+        labels = []
+        for pr in prs:
+            names = [label['name'] for label in pr.get('labels', [])]
+            rows.append((
+                pr['number'], pr['title'], pr['html_url'], pr['url'], pr['state'],
+                pr['created_at'], pr['updated_at'], pr.get('closed_at'),
+                pr.get('merged_at'), pr['user']['login'], json.dumps(names)))
+            labels.extend((pr['number'], name) for name in names)
+        if not rows:
+            return
+        with self._lock:
+            self._conn.execute('begin immediate')
+            try:
+                self._conn.executemany(
+                    'insert or replace into prs values (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+                self._conn.executemany(
+                    'delete from pr_labels where number = ?', [(row[0],) for row in rows])
+                self._conn.executemany('insert or ignore into pr_labels values (?, ?)', labels)
+                self._conn.execute('commit')
+            except BaseException:
+                self._conn.execute('rollback')
+                raise
+
+    def mark_synced(self, watermark: Optional[str], covered_since: Optional[str]) -> None:
+        """Record a completed sync: the newest PR seen and how far back the index is complete."""
+        state = {
+            'watermark': watermark,
+            'covered_since': covered_since,
+            'synced_at': str(time.time()),
+        }
+        with self._lock:
+            self._conn.executemany(
+                'insert or replace into sync_state values (?, ?)',
+                [(key, value) for key, value in state.items() if value is not None])
+
+    def query(self, since: str, author: Optional[str] = None, state: Optional[str] = None,
+              label: Optional[str] = None) -> List[Dict]:
+        """PRs updated at or after ``since``, newest first."""
+        sql = 'select * from prs where updated_at >= ?'
+        params: list = [since]
+        if author:
+            sql += ' and author = ?'
+            params.append(author)
+        if state == 'merged':
+            sql += ' and merged_at is not null'
+        elif state:
+            sql += ' and state = ?'
+            params.append(state)
+        if label:
+            sql += ' and number in (select number from pr_labels where label = ?)'
+            params.append(label)
+        sql += ' order by updated_at desc'
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            columns = [column[0] for column in cursor.description]
+            rows = cursor.fetchall()
+        return [_to_pr(dict(zip(columns, row))) for row in rows]
+
+
+def _to_pr(row: Dict) -> Dict:
+    return {
+        'id': row['number'],
+        'title': row['title'],
+        'url': row['url'],
+        'api_url': row['api_url'],
+        'state': row['state'],
+        'created_at': row['created_at'],
+        'updated_at': row['updated_at'],
+        'merged_at': row['merged_at'],
+        'author': row['author'],
+        'labels': json.loads(row['labels'])
+    }
@@ -0,0 +1,155 @@
+"""Result cache for ClickHouse queries"""
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+# String literals, quoted identifiers and comments are kept apart from the
+# rest of the query: literals are case-sensitive, comments are dropped
+_TOKEN_RE = re.compile(r"""
+    (?P<string>'(?:[^'\\]|\\.)*')
+  | (?P<quoted>"(?:[^"\\]|\\.)*"|`(?:[^`\\]|\\.)*`)
+  | (?P<comment>--[^\n]*|/\*.*?\*/)
+  | (?P<space>\s+)
+  | (?P<word>[A-Za-z_][A-Za-z_0-9]*)
+  | (?P<other>.)
+""", re.VERBOSE | re.DOTALL)
+
+# SQL keywords are case-insensitive in ClickHouse, identifiers and most
+# function names are not, so only keywords are folded to lower case
+SQL_KEYWORDS = frozenset("""
+    select distinct from where prewhere group by having order limit offset
+    with totals rollup cube as on using join inner left right full outer cross
+    any all semi anti array union intersect except in not and or is null like
+    ilike between case when then else end asc desc nulls first last settings
+    sample final format interval
+""".split())
+
+# Functions whose result changes between runs of the same query
+NONDETERMINISTIC_RE = re.compile(
+    r"\b(now|now64|today|yesterday|rand|rand32|rand64|randConstant|"
+    r"generateUUIDv4|currentTimestamp|nowInBlock)\s*\(", re.IGNORECASE)
+
+_TRAILING_FORMAT_RE = re.compile(r"\s*\bformat\s+(\w+)\s*;?\s*$", re.IGNORECASE)
+
+# Only plain reads are cached: writes and DDL must reach the server every
+# time, and system tables (processes, parts, ...) show live server state
+CACHEABLE_PREFIXES = ('select', 'with')
+SYSTEM_TABLE_RE = re.compile(r"\b`?system`?\s*\.", re.IGNORECASE)
+
+
+def normalize_query(query: str) -> str:
+    """
+    Build the cache key text for a query.
+
+    Whitespace is collapsed, comments are removed, keywords are lower-cased and
+    the trailing format clause is moved into a canonical ``format <name>`` suffix,
+    so queries that differ only in layout share a cache entry.
+    """
+    parts = []
+    for match in _TOKEN_RE.finditer(query):
+        kind = match.lastgroup
+        token = match.group()
+        if kind in ('space', 'comment'):
+            if parts and parts[-1] != ' ':
+                parts.append(' ')
+        elif kind == 'word' and token.lower() in SQL_KEYWORDS:
+            parts.append(token.lower())
+        else:
+            parts.append(token)
+    normalized = ''.join(parts).strip().rstrip(';').strip()
+
+    output_format = ''
+    match = _TRAILING_FORMAT_RE.search(normalized)
+    if match:
+        output_format = match.group(1).lower()
+        normalized = normalized[:match.start()].rstrip()
+    return f"{normalized} format {output_format}" if output_format else normalized
+
+
+def is_cacheable(query: str) -> bool:
+    """Check whether the query is a SELECT/WITH read that touches no system tables."""
+    normalized = normalize_query(query)
+    return (normalized.lstrip('( ').startswith(CACHEABLE_PREFIXES)
+            and SYSTEM_TABLE_RE.search(normalized) is None)
+
+
+def is_deterministic(query: str) -> bool:
+    """Check whether the query avoids functions like now() or today()."""
+    return NONDETERMINISTIC_RE.search(query) is None
+
+
+class QueryCache:
+    """
+    Byte-bounded LRU cache with a time-to-live for every entry.
+
+    The size of a value is passed in by the caller, which knows how to
+    measure it (for query results it is the length of the result text).
+    """
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value, size = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any, size: int,
+            ttl: Optional[float] = None) -> None:
+        if key in self._entries:
+            self._remove(key)
+        if size > self.max_bytes:
+            # would evict everything else and still not fit
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._entries[key] = (expires_at, value, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def record_bypass(self) -> None:
+        self.bypassed += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def _remove(self, key: Hashable) -> None:
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'max_bytes': self.max_bytes,
+            'ttl_seconds': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            'bypassed': self.bypassed,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
@@ -0,0 +1,121 @@
+"""Pre-flight cost estimation of queries with EXPLAIN ESTIMATE"""
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from .query_cache import normalize_query
+
+# reject: return the estimate instead of running the query
+# limit: run it, but let ClickHouse stop reading at the row budget
+# off: no pre-flight
+CH_GUARD_MODE = os.getenv('CH_QUERY_GUARD', 'reject').lower()
+CH_GUARD_MAX_ROWS = int(os.getenv('CH_QUERY_GUARD_MAX_ROWS', 1_000_000_000))
+CH_GUARD_MAX_PARTS = int(os.getenv('CH_QUERY_GUARD_MAX_PARTS', 10_000))
+# EXPLAIN ESTIMATE ignores LIMIT. Over-budget queries whose final LIMIT
+# (plus OFFSET) is at most this many rows are not rejected; they run
+# under the row budget, as in limit mode
+CH_GUARD_SMALL_LIMIT = int(os.getenv('CH_QUERY_GUARD_SMALL_LIMIT', 10_000))
+
+_LIMIT_RE = re.compile(r"\blimit\s+(\d+)(?:\s*,\s*(\d+))?(?:\s+offset\s+(\d+))?$")
+_LITERAL_RE = re.compile(r"""'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|`(?:[^`\\]|\\.)*`""")
+_SET_OPERATION_RE = re.compile(r"\b(union|intersect|except)\b")
+
+# lines of EXPLAIN indexes = 1 that show how well the indexes prune the read
+INDEX_LINE_PREFIXES = ('ReadFromMergeTree', 'MinMax', 'Partition', 'PrimaryKey', 'Skip',
+                       'Condition:', 'Parts:', 'Granules:')
+
+@dataclass
+class TableEstimate:
+    table: str
+    parts: int
+    rows: int
+    marks: int
+
+@dataclass
+class Estimate:
+    tables: List[TableEstimate] = field(default_factory = list)
+    # over budget, but run under the row budget because of a small LIMIT
+    capped: bool = False
+
+    @property
+    def rows(self) -> int:
+        return sum(table.rows for table in self.tables)
+
+    @property
+    def parts(self) -> int:
+        return sum(table.parts for table in self.tables)
+
+    @property
+    def marks(self) -> int:
+        return sum(table.marks for table in self.tables)
+
+    def over_budget(self, max_rows: int = CH_GUARD_MAX_ROWS,
+                    max_parts: int = CH_GUARD_MAX_PARTS) -> bool:
+        return (0 < max_rows < self.rows) or (0 < max_parts < self.parts)
+
+def is_guarded(query: str) -> bool:
+    """Only reads are estimated; SHOW, DESCRIBE, EXPLAIN, ... run as they are."""
+    return normalize_query(query).lstrip('( ').startswith(('select', 'with'))
+
+def top_level_limit(query: str) -> Optional[int]:
+    """
+    Rows the query's final LIMIT lets through, counting its offset, or None
+    if it has none. Limits inside subqueries, and the last LIMIT of a UNION
+    (which only applies to its last SELECT), do not count.
+    """
+    normalized = normalize_query(query)
+    normalized = re.sub(r" format \w+$", '', normalized)
+    match = _LIMIT_RE.search(normalized)
+    if not match:
+        return None
+    before = _LITERAL_RE.sub("''", normalized[:match.start()])
+    if before.count('(') != before.count(')') or _SET_OPERATION_RE.search(before):
+        return None
+    first, second, offset = match.groups()
+    # LIMIT n, m is LIMIT m OFFSET n
+    return int(first) + int(second or 0) + int(offset or 0)
+
+def estimate_query(query: str) -> str:
+    return f"EXPLAIN ESTIMATE {query}\nFORMAT JSONEachRow"
+
+def indexes_query(query: str) -> str:
+    return f"EXPLAIN indexes = 1 {query}"
+
+def parse_estimate(text: str) -> Estimate:
+    estimate = Estimate()
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        row = json.loads(line)
+        estimate.tables.append(TableEstimate(
+            table = f"{row['database']}.{row['table']}",
+            parts = int(row['parts']),
+            rows = int(row['rows']),
+            marks = int(row['marks'])))
+    return estimate
+
+def parse_index_usage(text: str) -> List[str]:
+    return [line.rstrip() for line in text.splitlines()
+            if line.strip().startswith(INDEX_LINE_PREFIXES)]
+
+def format_estimate(estimate: Estimate) -> str:
+    tables = '; '.join(f"{table.table}: {table.rows} rows, {table.parts} parts"
+                       for table in estimate.tables)
+    return (f"-- estimate: {estimate.rows} rows, {estimate.parts} parts, {estimate.marks} marks"
+            + (f" ({tables})" if tables else ''))
+
+def format_rejection(estimate: Estimate, index_usage: Optional[List[str]],
+                     max_rows: int = CH_GUARD_MAX_ROWS,
+                     max_parts: int = CH_GUARD_MAX_PARTS) -> str:
+    content = ("Query was not run: it is estimated to read more than the budget of "
+               f"{max_rows} rows / {max_parts} parts.\n")
+    content += format_estimate(estimate) + '\n'
+    if index_usage:
+        content += "-- index usage (EXPLAIN indexes = 1):\n"
+        content += ''.join(f"--   {line.strip()}\n" for line in index_usage)
+    content += ("Filter on the partition or sorting key columns, narrow the date range, "
+                "use SAMPLE on tables with a sampling key, or query a pre-aggregated table. "
+                f"To look at a few rows, add a LIMIT of at most {CH_GUARD_SMALL_LIMIT}.")
+    return content
@@ -0,0 +1,144 @@
+"""Background ClickHouse queries that are submitted, polled and cancelled by id"""
+import asyncio
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+# Jobs kept at once; finished jobs are dropped oldest first to make room
+CH_JOBS_MAX = 100
+# How long a finished job keeps its result
+CH_JOB_TTL = 3600
+# Longest a status poll waits for the query to finish
+CH_JOB_MAX_WAIT = 60
+
+RUNNING = 'running'
+FINISHED = 'finished'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+
+def progress_query(query_id: str) -> str:
+    """Live counters of a running query (query ids are generated UUIDs)."""
+    return ("select elapsed, read_rows, read_bytes, total_rows_approx, memory_usage\n"
+            f"from system.processes where query_id = '{query_id}'\nformat JSONEachRow")
+
+
+def parse_progress(text: Optional[str]) -> Optional[Dict[str, float]]:
+    for line in (text or '').splitlines():
+        if line.strip():
+            try:
+                row = json.loads(line)
+                return {name: float(row.get(name) or 0) for name in
+                        ('elapsed', 'read_rows', 'read_bytes', 'total_rows_approx', 'memory_usage')}
+            except (TypeError, ValueError):
+                return None
+    return None
+
+
+def format_bytes(size: float) -> str:
+    for unit in ('B', 'KB', 'MB', 'GB', 'TB'):
+        if size < 1024 or unit == 'TB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+@dataclass
+class Job:
+    query_id: str
+    query: str
+    host: Optional[str]
+    task: Optional[asyncio.Task] = None
+    status: str = RUNNING
+    result: str = ''
+    submitted_at: float = field(default_factory = time.time)
+    finished_at: Optional[float] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status != RUNNING
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished_at or time.time()) - self.submitted_at
+
+    def finish(self, status: str, result: str) -> None:
+        if not self.done:
+            self.status = status
+            self.result = result
+            self.finished_at = time.time()
+
+
+class JobTable:
+    """
+    Submitted queries by query id, bounded in size.
+
+    Finished jobs keep their result for CH_JOB_TTL seconds. When the table
+    is full, the oldest finished job is dropped; running jobs are never
+    dropped, so submitting fails while CH_JOBS_MAX queries are running.
+    """
+
+    def __init__(self, max_jobs: int = CH_JOBS_MAX, ttl: float = CH_JOB_TTL):
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self.jobs: Dict[str, Job] = {}
+
+    def expire(self) -> None:
+        now = time.time()
+        for query_id, job in list(self.jobs.items()):
+            if job.done and now - job.finished_at >= self.ttl:
+                del self.jobs[query_id]
+
+    def add(self, job: Job) -> bool:
+        """Register a job; False if the table is full of running jobs."""
+        self.expire()
+        if len(self.jobs) >= self.max_jobs:
+            finished = sorted((job for job in self.jobs.values() if job.done),
+                              key = lambda job: job.finished_at)
+            for old in finished[:len(self.jobs) - self.max_jobs + 1]:
+                del self.jobs[old.query_id]
+        if len(self.jobs) >= self.max_jobs:
+            return False
+        self.jobs[job.query_id] = job
+        return True
+
+    def get(self, query_id: str) -> Optional[Job]:
+        self.expire()
+        return self.jobs.get(query_id.strip())
+
+    def list(self) -> List[Job]:
+        self.expire()
+        return sorted(self.jobs.values(), key = lambda job: job.submitted_at, reverse = True)
+
+
+def render_progress(job: Job, progress: Optional[Dict[str, float]]) -> str:
+    content = f"Query {job.query_id} is running ({job.elapsed:.1f}s since submission)\n"
+    if progress is None:
+        return content + "-- no progress reported yet\n"
+    rows = f"-- rows read: {progress['read_rows']:,.0f}"
+    if progress['total_rows_approx'] > 0:
+        share = min(progress['read_rows'] / progress['total_rows_approx'], 1.0)
+        rows += f" of ~{progress['total_rows_approx']:,.0f} ({share:.0%})"
+    return (content + rows
+            + f", bytes read: {format_bytes(progress['read_bytes'])}"
+            + f", memory: {format_bytes(progress['memory_usage'])}"
+            + f", elapsed on server: {progress['elapsed']:.1f}s\n")
+
+
+def render_job(job: Job) -> str:
+    header = f"Query {job.query_id} {job.status} after {job.elapsed:.1f}s\n"
+    if job.status == CANCELLED:
+        return header
+    return header + job.result
+
+
+def render_jobs(jobs: List[Job]) -> str:
+    content = "# ClickHouse Query Jobs\n\n"
+    if not jobs:
+        return content + "No submitted queries.\n"
+    for job in jobs:
+        query = ' '.join(job.query.split())
+        if len(query) > 100:
+            query = query[:97] + '...'
+        content += f"- **{job.query_id}**: {job.status}, {job.elapsed:.1f}s, `{query}`\n"
+    return content
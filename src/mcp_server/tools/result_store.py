@@ -0,0 +1,311 @@
+"""Local spill files for large query results, read back through memory maps"""
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from ..shared_cache import CACHE_DIR
+
+RESULT_STORE_DIR = os.path.join(CACHE_DIR, 'results')
+RESULT_STORE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+RESULT_PAGE_SIZE = 100
+RESULT_MAX_PAGE_SIZE = 1000
+RESULT_PREVIEW_ROWS = 20
+
+DATA_SUFFIX = '.arrows'
+META_SUFFIX = '.json'
+
+HANDLE_RE = re.compile(r'^[0-9a-f]{32}$')
+FILTER_RE = re.compile(r'^\s*(\w+)\s*(>=|<=|!=|=|>|<|\bcontains\b)\s*(.*?)\s*$', re.IGNORECASE)
+AGGREGATION_RE = re.compile(r'^\s*(\w+)\s*\(\s*(\w*)\s*\)\s*$')
+
+# aggregation names the agent may use, mapped onto pyarrow hash aggregations
+AGGREGATIONS = {
+    'count': 'count',
+    'sum': 'sum',
+    'avg': 'mean',
+    'mean': 'mean',
+    'min': 'min',
+    'max': 'max',
+    'uniq': 'count_distinct',
+    'count_distinct': 'count_distinct',
+}
+COMPARISONS = {
+    '=': 'equal',
+    '!=': 'not_equal',
+    '>': 'greater',
+    '>=': 'greater_equal',
+    '<': 'less',
+    '<=': 'less_equal',
+}
+
+
+class ResultStoreError(Exception):
+    """Problem with a handle or a request; the message is meant for the agent."""
+
+
+class ResultStore:
+    """
+    Query results spilled to disk as Arrow IPC streams, one file per handle.
+
+    Files are opened as memory maps, so paging or aggregating a result only
+    touches the parts of the file that are needed. Every read refreshes the
+    file's mtime and the least recently used files are deleted once the
+    directory grows past ``max_bytes``.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _path(self, handle: str, suffix: str) -> str:
+        return os.path.join(self.directory, handle + suffix)
+
+    def new_handle(self) -> Tuple[str, str]:
+        """A fresh handle and the temporary path to write its Arrow stream to."""
+        os.makedirs(self.directory, exist_ok=True)
+        handle = uuid.uuid4().hex
+        return handle, self._path(handle, DATA_SUFFIX + '.tmp')
+
+    def discard(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def commit(self, handle: str, path: str, query: str) -> Dict:
+        """Make a completely written stream available under its handle and return its metadata."""
+        import pyarrow as pa
+
+        reader = pa.ipc.open_stream(pa.memory_map(path))
+        rows = sum(batch.num_rows for batch in reader)
+        meta = {
+            'handle': handle,
+            'query': query,
+            'rows': rows,
+            'columns': [[field.name, str(field.type)] for field in reader.schema],
+            'bytes': os.path.getsize(path),
+            'created_at': time.time(),
+        }
+        with open(self._path(handle, META_SUFFIX), 'w') as f:
+            json.dump(meta, f)
+        os.replace(path, self._path(handle, DATA_SUFFIX))
+        self._evict(keep = handle)
+        if not os.path.exists(self._path(handle, DATA_SUFFIX)):
+            raise ResultStoreError(
+                f"The result ({meta['bytes']} bytes) is larger than the result store quota "
+                f"({self.max_bytes} bytes)")
+        return meta
+
+    def _evict(self, keep: str) -> None:
+        with self._lock:
+            entries = []
+            for filename in os.listdir(self.directory):
+                if not filename.endswith(DATA_SUFFIX):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(self.directory, filename))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, filename[:-len(DATA_SUFFIX)], stat.st_size))
+            total = sum(size for *_, size in entries)
+            # the new result goes last, so it is only dropped if it alone is too big
+            entries.sort(key = lambda entry: (entry[1] == keep, entry[0]))
+            for _, handle, size in entries:
+                if total <= self.max_bytes:
+                    break
+                self.delete(handle)
+                total -= size
+
+    def delete(self, handle: str) -> None:
+        for suffix in (DATA_SUFFIX, META_SUFFIX):
+            self.discard(self._path(handle, suffix))
+
+    def meta(self, handle: str) -> Dict:
+        if not HANDLE_RE.match(handle or ''):
+            raise ResultStoreError(f"Invalid result handle: {handle}")
+        try:
+            with open(self._path(handle, META_SUFFIX)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise ResultStoreError(
+                f"Unknown result handle: {handle}. It may have been evicted; run the query again "
+                "with spill enabled.") from None
+
+    def load(self, handle: str):
+        """The result as a pyarrow Table backed by the memory-mapped file."""
+        import pyarrow as pa
+
+        self.meta(handle)
+        path = self._path(handle, DATA_SUFFIX)
+        try:
+            os.utime(path)
+            # buffers of the table keep the mapping alive
+            return pa.ipc.open_stream(pa.memory_map(path)).read_all()
+        except FileNotFoundError:
+            raise ResultStoreError(f"Unknown result handle: {handle}. It may have been evicted.") from None
+
+    def list(self) -> List[Dict]:
+        """Metadata of all stored results, most recently used first."""
+        if not os.path.isdir(self.directory):
+            return []
+        results = []
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(DATA_SUFFIX):
+                continue
+            handle = filename[:-len(DATA_SUFFIX)]
+            try:
+                meta = self.meta(handle)
+                meta['used_at'] = os.path.getmtime(self._path(handle, DATA_SUFFIX))
+            except (ResultStoreError, OSError, ValueError):
+                continue
+            results.append(meta)
+        results.sort(key = lambda meta: meta['used_at'], reverse = True)
+        return results
+
+
+result_store = ResultStore(RESULT_STORE_DIR, RESULT_STORE_MAX_BYTES)
+
+def _check_columns(table, names) -> None:
+    missing = [name for name in names if name not in table.column_names]
+    if missing:
+        raise ResultStoreError(f"Unknown column(s): {', '.join(missing)}. "
+                               f"Available columns: {', '.join(table.column_names)}")
+
+def apply_filters(table, filters: Optional[List[str]]):
+    """Keep the rows matching every "<column> <op> <value>" filter."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    for expression in filters or []:
+        match = FILTER_RE.match(expression)
+        if not match:
+            raise ResultStoreError(
+                f"Invalid filter: {expression}. Use '<column> <op> <value>' where op is one of "
+                "=, !=, >, >=, <, <=, contains")
+        name, op, value = match.groups()
+        _check_columns(table, [name])
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in '\'"':
+            value = value[1:-1]
+        column = table.column(name)
+        if op.lower() == 'contains':
+            mask = pc.match_substring(column.cast(pa.string()), value)
+        else:
+            try:
+                scalar = pa.scalar(value).cast(column.type)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError):
+                raise ResultStoreError(
+                    f"Cannot compare column {name} of type {column.type} with {value!r}") from None
+            mask = getattr(pc, COMPARISONS[op])(column, scalar)
+        # rows where the comparison is null are dropped
+        table = table.filter(mask)
+    return table
+
+def _sort(table, sort_by: Optional[str], descending: bool):
+    import pyarrow as pa
+
+    if not sort_by:
+        return table
+    _check_columns(table, [sort_by])
+    try:
+        return table.sort_by([(sort_by, 'descending' if descending else 'ascending')])
+    except pa.ArrowException:
+        raise ResultStoreError(
+            f"Cannot sort by {sort_by}: column type {table.column(sort_by).type} "
+            "is not sortable") from None
+
+def render_table(table) -> str:
+    """Tab-separated rows with a header line, like TSVWithNames."""
+    if table.num_rows == 0:
+        return '\t'.join(table.column_names) + '\n'
+    return table.to_pandas().to_csv(sep = '\t', index = False)
+
+def describe_result(meta: Dict) -> str:
+    columns = ', '.join(f"{name} {type_}" for name, type_ in meta['columns'])
+    return (f"-- handle: {meta['handle']}\n"
+            f"-- rows: {meta['rows']}, file bytes: {meta['bytes']}\n"
+            f"-- columns: {columns}\n")
+
+def page_result(handle: str, offset: int = 0, limit: int = RESULT_PAGE_SIZE,
+                sort_by: Optional[str] = None, descending: bool = False,
+                filters: Optional[List[str]] = None) -> str:
+    try:
+        table = apply_filters(result_store.load(handle), filters)
+        table = _sort(table, sort_by, descending)
+    except ResultStoreError as e:
+        return str(e)
+    except ImportError:
+        return 'Spilled results require pyarrow: pip install pyarrow'
+    offset = max(offset, 0)
+    if offset and offset >= table.num_rows:
+        return f"Offset {offset} is beyond the end of the result ({table.num_rows} rows)\n"
+    limit = min(max(limit, 1), RESULT_MAX_PAGE_SIZE)
+    page = table.slice(offset, limit)
+    content = render_table(page)
+    end = offset + page.num_rows
+    content += f"-- rows {offset + 1 if page.num_rows else offset}-{end} of {table.num_rows}"
+    if end < table.num_rows:
+        content += f", next offset: {end}"
+    return content + '\n'
+
+def aggregate_result(handle: str, aggregations: List[str],
+                     group_by: Optional[List[str]] = None,
+                     filters: Optional[List[str]] = None,
+                     sort_by: Optional[str] = None, descending: bool = True,
+                     limit: int = RESULT_PAGE_SIZE) -> str:
+    group_by = group_by or []
+    try:
+        table = apply_filters(result_store.load(handle), filters)
+        _check_columns(table, group_by)
+        specs = []
+        for expression in aggregations:
+            match = AGGREGATION_RE.match(expression)
+            function = match and AGGREGATIONS.get(match.group(1).lower())
+            if not function:
+                raise ResultStoreError(
+                    f"Invalid aggregation: {expression}. Use count() or one of "
+                    f"{', '.join(name + '(column)' for name in AGGREGATIONS)}")
+            column = match.group(2)
+            if not column:
+                if function != 'count':
+                    raise ResultStoreError(f"{expression} needs a column")
+                specs.append(([], 'count_all'))
+            else:
+                _check_columns(table, [column])
+                specs.append((column, function))
+        if not specs:
+            raise ResultStoreError("At least one aggregation is required, e.g. count()")
+        grouped = table.group_by(group_by).aggregate(specs)
+        # pyarrow names the outputs "<column>_<function>" and "count_all"
+        names = [f"{column}_{function}" if column else function for column, function in specs]
+        grouped = grouped.select(group_by + names).rename_columns(
+            group_by + [expression.strip() for expression in aggregations])
+        grouped = _sort(grouped, sort_by, descending)
+    except ResultStoreError as e:
+        return str(e)
+    except ImportError:
+        return 'Spilled results require pyarrow: pip install pyarrow'
+    limit = min(max(limit, 1), RESULT_MAX_PAGE_SIZE)
+    content = render_table(grouped.slice(0, limit))
+    content += f"-- groups: {grouped.num_rows}"
+    if grouped.num_rows > limit:
+        content += f", showing the first {limit}"
+    return content + '\n'
+
+def list_results() -> str:
+    results = result_store.list()
+    content = "# Spilled Query Results\n\n"
+    if not results:
+        return content + "No spilled results.\n"
+    for meta in results:
+        query = ' '.join(meta['query'].split())
+        if len(query) > 200:
+            query = query[:197] + '...'
+        content += (f"- **{meta['handle']}**: {meta['rows']} rows, {meta['bytes']} bytes, "
+                    f"last used {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(meta['used_at']))}\n"
+                    f"  `{query}`\n")
+    return content
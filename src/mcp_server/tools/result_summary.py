@@ -0,0 +1,93 @@
+"""Compact digests of query results decoded from Arrow"""
+from collections.abc import Hashable
+from typing import List, Tuple
+
+SUMMARY_PERCENTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+SUMMARY_TOP_K = 5
+SUMMARY_MAX_VALUE_LENGTH = 40
+
+def have_pyarrow() -> bool:
+    """Import pyarrow ahead of a query, so a broken install fails before any data is fetched."""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def decode_arrow_stream(data: bytes):
+    """Decode an ArrowStream response into a pyarrow Table without copying the buffers."""
+    import pyarrow as pa
+
+    with pa.ipc.open_stream(pa.py_buffer(data)) as reader:
+        return reader.read_all()
+
+def _format_number(value) -> str:
+    if value != value:  # NaN
+        return ''
+    if float(value).is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return f"{value:.6g}"
+
+def _short(value) -> str:
+    text = str(value).replace('\t', ' ').replace('\n', ' ')
+    if len(text) > SUMMARY_MAX_VALUE_LENGTH:
+        text = text[:SUMMARY_MAX_VALUE_LENGTH - 3] + '...'
+    return text
+
+def summarize_table(table) -> Tuple[str, int]:
+    """
+    Describe a result table column by column instead of listing its rows.
+
+    Numeric columns get count, nulls, mean, std and quantiles; all other
+    columns get nulls, distinct count and the most frequent values.
+    Returns the digest and the number of rows it covers.
+    """
+    types = {field.name: field.type for field in table.schema}
+    # Arrow buffers are shared with pandas where the types allow it; the
+    # table stays usable, as it may be a stored result the caller keeps
+    df = table.to_pandas(split_blocks = True)
+    rows = len(df)
+    numeric = df.select_dtypes(include = 'number').columns
+    dates = df.select_dtypes(include = ['datetime', 'datetimetz']).columns
+    other = [name for name in df.columns if name not in numeric and name not in dates]
+
+    lines: List[str] = [f"-- summary of {rows} rows x {len(df.columns)} columns"]
+    if len(numeric):
+        # describe() computes all statistics for all numeric columns in one pass
+        stats = df[numeric].describe(percentiles = SUMMARY_PERCENTILES).T
+        nulls = df[numeric].isna().sum()
+        quantiles = [f"p{int(p * 100):02d}" for p in SUMMARY_PERCENTILES]
+        lines.append("\n## Numeric columns")
+        lines.append('\t'.join(['column', 'count', 'nulls', 'mean', 'std', 'min']
+                               + quantiles + ['max']))
+        for name, row in stats.iterrows():
+            values = [row['count'], nulls[name], row['mean'], row['std'], row['min']]
+            values += [row[f"{p * 100:g}%"] for p in SUMMARY_PERCENTILES]
+            values.append(row['max'])
+            lines.append('\t'.join([str(name)] + [_format_number(v) for v in values]))
+    if len(dates):
+        lines.append("\n## Date columns")
+        lines.append('column\tcount\tnulls\tmin\tmax')
+        for name in dates:
+            column = df[name]
+            lines.append(f"{name}\t{column.count()}\t{column.isna().sum()}\t"
+                         f"{column.min()}\t{column.max()}")
+    if other:
+        lines.append("\n## Other columns")
+        lines.append('column\ttype\tnulls\tdistinct\ttop values')
+        for name in other:
+            column = df[name]
+            # arrays and maps are not hashable; compare them as text
+            if not column.map(lambda v: isinstance(v, Hashable)).all():
+                column = column.map(lambda v: v if v is None else str(v))
+            top = column.value_counts().head(SUMMARY_TOP_K)
+            top_values = ', '.join(f"{_short(value)} ({count})" for value, count in top.items())
+            lines.append(f"{name}\t{types[name]}\t{column.isna().sum()}\t"
+                         f"{column.nunique()}\t{top_values}")
+    return '\n'.join(lines) + '\n', rows
+
+def summarize_arrow(data: bytes) -> Tuple[str, int]:
+    """Digest of an ArrowStream response; raises ImportError without pyarrow."""
+    if not data:
+        return "-- summary of 0 rows\n", 0
+    return summarize_table(decode_arrow_stream(data))
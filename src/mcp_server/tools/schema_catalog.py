@@ -0,0 +1,246 @@
+"""In-memory catalog of ClickHouse databases, tables and columns"""
+import asyncio
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+# How often the catalog is checked for changed tables and fully reloaded
+CATALOG_REFRESH_INTERVAL = 60
+CATALOG_FULL_RELOAD_INTERVAL = 3600
+
+DEFAULT_DATABASE = 'default'
+
+# Databases, tables and their columns in one round trip. Columns are packed
+# into one array per table, ordered by their position in the table.
+CATALOG_QUERY = """
+select
+    d.name as database,
+    t.name as table,
+    t.engine as engine,
+    toUnixTimestamp(t.metadata_modification_time) as modified,
+    t.total_rows as total_rows,
+    t.sorting_key as sorting_key,
+    t.partition_key as partition_key,
+    t.primary_key as primary_key,
+    t.sampling_key as sampling_key,
+    t.comment as comment,
+    c.columns as columns
+from system.databases as d
+left join system.tables as t on t.database = d.name
+left join (
+    select database, table,
+        arraySort(x -> x.1, groupArray((position, name, type, default_kind,
+                                         default_expression, comment))) as columns
+    from system.columns
+    group by database, table
+) as c on c.database = t.database and c.table = t.name
+{where}
+format JSONEachRow
+"""
+
+# Names only, used to notice dropped tables and databases between reloads
+LISTING_QUERY = """
+select d.name as database, groupArrayIf(t.name, t.name != '') as tables
+from system.databases as d
+left join system.tables as t on t.database = d.name
+group by d.name
+format JSONEachRow
+"""
+
+QueryRunner = Callable[[str], Awaitable[Optional[str]]]
+
+
+@dataclass
+class Column:
+    name: str
+    type: str
+    default_kind: str = ''
+    default_expression: str = ''
+    comment: str = ''
+
+
+@dataclass
+class Table:
+    database: str
+    name: str
+    engine: str = ''
+    modified: int = 0
+    total_rows: Optional[int] = None
+    sorting_key: str = ''
+    partition_key: str = ''
+    primary_key: str = ''
+    sampling_key: str = ''
+    comment: str = ''
+    columns: List[Column] = field(default_factory=list)
+
+    @property
+    def full_name(self) -> str:
+        return f"{self.database}.{self.name}"
+
+
+def _escape_tsv(value: str) -> str:
+    return (value.replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n'))
+
+
+def render_describe(table: Table) -> str:
+    """Render columns the way DESCRIBE TABLE does in TabSeparated format."""
+    lines = [
+        '\t'.join(_escape_tsv(value) for value in (
+            column.name, column.type, column.default_kind,
+            column.default_expression, column.comment))
+        for column in table.columns
+    ]
+    return '\n'.join(lines) + '\n' if lines else ''
+
+
+def split_table_name(table_name: str) -> Tuple[str, str]:
+    """Split "db.table" into its parts; bare names live in the default database."""
+    name = table_name.strip().replace('`', '').replace('"', '')
+    if '.' in name:
+        database, table = name.split('.', 1)
+        return database, table
+    return DEFAULT_DATABASE, name
+
+
+class SchemaCatalog:
+    """
+    Databases, tables and columns of one ClickHouse server kept in memory.
+
+    The first access loads everything with a single query. Later refreshes
+    only fetch tables whose metadata_modification_time moved past the last
+    seen value, plus a list of names to drop tables that no longer exist.
+    """
+
+    def __init__(self, run: QueryRunner, run_full: Optional[QueryRunner] = None):
+        # run executes a query and returns its text, or None on failure;
+        # run_full, if given, is used for full loads instead (e.g. one backed
+        # by a cache shared with other processes)
+        self._run = run
+        self._run_full = run_full or run
+        self._lock = asyncio.Lock()
+        self.databases: Dict[str, Dict[str, Table]] = {}
+        self.watermark = 0
+        self.loaded_at = 0.0
+        self.refreshed_at = 0.0
+
+    @property
+    def loaded(self) -> bool:
+        return self.loaded_at > 0
+
+    def _is_fresh(self) -> bool:
+        return self.loaded and time.monotonic() - self.refreshed_at < CATALOG_REFRESH_INTERVAL
+
+    async def ensure_fresh(self) -> bool:
+        """Load or refresh the catalog if it is older than the refresh interval."""
+        if self._is_fresh():
+            return True
+        async with self._lock:
+            # another caller may have refreshed it while we were waiting
+            if self._is_fresh():
+                return True
+            return await self._refresh()
+
+    async def refresh(self, full: bool = False) -> bool:
+        async with self._lock:
+            return await self._refresh(full)
+
+    async def _refresh(self, full: bool = False) -> bool:
+        now = time.monotonic()
+        if full or not self.loaded or now - self.loaded_at >= CATALOG_FULL_RELOAD_INTERVAL:
+            return await self._load_all(now)
+        return await self._load_changes(now)
+
+    async def _load_all(self, now: float) -> bool:
+        text = await self._run_full(CATALOG_QUERY.format(where=''))
+        if text is None:
+            return False
+        databases: Dict[str, Dict[str, Table]] = {}
+        watermark = 0
+        for row in _parse_rows(text):
+            tables = databases.setdefault(row['database'], {})
+            if row['table']:
+                table = _table_from_row(row)
+                tables[table.name] = table
+                watermark = max(watermark, table.modified)
+        self.databases = databases
+        self.watermark = watermark
+        self.loaded_at = self.refreshed_at = now
+        return True
+
+    async def _load_changes(self, now: float) -> bool:
+        listing = await self._run(LISTING_QUERY)
+        if listing is None:
+            return False
+        existing = {row['database']: set(row['tables']) for row in _parse_rows(listing)}
+
+        # tables that appeared without a newer modification time (e.g. renamed)
+        # are fetched by name together with the modified ones
+        unknown = [
+            (database, name)
+            for database, names in existing.items()
+            for name in names - set(self.databases.get(database, {}))
+        ]
+        where = f"where t.metadata_modification_time >= toDateTime({self.watermark})"
+        if unknown:
+            names = ', '.join(f"({_quote(database)}, {_quote(name)})" for database, name in unknown)
+            where += f" or (t.database, t.name) in ({names})"
+        changed = await self._run(CATALOG_QUERY.format(where=where))
+        if changed is None:
+            return False
+
+        databases = {
+            database: {name: table for name, table in self.databases.get(database, {}).items()
+                       if name in names}
+            for database, names in existing.items()
+        }
+        watermark = self.watermark
+        for row in _parse_rows(changed):
+            if row['table'] and row['database'] in databases:
+                table = _table_from_row(row)
+                databases[row['database']][table.name] = table
+                watermark = max(watermark, table.modified)
+        self.databases = databases
+        self.watermark = watermark
+        self.refreshed_at = now
+        return True
+
+    def get_table(self, table_name: str) -> Optional[Table]:
+        database, name = split_table_name(table_name)
+        return self.databases.get(database, {}).get(name)
+
+    def list_databases(self) -> List[str]:
+        return sorted(self.databases)
+
+
+def _quote(value: str) -> str:
+    return "'" + value.replace('\\', '\\\\').replace("'", "\\'") + "'"
+
+
+def _parse_rows(text: str):
+    for line in text.splitlines():
+        if line.strip():
+            yield json.loads(line)
+
+
+def _table_from_row(row: dict) -> Table:
+    total_rows = row.get('total_rows')
+    return Table(
+        database=row['database'],
+        name=row['table'],
+        engine=row.get('engine') or '',
+        modified=int(row.get('modified') or 0),
+        total_rows=int(total_rows) if total_rows is not None else None,
+        sorting_key=row.get('sorting_key') or '',
+        partition_key=row.get('partition_key') or '',
+        primary_key=row.get('primary_key') or '',
+        sampling_key=row.get('sampling_key') or '',
+        comment=row.get('comment') or '',
+        columns=[
+            Column(name=name, type=type_, default_kind=default_kind,
+                   default_expression=default_expression, comment=comment)
+            for _, name, type_, default_kind, default_expression, comment
+            in row.get('columns') or []
+        ],
+    )
@@ -0,0 +1,232 @@
+"""Schema section of the SQL prompt, built from the live catalog"""
+import asyncio
+import json
+import re
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .schema_catalog import Column, SchemaCatalog, Table
+
+# Tables described in the prompt; the rest are only counted
+PROMPT_MAX_TABLES = 30
+SKIPPED_DATABASES = {'system', 'information_schema', 'INFORMATION_SCHEMA'}
+
+# Sample values are listed for columns with at most this many distinct
+# values among the first PROMPT_SAMPLE_ROWS rows of a table
+PROMPT_MAX_SAMPLE_VALUES = 10
+PROMPT_SAMPLE_ROWS = 100_000
+PROMPT_SAMPLE_TIMEOUT = 5
+# Samples are fetched again after this many seconds, or when the table changes
+PROMPT_SAMPLES_TTL = 3600
+
+SAMPLED_TYPES = ('String', 'FixedString', 'Enum8', 'Enum16', 'Bool', 'UInt8', 'Int8')
+# sample values of these types are shown as string literals
+QUOTED_TYPES = ('String', 'FixedString', 'Enum')
+WRAPPER_RE = re.compile(r'^(?:Nullable|LowCardinality)\((.*)\)$')
+IDENTIFIER_RE = re.compile(r'`([^`]+)`|\b([A-Za-z_][A-Za-z0-9_]*)\b')
+
+QueryRunner = Callable[[str], Awaitable[Optional[str]]]
+
+
+def base_type(type_: str) -> str:
+    """Column type without Nullable(...) and LowCardinality(...) wrappers."""
+    while True:
+        match = WRAPPER_RE.match(type_)
+        if not match:
+            return type_
+        type_ = match.group(1)
+
+
+def is_sampled(column: Column) -> bool:
+    return (column.type.startswith(('LowCardinality', 'Nullable(LowCardinality'))
+            or base_type(column.type).split('(')[0] in SAMPLED_TYPES)
+
+
+def _quote_identifier(name: str) -> str:
+    return '`' + name.replace('\\', '\\\\').replace('`', '\\`') + '`'
+
+
+def samples_query(table: Table, columns: List[Column]) -> str:
+    """Distinct counts and most frequent values of columns, over a bounded read."""
+    names = [_quote_identifier(column.name) for column in columns]
+    aggregates = ', '.join(
+        f"uniq({name}) as d{i}, topK({PROMPT_MAX_SAMPLE_VALUES})(toString({name})) as v{i}"
+        for i, name in enumerate(names))
+    source = f"{_quote_identifier(table.database)}.{_quote_identifier(table.name)}"
+    return (f"select {aggregates} from (select {', '.join(names)} from {source} "
+            f"limit {PROMPT_SAMPLE_ROWS})\nformat JSONEachRow")
+
+
+def parse_samples(text: str, columns: List[Column]) -> Dict[str, List[str]]:
+    """Column name -> sample values, for the columns with few distinct values."""
+    try:
+        row = json.loads(text.strip().splitlines()[0]) if text.strip() else {}
+    except ValueError:
+        return {}
+    samples = {}
+    for i, column in enumerate(columns):
+        try:
+            distinct = int(row.get(f"d{i}", 0))
+        except (TypeError, ValueError):
+            continue
+        values = row.get(f"v{i}") or []
+        if 0 < distinct <= PROMPT_MAX_SAMPLE_VALUES and isinstance(values, list):
+            samples[column.name] = [str(value) for value in values]
+    return samples
+
+
+def split_key(key: str) -> List[str]:
+    """Split a sorting or partition key into its top-level expressions."""
+    key = key.strip()
+    if key.startswith('(') and key.endswith(')'):
+        key = key[1:-1]
+    parts, depth, current = [], 0, ''
+    for char in key:
+        if char == ',' and depth == 0:
+            parts.append(current.strip())
+            current = ''
+            continue
+        depth += char == '('
+        depth -= char == ')'
+        current += char
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+
+def key_column(expression: str, columns: Dict[str, Column]) -> Optional[str]:
+    """The column a key expression is computed from, e.g. d for toYYYYMM(d)."""
+    for quoted, bare in IDENTIFIER_RE.findall(expression):
+        name = quoted or bare
+        if name in columns:
+            return name
+    return None
+
+
+def _is_temporal(column: Column) -> bool:
+    return base_type(column.type).startswith(('Date', 'DateTime'))
+
+
+def index_hints(table: Table) -> List[str]:
+    """Filtering advice derived from the primary (sorting) and partition keys."""
+    columns = {column.name: column for column in table.columns}
+    keys = split_key(table.primary_key or table.sorting_key)
+    key_columns = [name for name in (key_column(key, columns) for key in keys) if name]
+    hints = []
+    if not key_columns:
+        hints.append("No primary key: every query reads the whole table, so filter "
+                     "and aggregate as much as possible in one pass")
+    for position, name in enumerate(dict.fromkeys(key_columns)):
+        column = columns[name]
+        expression = keys[key_columns.index(name)]
+        if position == 0:
+            if _is_temporal(column):
+                hint = (f"`{name}` leads the primary key: filter it with a range on the column "
+                        f"itself, e.g. `{name} >= '2024-12-01' and {name} < '2025-01-01'`, "
+                        f"not `toStartOfMonth({name}) = '2024-12-01'`")
+            else:
+                hint = (f"`{name}` leads the primary key: filter it with `=`, `in` or a range "
+                        f"on the column itself so whole granules are skipped")
+        else:
+            previous = ', '.join(f"`{key}`" for key in dict.fromkeys(key_columns[:key_columns.index(name)]))
+            hint = f"`{name}` narrows the index only together with a filter on {previous}"
+        if expression != name and expression != f"`{name}`":
+            hint += f" (the index stores `{expression}`)"
+        hints.append(hint)
+
+    for expression in split_key(table.partition_key):
+        name = key_column(expression, columns)
+        if name is not None:
+            hints.append(f"Partitioned by `{expression}`: a range filter on `{name}` skips "
+                         f"whole partitions")
+    return hints
+
+
+def _quote_value(value: str) -> str:
+    return "'" + value.replace('\\', '\\\\').replace("'", "\\'") + "'"
+
+
+def render_table(table: Table, samples: Dict[str, List[str]]) -> str:
+    content = f"### Table: {table.full_name}\n"
+    if table.comment:
+        content += f"**Description:** {table.comment}\n"
+    if table.total_rows is not None:
+        content += f"**Rows:** ~{table.total_rows:,}\n"
+    if table.engine:
+        content += f"**Engine:** {table.engine}\n"
+    if table.sorting_key:
+        content += f"**Sorting Key:** {table.sorting_key}\n"
+    if table.primary_key and table.primary_key != table.sorting_key:
+        content += f"**Primary Key:** {table.primary_key}\n"
+    if table.partition_key:
+        content += f"**Partition Key:** {table.partition_key}\n"
+    content += "**Fields:**\n"
+    for column in table.columns:
+        content += f"- {column.name} ({column.type})"
+        if column.comment:
+            content += f" - {column.comment}"
+        if column.name in samples:
+            values = samples[column.name]
+            if base_type(column.type).startswith(QUOTED_TYPES):
+                values = map(_quote_value, values)
+            content += f" (values: {', '.join(values)})"
+        content += "\n"
+    hints = index_hints(table)
+    if hints:
+        content += "**Filtering Hints:**\n" + ''.join(f"- {hint}\n" for hint in hints)
+    return content
+
+
+class SchemaPrompt:
+    """
+    Schema section of the SQL prompt for the tables of one ClickHouse server.
+
+    Table metadata comes from the SchemaCatalog (refreshed on its own
+    schedule). Sample values of low-cardinality columns are fetched with one
+    bounded query per table and kept until the table's metadata changes or
+    PROMPT_SAMPLES_TTL passes.
+    """
+
+    def __init__(self, catalog: SchemaCatalog, run: QueryRunner):
+        self.catalog = catalog
+        # run executes a query and returns its text, or None on failure
+        self._run = run
+        # table name -> (metadata modification time, fetched at, samples)
+        self._samples: Dict[str, Tuple[int, float, Dict[str, List[str]]]] = {}
+
+    def tables(self) -> List[Table]:
+        return [table
+                for database in self.catalog.list_databases() if database not in SKIPPED_DATABASES
+                for _, table in sorted(self.catalog.databases[database].items())]
+
+    async def samples(self, table: Table) -> Dict[str, List[str]]:
+        cached = self._samples.get(table.full_name)
+        if (cached is not None and cached[0] == table.modified
+                and time.monotonic() - cached[1] < PROMPT_SAMPLES_TTL):
+            return cached[2]
+        columns = [column for column in table.columns if is_sampled(column)]
+        samples = {}
+        if columns:
+            text = await self._run(samples_query(table, columns))
+            if text is None:
+                # keep serving what we had; retry on the next prompt
+                return cached[2] if cached is not None else {}
+            samples = parse_samples(text, columns)
+        self._samples[table.full_name] = (table.modified, time.monotonic(), samples)
+        return samples
+
+    async def render(self) -> Optional[str]:
+        """The schema section, or None if the catalog cannot be loaded or is empty."""
+        if not await self.catalog.ensure_fresh():
+            return None
+        tables = self.tables()
+        if not tables:
+            return None
+        shown = tables[:PROMPT_MAX_TABLES]
+        samples = await asyncio.gather(*[self.samples(table) for table in shown])
+        content = '\n'.join(render_table(table, table_samples)
+                            for table, table_samples in zip(shown, samples))
+        if len(tables) > len(shown):
+            content += (f"\n{len(tables) - len(shown)} more tables are not shown; use the "
+                        f"list_databases and describe_table tools to explore them.\n")
+        return content
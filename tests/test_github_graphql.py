@@ -0,0 +1,181 @@
+"""GraphQL backend for PR details, replayed from recorded GitHub responses"""
+import asyncio
+import json
+import os
+
+import httpx
+import pytest
+
+from mcp_server.tools import github
+from mcp_server.tools.github_graphql import (
+    get_prs_details_graphql,
+    map_commit,
+    map_file,
+    map_pr
+)
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'github')
+REPO_URL = 'https://github.com/acme/widgets'
+TOKEN = 'test-token'
+
+
+def load(name):
+    with open(os.path.join(FIXTURES, name)) as f:
+        return json.load(f)
+
+
+class RecordedGitHub:
+    """Answers REST and GraphQL requests from the fixture files and logs them."""
+
+    def __init__(self, graphql_batch = 'graphql_batch.json'):
+        self.graphql_batch = graphql_batch
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        path = request.url.path
+        if path == '/graphql':
+            body = json.loads(request.content)
+            query = body['query']
+            if 'commits(first: 100, after: $after)' in query:
+                assert body['variables']['after'] == 'Y29tbWl0czoy'
+                return httpx.Response(200, json = load('graphql_commits_page_2.json'))
+            if 'files(first: 100, after: $after)' in query:
+                assert body['variables']['after'] == 'ZmlsZXM6Mg=='
+                return httpx.Response(200, json = load('graphql_files_page_2.json'))
+            return httpx.Response(200, json = load(self.graphql_batch))
+        routes = {
+            '/repos/acme/widgets/pulls/7': 'rest_pull_7.json',
+            '/repos/acme/widgets/pulls/7/commits': 'rest_pull_7_commits.json',
+            '/repos/acme/widgets/pulls/7/files': 'rest_pull_7_files.json',
+        }
+        if path in routes:
+            return httpx.Response(200, json = load(routes[path]))
+        return httpx.Response(404, json = {'message': 'Not Found'})
+
+    def graphql_queries(self):
+        return [json.loads(request.content)['query'] for request in self.requests
+                if request.url.path == '/graphql']
+
+
+@pytest.fixture
+def recorded(monkeypatch):
+    def install(server):
+        monkeypatch.setattr(github, 'get_client', lambda: httpx.AsyncClient(
+            base_url = github.BASE_URL, transport = httpx.MockTransport(server)))
+        return server
+    monkeypatch.setattr(github, 'GITHUB_CACHE_ENABLED', False)
+    monkeypatch.setattr(github, '_http_cache', None)
+    return install
+
+
+def batch_pr():
+    return load('graphql_batch.json')['data']['repository']['pr7']
+
+
+def test_map_commit_and_file():
+    pr = batch_pr()
+    assert map_commit(pr['commits']['nodes'][0]) == {
+        'sha': '3f2a9c1',
+        'message': 'Add retry helper',
+        'author': 'Octo Cat',
+        'date': '2025-03-01T09:10:00Z',
+    }
+    assert map_file(pr['files']['nodes'][1]) == {
+        'filename': 'src/exporter/retry.py',
+        'status': 'added',
+        'additions': 12,
+        'deletions': 0,
+        'changes': 12,
+    }
+
+
+def test_map_pr():
+    pr = batch_pr()
+    files = github.FilesSummary()
+    for node in pr['files']['nodes']:
+        files.add(map_file(node))
+    commits = [map_commit(node) for node in pr['commits']['nodes']]
+
+    details = map_pr(pr, commits, files.to_dict())
+
+    assert details['id'] == 7
+    assert details['state'] == 'closed'
+    assert details['merged'] is True
+    # UNKNOWN is what REST reports as null
+    assert details['mergeable'] is None
+    assert details['author'] == {'login': 'octocat', 'url': 'https://github.com/octocat'}
+    assert details['assignees'] == ['hubot']
+    # review requests for teams have no login and are skipped
+    assert details['reviewers'] == ['monalisa']
+    assert details['labels'] == ['enhancement', 'exporter']
+    assert details['milestone'] == 'v1.2'
+    assert details['base_branch'] == 'main'
+    assert details['head_branch'] == 'retry-uploads'
+    assert details['commits_count'] == 2
+    assert details['files_changed'] == 2
+    assert details['changed_files'] == 3
+
+
+def test_pagination_follows_cursors(recorded):
+    server = recorded(RecordedGitHub())
+
+    details = asyncio.run(get_prs_details_graphql(REPO_URL, [7], TOKEN))[0]
+
+    assert [commit['message'] for commit in details['commits']] == [
+        'Add retry helper', 'Retry uploads on 5xx', 'Document retry settings']
+    assert details['commits_count'] == 3
+    assert [file['filename'] for file in details['files']] == [
+        'src/exporter/upload.py', 'src/exporter/retry.py', 'docs/exporter.md']
+    assert details['files_changed'] == 3
+    assert details['files'][2]['status'] == 'renamed'
+    # one batch query, then one follow-up page each for commits and files
+    assert len(server.graphql_queries()) == 3
+
+
+def test_missing_pr_is_reported_per_pr(recorded):
+    recorded(RecordedGitHub())
+
+    found, missing, invalid = asyncio.run(
+        get_prs_details_graphql(REPO_URL, [7, 8, 'not-a-number'], TOKEN))
+
+    assert found['id'] == 7
+    assert missing == {'error': 'PR not found', 'message': 'Could not resolve PR #8'}
+    assert invalid == {'error': 'PR identifier must be a number or valid GitHub PR URL'}
+
+
+def test_missing_repository(recorded):
+    recorded(RecordedGitHub('graphql_repository_not_found.json'))
+
+    results = asyncio.run(get_prs_details_graphql('acme/missing', [1, 2], TOKEN))
+
+    assert results == [{'error': 'Repository acme/missing not found'}] * 2
+
+
+def test_other_errors_fail_the_batch(recorded):
+    recorded(RecordedGitHub('graphql_rate_limited.json'))
+
+    results = asyncio.run(get_prs_details_graphql(REPO_URL, [7, 8], TOKEN))
+
+    assert results == [{'error': 'GraphQL request failed',
+                        'message': 'API rate limit exceeded for user ID 1.'}] * 2
+
+
+def test_token_is_required():
+    results = asyncio.run(get_prs_details_graphql(REPO_URL, [7], None))
+
+    assert results == [{'error': 'The GraphQL API requires a GitHub token'}]
+
+
+def test_parity_with_rest(recorded):
+    recorded(RecordedGitHub())
+
+    async def both():
+        rest = await github.get_prs_details(REPO_URL, [7], TOKEN, backend = 'rest')
+        graphql = await github.get_prs_details(REPO_URL, [7], TOKEN, backend = 'graphql')
+        return rest, graphql
+
+    rest, graphql = asyncio.run(both())
+
+    assert 'error' not in rest[0]
+    assert graphql == rest
@@ -0,0 +1,57 @@
+"""Rate limit handling of the GitHub request scheduler"""
+import asyncio
+import time
+
+import httpx
+
+from mcp_server.tools.github_scheduler import GITHUB_MAX_RATE_LIMIT_WAIT, RequestScheduler
+
+
+def exhausted(reset_in):
+    return httpx.Headers({
+        'x-ratelimit-limit': '5000',
+        'x-ratelimit-remaining': '0',
+        'x-ratelimit-reset': str(int(time.time() + reset_in)),
+    })
+
+
+def test_long_reset_fails_queued_requests_at_once():
+    scheduler = RequestScheduler()
+    sent = []
+
+    async def send():
+        sent.append(1)
+        return httpx.Response(200, headers = exhausted(3000), json = {})
+
+    async def run():
+        first = await scheduler.request(send)
+        started = time.monotonic()
+        later = await asyncio.gather(*(scheduler.request(send) for _ in range(3)))
+        return first, later, time.monotonic() - started
+
+    first, later, elapsed = asyncio.run(run())
+
+    assert first.status_code == 200
+    assert len(sent) == 1
+    assert elapsed < 1
+    for response in later:
+        assert response.status_code == 403
+        assert response.json()['message'].startswith('API rate limit exceeded; it resets at ')
+    assert scheduler.metrics()['rejected'] == 3
+
+
+def test_short_reset_is_waited_out():
+    scheduler = RequestScheduler()
+    scheduler.tokens = 0
+    scheduler.reset_at = time.time() + 0.3
+    assert GITHUB_MAX_RATE_LIMIT_WAIT > 0.3
+
+    async def send():
+        return httpx.Response(200, json = {})
+
+    started = time.monotonic()
+    response = asyncio.run(scheduler.request(send))
+
+    assert response.status_code == 200
+    assert time.monotonic() - started >= 0.25
+    assert scheduler.metrics()['rejected'] == 0
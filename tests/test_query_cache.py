@@ -0,0 +1,96 @@
+"""Which ClickHouse queries the result cache serves, and how it keys them"""
+import asyncio
+
+import httpx
+import pytest
+
+from mcp_server.tools import clickhouse
+from mcp_server.tools.query_cache import is_cacheable, is_deterministic, normalize_query
+
+HOST = 'http://clickhouse.test:8123'
+
+
+@pytest.mark.parametrize('query', [
+    'select 1',
+    'SELECT user_id FROM ecommerce.users',
+    '  (select 1)',
+    'WITH 1 AS x SELECT x',
+    '-- latest users\nselect * from ecommerce.users',
+])
+def test_reads_are_cacheable(query):
+    assert is_cacheable(query)
+
+
+@pytest.mark.parametrize('query', [
+    "INSERT INTO ecommerce.users VALUES (1, 'DE')",
+    'insert into ecommerce.users select * from ecommerce.users_staging',
+    'CREATE TABLE ecommerce.tmp (x UInt8) ENGINE = Memory',
+    'ALTER TABLE ecommerce.users DELETE WHERE user_id = 1',
+    'DROP TABLE ecommerce.tmp',
+    'SELECT query_id FROM system.processes',
+    'select * from `system`.parts',
+    'SHOW DATABASES',
+])
+def test_writes_ddl_and_system_tables_are_not_cacheable(query):
+    assert not is_cacheable(query)
+
+
+def test_nondeterministic_functions():
+    assert not is_deterministic('select * from ecommerce.sessions where action_date = today()')
+    assert not is_deterministic('SELECT now()')
+    assert is_deterministic('select * from ecommerce.sessions where action_date = \'2025-01-01\'')
+
+
+def test_normalization():
+    assert (normalize_query('SELECT  user_id\n  FROM ecommerce.users -- all of them\nLIMIT 10;')
+            == normalize_query('select user_id from ecommerce.users limit 10'))
+    # identifiers and literals keep their case
+    assert normalize_query("SELECT Country FROM t WHERE x = 'DE'") == \
+        "select Country from t where x = 'DE'"
+    assert normalize_query('select 1 FORMAT JSON') == 'select 1 format json'
+    assert normalize_query('select 1') != normalize_query('select 1 format JSON')
+
+
+@pytest.fixture
+def clickhouse_server(monkeypatch):
+    """A ClickHouse stand-in that answers every query with one row and logs them."""
+    queries = []
+
+    def handle(request):
+        queries.append(request.url.params['query'])
+        return httpx.Response(200, text = 'x\n1\n')
+
+    monkeypatch.setattr(clickhouse, 'get_client', lambda: httpx.AsyncClient(
+        transport = httpx.MockTransport(handle)))
+    monkeypatch.setattr(clickhouse, 'get_shared_cache', lambda: None)
+    monkeypatch.setattr(clickhouse, 'CH_GUARD_MODE', 'off')
+    clickhouse.query_cache.clear()
+    yield queries
+    clickhouse.query_cache.clear()
+
+
+def run_twice(first, second):
+    async def run():
+        await clickhouse.execute_query(first, HOST)
+        return await clickhouse.execute_query(second, HOST)
+    return asyncio.run(run())
+
+
+def test_repeated_select_is_served_from_the_cache(clickhouse_server):
+    text = run_twice('select user_id from ecommerce.users',
+                     'SELECT   user_id\nFROM ecommerce.users;')
+
+    assert len(clickhouse_server) == 1
+    assert 'cached: true' in text
+
+
+@pytest.mark.parametrize('query', [
+    "insert into ecommerce.users values (1, 'DE')",
+    'select query_id from system.processes',
+    'select count() from ecommerce.sessions where action_date = today()',
+])
+def test_query_is_sent_every_time(clickhouse_server, query):
+    text = run_twice(query, query)
+
+    assert len(clickhouse_server) == 2
+    assert 'cached: true' not in text
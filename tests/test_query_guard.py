@@ -0,0 +1,29 @@
+"""LIMIT detection of the query cost guard"""
+import pytest
+
+from mcp_server.tools.query_guard import top_level_limit
+
+
+@pytest.mark.parametrize('query, rows', [
+    ('select * from ecommerce.sessions limit 10', 10),
+    ('SELECT * FROM ecommerce.sessions LIMIT 10 OFFSET 5 FORMAT JSON', 15),
+    ('select * from ecommerce.sessions limit 5, 10;', 15),
+    ("select 'limit 1)' from ecommerce.sessions limit 3", 3),
+    ('select * from ecommerce.sessions where user_id in (select user_id from ecommerce.users) '
+     'limit 7', 7),
+])
+def test_top_level_limit(query, rows):
+    assert top_level_limit(query) == rows
+
+
+@pytest.mark.parametrize('query', [
+    'select * from ecommerce.sessions',
+    # only the subquery is limited
+    'select count() from (select * from ecommerce.sessions limit 10) where 1',
+    'select * from (select * from ecommerce.sessions limit 10)',
+    # the LIMIT only applies to the last SELECT
+    'select * from ecommerce.sessions union all select * from ecommerce.users limit 10',
+    'select * from ecommerce.sessions limit 1 by user_id',
+])
+def test_no_top_level_limit(query):
+    assert top_level_limit(query) is None